@@ -6,7 +6,6 @@ import sys
 from pathlib import Path
 from dotenv import load_dotenv
 from google.adk.agents import LlmAgent
-import google.generativeai as genai
 
 # Set UTF-8 encoding for Python
 if sys.stdout.encoding != 'utf-8':
@@ -21,14 +20,16 @@ sys.path.insert(0, str(project_root))
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini API
+# Gemini API key (google.generativeai is only imported if we need to list models)
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
 
-# Import our custom tool functions
-from src.tools.gmail_search_tool import search_gmail
-from src.tools.csv_export_tool import export_to_csv
+# Import our custom tool functions (the async versions: ADK runs every session on one
+# event loop, and these run their blocking Gmail and file work in a thread pool)
+from src.tools.async_tools import search_gmail, export_to_csv, export_to_parquet
+from src.model_cache import get_cached_model, save_model_choice
+
+# The key under which our model choice is saved in the model cache
+MODEL_CACHE_KEY = "adk"
 
 # System instruction for the agent
 SYSTEM_INSTRUCTION = """
@@ -46,8 +47,18 @@ Your mission is to help users find emails and export them to a CSV file.
    - "emails about invoices" → "invoice"
    - "travel emails" → "travel"
    - "emails from last week" → "newer_than:7d"
-3. **Search:** Call the search_gmail function with your query string
-4. **Export:** Pass the results to export_to_csv function
+3. **Search:** Call the search_gmail function with your query string.
+   It returns a short `result_handle` plus summary numbers (count, date range, top labels),
+   never the emails themselves.
+   If the user wants specific fields (sender, recipients, snippet, size...), also pass
+   `columns`, e.g. columns="Date,From,Subject" (available: Date, Subject, From, To, Cc,
+   Labels, snippet, sizeEstimate, threadId, internalDate, id). Only those are downloaded.
+   Searches may be answered from a local index of already-fetched mail; if the user asks
+   for live, fresh or the very latest results, also pass live=true.
+   If the user wants conversations / threads, pass thread_mode="threads" (one row per
+   conversation) or thread_mode="messages" (every email of the matching conversations).
+4. **Export:** Pass that `result_handle` string, unchanged, to the export_to_csv function
+   (or to export_to_parquet if the user asks for Parquet / a file for data analysis)
 5. **Confirm:** Tell the user where the CSV file was saved (the exact file path)
 
 Always be helpful and provide clear confirmations with the exact file path.
@@ -70,7 +81,13 @@ def get_available_model():
     """
     Try to find a working model from our priority list.
     Returns the first model that exists and is supported by ADK.
+    A choice found within the last day is reused without listing the models again.
     """
+    cached_model = get_cached_model(MODEL_CACHE_KEY)
+    if cached_model:
+        print(f"[INFO] Using cached model choice: {cached_model}")
+        return cached_model
+
     print("[INFO] Checking available Gemini models for ADK compatibility...")
     
     # Known ADK-compatible models (based on google.adk.models registry)
@@ -86,6 +103,9 @@ def get_available_model():
     
     # Try to list available models from Gemini API
     try:
+        import google.generativeai as genai
+        if GEMINI_API_KEY:
+            genai.configure(api_key=GEMINI_API_KEY)
         available_models = genai.list_models()
         available_names = [m.name for m in available_models if 'generateContent' in m.supported_generation_methods]
         print(f"[INFO] Found {len(available_names)} models in Gemini API")
@@ -106,6 +126,7 @@ def get_available_model():
             
             if model_exists:
                 print(f"[SUCCESS] Using model: {model_name}")
+                save_model_choice(MODEL_CACHE_KEY, model_name)
                 return model_name
             else:
                 print(f"[SKIP] {model_name} - Not available in your account")
@@ -130,7 +151,7 @@ root_agent = LlmAgent(
     model=selected_model,  # Automatically selected best model
     description="An agent that searches Gmail and exports results to CSV files",
     instruction=SYSTEM_INSTRUCTION,
-    tools=[search_gmail, export_to_csv]
+    tools=[search_gmail, export_to_csv, export_to_parquet]
 )
 
 print(f"[INFO] Agent initialized with model: {selected_model}")
\ No newline at end of file
@@ -2,14 +2,278 @@
 # This is the main entry point for our project.
 # We run this file from the terminal to start the agent.
 
+# Remember when the process started, for "--startup-profile"
+import time
+PROCESS_START = time.perf_counter()
+
 # Import our agent "brain" and helper functions
+from src import agent_runner
 from src.agent_runner import run_agent_turn
-from src.utils import print_log, PREFIX_USER, PREFIX_AGENT
+from src import metrics
+from src.tools import columns, email_table, local_index, metadata_cache
+from src.utils import print_log, set_log_level, LOG_LEVELS, PREFIX_USER, PREFIX_AGENT
+import argparse
+import json
 import sys
 
-def run_interactive_mode():
+IMPORTS_DONE = time.perf_counter()
+
+# Slow libraries that should NOT be loaded before the first prompt
+HEAVY_MODULES = ["google.generativeai", "googleapiclient", "pandas"]
+
+def print_startup_profile():
+    """
+    Prints how long it took from process start to the first prompt.
+    """
+    now = time.perf_counter()
+    print("\n" + "=" * 50)
+    print(" Startup profile")
+    print(f"   Imports:              {(IMPORTS_DONE - PROCESS_START) * 1000:8.1f} ms")
+    print(f"   Time to first prompt: {(now - PROCESS_START) * 1000:8.1f} ms")
+    for module in HEAVY_MODULES:
+        state = "loaded" if module in sys.modules else "not loaded (lazy)"
+        print(f"   {module:<22}{state}")
+    print("=" * 50 + "\n")
+
+def write_run_metrics(metrics_json: str | None = None, prometheus: str | None = None):
+    """
+    Prints a one-line JSON summary of the run and writes the optional metrics files.
+
+    Args:
+        metrics_json (str): Where to save the full JSON summary (optional).
+        prometheus (str): Where to save a Prometheus text file (optional).
+    """
+    summary = metrics.snapshot()
+    print_log(PREFIX_AGENT, "Run metrics: " + json.dumps({
+        "elapsed_seconds": summary["elapsed_seconds"],
+        "counters": summary["counters"],
+    }))
+    if metrics_json:
+        print_log(PREFIX_AGENT, f"Metrics summary saved to: {metrics.write_json_summary(metrics_json)}")
+    if prometheus:
+        print_log(PREFIX_AGENT, f"Prometheus metrics saved to: {metrics.write_prometheus(prometheus)}")
+
+def parse_args():
+    """
+    Reads the command-line options.
+    """
+    parser = argparse.ArgumentParser(description="Gmail Search Exporter Agent")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always fetch from Gmail; do not read or write the local metadata cache.",
+    )
+    parser.add_argument(
+        "--startup-profile",
+        action="store_true",
+        help="Print the time to the first prompt and the duration of the first turn.",
+    )
+    parser.add_argument(
+        "--no-fast-path",
+        action="store_true",
+        help="Send every prompt to Gemini, even ones the local query translator understands.",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="Run every prompt (or 'q: <gmail query>' line) in FILE without the chat, then exit.",
+    )
+    parser.add_argument(
+        "--batch-concurrency",
+        type=int,
+        default=4,
+        help="How many batch searches run at the same time (default: 4).",
+    )
+    parser.add_argument(
+        "--batch-format",
+        choices=["csv", "parquet"],
+        default="csv",
+        help="Export format for raw 'q:' queries in batch mode (default: csv).",
+    )
+    parser.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="In batch mode, search each line on its own instead of fetching shared messages once.",
+    )
+    parser.add_argument(
+        "--job",
+        metavar="QUERY",
+        help="Export everything matching a Gmail QUERY as a checkpointed job that can be resumed, then exit "
+             "(--job \"\" exports the whole mailbox).",
+    )
+    parser.add_argument(
+        "--job-format",
+        choices=["csv", "parquet"],
+        default="csv",
+        help="Export format of a --job (default: csv).",
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="JOB_ID",
+        help="Continue an interrupted --job from its last checkpoint, then exit.",
+    )
+    parser.add_argument(
+        "--add-account",
+        metavar="NAME",
+        help="Log in to another Gmail account and save its token as NAME (for --accounts), then exit.",
+    )
+    parser.add_argument(
+        "--accounts",
+        metavar="LIST",
+        help="Comma-separated account names for --accounts-query, or 'all' for every saved account.",
+    )
+    parser.add_argument(
+        "--accounts-query",
+        metavar="QUERY",
+        help="Export everything matching a Gmail QUERY from each of the --accounts in parallel, then exit.",
+    )
+    parser.add_argument(
+        "--accounts-format",
+        choices=["csv", "parquet"],
+        default="csv",
+        help="Export format of --accounts-query (default: csv).",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        metavar="N",
+        help="How many accounts are searched at the same time, each in its own process "
+             "(default: one per account, at most one per CPU core).",
+    )
+    parser.add_argument(
+        "--merge-accounts",
+        action="store_true",
+        help="Write one file with an 'account' column instead of one file per account.",
+    )
+    parser.add_argument(
+        "--output-dir",
+        metavar="DIR",
+        help="Folder for the batch or accounts exports and manifest (default: a new folder in results/).",
+    )
+    parser.add_argument(
+        "--columns",
+        metavar="LIST",
+        help="Default columns to fetch and export, comma-separated "
+             f"(default: {','.join(columns.DEFAULT_COLUMNS)}; available: {', '.join(columns.AVAILABLE_COLUMNS)}).",
+    )
+    parser.add_argument(
+        "--search-mode",
+        choices=["auto", "live", "local"],
+        default="auto",
+        help="Answer searches from the local index ('local'), from Gmail ('live') or the local "
+             "index when it holds the whole mailbox ('auto', the default).",
+    )
+    parser.add_argument(
+        "--sharded-listing",
+        action="store_true",
+        help="List searches without a limit in parallel date windows. Quicker only for very "
+             "big searches; it keeps every listed message ID in memory.",
+    )
+    parser.add_argument(
+        "--sort",
+        choices=["api", "date", "date-desc"],
+        default="api",
+        help="Order of the search results: Gmail's order ('api', the default), oldest first "
+             "('date') or newest first ('date-desc'). Not with --job, --resume, --accounts-query "
+             "or --batch --no-dedup, which export rows as they arrive.",
+    )
+    parser.add_argument(
+        "--since",
+        metavar="DATE",
+        help="Only keep emails dated at or after DATE (YYYY-MM-DD or YYYY-MM-DDTHH:MM, UTC). "
+             "Checked locally after the search, on email rows, in every mode (a job keeps the "
+             "values it was created with).",
+    )
+    parser.add_argument(
+        "--until",
+        metavar="DATE",
+        help="Only keep emails dated before DATE (same format as --since).",
+    )
+    parser.add_argument(
+        "--date-source",
+        choices=["raw", "internal", "header"],
+        default="raw",
+        help="Date of each email: the sender's Date header as written ('raw', the default), "
+             "when Gmail received it in UTC ('internal') or the sender's Date header converted "
+             "to UTC ('header'). Sorting and --since/--until use Gmail's date unless 'header'.",
+    )
+    parser.add_argument(
+        "--build-index",
+        action="store_true",
+        help="Cache the metadata of every message so repeat searches work offline, then exit.",
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=[level.lower() for level in LOG_LEVELS],
+        default="info",
+        help="How much to log ('debug' also logs every fetched message).",
+    )
+    parser.add_argument(
+        "--metrics-json",
+        metavar="PATH",
+        help="Save the run's timings and counters as JSON when the agent exits.",
+    )
+    parser.add_argument(
+        "--prometheus",
+        metavar="PATH",
+        help="Save the run's metrics in Prometheus text format when the agent exits.",
+    )
+    return parser.parse_args()
+
+def run_export_job(gmail_query: str | None, export_format: str = "csv", job_id: str | None = None) -> int:
+    """
+    Runs a new checkpointed export job, or resumes one.
+
+    Args:
+        gmail_query (str): The Gmail query of a new job (None when resuming).
+        export_format (str): "csv" or "parquet" (new jobs only).
+        job_id (str): The job to resume.
+
+    Returns:
+        int: The exit code (0 done, 1 failed, 130 interrupted).
+    """
+    from src import job_runner
+
+    try:
+        if job_id:
+            checkpoint = job_runner.load_checkpoint(job_id)
+        else:
+            checkpoint = job_runner.create_job(gmail_query, export_format, columns.DEFAULT_COLUMNS)
+    except (FileNotFoundError, ValueError) as error:
+        print_log(PREFIX_AGENT, str(error))
+        return 1
+
+    resume_hint = f"Resume with: python main.py --resume {checkpoint['job_id']}"
+    try:
+        job_runner.run_job(checkpoint)
+        return 0
+    except KeyboardInterrupt:
+        print("\n")
+        print_log(PREFIX_AGENT, f"Job interrupted. Nothing already saved is lost. {resume_hint}")
+        return 130
+    except Exception as error:
+        print_log(PREFIX_AGENT, f"Job stopped by an error: {error}. {resume_hint}")
+        return 1
+
+# Gemini's answer of the current turn, as far as it has been printed
+streamed_text = []
+
+def print_streamed_text(text: str) -> None:
+    """
+    Prints a piece of Gemini's answer as soon as it arrives.
+    The first piece of a turn starts a new [AGENT] line.
+    """
+    if not streamed_text:
+        print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {PREFIX_AGENT} ", end="")
+    streamed_text.append(text)
+    print(text, end="", flush=True)
+
+def run_interactive_mode(startup_profile: bool = False):
     """
     Runs the main interactive chat loop for the agent.
+
+    Args:
+        startup_profile (bool): Print startup timings before the first prompt.
     """
     print_log(PREFIX_AGENT, "Gmail Search Exporter Agent is online.")
     
@@ -23,6 +287,10 @@ def run_interactive_mode():
     print(" 5. Messages about 'travel abroad to countries outside Israel'")
     print("="*50 + "\n")
 
+    if startup_profile:
+        print_startup_profile()
+    first_turn = True
+
     try:
         while True:
             # --- 1. Get User Input ---
@@ -40,11 +308,21 @@ def run_interactive_mode():
             # --- 2. Run Agent Turn ---
             # Send the input to the agent and let it do its work
             # The agent_runner.py will print all the [LLM] and [TOOL] logs
-            agent_response = run_agent_turn(user_input)
+            turn_start = time.perf_counter()
+            streamed_text.clear()
+            agent_response = run_agent_turn(user_input, on_text=print_streamed_text)
+            if startup_profile and first_turn:
+                # The first turn also loads the model and the Gmail libraries
+                print_log(PREFIX_AGENT, f"First turn took {time.perf_counter() - turn_start:.2f}s (includes lazy initialisation).")
+            first_turn = False
             
             # --- 3. Print Final Response ---
             # This prints the agent's final confirmation, e.g., "File saved!"
-            print_log(PREFIX_AGENT, agent_response)
+            # (unless it was already printed while it streamed in)
+            if streamed_text:
+                print()
+            if not "".join(streamed_text).endswith(agent_response):
+                print_log(PREFIX_AGENT, agent_response)
             print("-" * 50) # Add a separator for clarity
 
     except KeyboardInterrupt:
@@ -56,4 +334,88 @@ def run_interactive_mode():
         print_log(PREFIX_AGENT, "Please try again.")
 
 if __name__ == "__main__":
-    run_interactive_mode()
\ No newline at end of file
+    args = parse_args()
+    set_log_level(args.log_level)
+    if args.no_cache:
+        metadata_cache.CACHE_ENABLED = False
+        print_log(PREFIX_AGENT, "Metadata cache disabled (--no-cache).")
+    if args.columns:
+        try:
+            columns.DEFAULT_COLUMNS = columns.normalize_columns(args.columns)
+        except ValueError as error:
+            print_log(PREFIX_AGENT, str(error))
+            sys.exit(2)
+    if args.no_fast_path:
+        agent_runner.FAST_PATH_ENABLED = False
+    email_table.SORT_ORDER = args.sort
+    email_table.DATE_SOURCE = args.date_source
+    try:
+        email_table.SINCE_MS = email_table.parse_date_option(args.since) if args.since else None
+        email_table.UNTIL_MS = email_table.parse_date_option(args.until) if args.until else None
+    except ValueError as error:
+        print_log(PREFIX_AGENT, str(error))
+        sys.exit(2)
+    # These modes stream their rows to the file, so they cannot sort them
+    streaming_mode = next((flag for flag, used in (
+        ("--accounts-query", args.accounts_query is not None),
+        ("--job", args.job is not None),
+        ("--resume", args.resume),
+        ("--batch --no-dedup", args.batch and args.no_dedup),
+    ) if used), None)
+    if args.sort != "api" and streaming_mode:
+        print_log(PREFIX_AGENT, f"--sort cannot be used with {streaming_mode}: the rows are exported as they arrive.")
+        sys.exit(2)
+    if args.resume and (args.since or args.until):
+        print_log(PREFIX_AGENT, "--since and --until cannot be changed on --resume: the job keeps its own.")
+        sys.exit(2)
+    local_index.SEARCH_MODE = args.search_mode
+    if args.sharded_listing:
+        # Imported only here, so the Google libraries still load lazily without the flag
+        from src.tools import gmail_search_tool
+        gmail_search_tool.SHARDED_LISTING = True
+    exit_code = 0
+    try:
+        if args.add_account:
+            from src.tools.auth_tool import get_gmail_credentials
+            try:
+                get_gmail_credentials(args.add_account)
+                print_log(PREFIX_AGENT, f"Account '{args.add_account}' saved. Use it with --accounts {args.add_account}.")
+            except ValueError as error:
+                print_log(PREFIX_AGENT, str(error))
+                exit_code = 2
+        elif args.build_index:
+            if args.no_cache:
+                print_log(PREFIX_AGENT, "--build-index needs the metadata cache; remove --no-cache.")
+                exit_code = 2
+            else:
+                local_index.build_index()
+        elif args.accounts_query is not None:
+            from src.account_runner import run_accounts
+            from src.tools.auth_tool import list_accounts
+            if not args.accounts or args.accounts == "all":
+                accounts = list_accounts()
+            else:
+                accounts = [name.strip() for name in args.accounts.split(",") if name.strip()]
+            try:
+                manifest = run_accounts(
+                    args.accounts_query, accounts, args.processes, args.output_dir,
+                    args.accounts_format, merge=args.merge_accounts,
+                )
+                exit_code = 1 if manifest["failed"] else 0
+            except ValueError as error:
+                print_log(PREFIX_AGENT, str(error))
+                exit_code = 2
+        elif args.job is not None or args.resume:
+            exit_code = run_export_job(args.job, args.job_format, job_id=args.resume)
+        elif args.batch:
+            from src.batch_runner import run_batch
+            manifest = run_batch(
+                args.batch, args.batch_concurrency, args.output_dir, args.batch_format, dedup=not args.no_dedup
+            )
+            # A non-zero exit code lets schedulers (cron, CI) notice failed searches
+            exit_code = 1 if manifest["failed"] else 0
+        else:
+            run_interactive_mode(startup_profile=args.startup_profile)
+    finally:
+        write_run_metrics(args.metrics_json, args.prometheus)
+    sys.exit(exit_code)
\ No newline at end of file
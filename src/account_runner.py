@@ -0,0 +1,238 @@
+# File: src/account_runner.py
+# Multi-account mode: runs the same Gmail query for several mailboxes at once.
+# Every account gets its own worker PROCESS with its own credentials, Gmail
+# services, HTTP connections, quota limiter and metadata cache, so the mailboxes
+# never wait for each other (and for one Python interpreter). The wall time is
+# about that of the slowest mailbox instead of the sum of all of them.
+#
+# Results go to one file per account, or (with merge=True) into one file with an
+# extra "account" column.
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from src.utils import print_log, PREFIX_AGENT, PREFIX_TOOL
+
+# --- Configuration ---
+
+OUTPUT_DIR = "results"
+
+# Worker processes when none are given (one per account, at most one per CPU core)
+DEFAULT_PROCESSES = os.cpu_count() or 1
+
+# Name of the column that tells the accounts apart in a merged export
+ACCOUNT_COLUMN = "account"
+
+
+def export_account(task: dict) -> dict:
+    """
+    Searches ONE account and streams the results into its export file.
+    Runs inside a worker process, so everything it needs comes in `task`.
+
+    Args:
+        task (dict): account, query, file, format, columns, with_account_column, use_cache,
+                     search_mode, sharded_listing, since_ms, until_ms, date_source,
+                     log_level and an optional session_factory
+                     (a picklable function account -> GmailSession, e.g. for a fake backend).
+
+    Returns:
+        dict: The account's manifest entry (status, file, rows, seconds, API calls, error).
+    """
+    from src.tools import columns as column_config
+    from src.tools import gmail_search_tool, local_index, metadata_cache
+    from src.tools.batch_fetch_tool import new_fetch_stats
+    from src.tools.email_table import fetch_columns_for, iter_email_rows
+    from src.tools.gmail_search_tool import iter_gmail
+    from src.tools.gmail_session import GmailSession, set_session
+    from src.utils import set_log_level
+
+    account = task["account"]
+    entry = {"account": account, "file": None, "rows": 0}
+    started = time.perf_counter()
+    stats = new_fetch_stats()
+    try:
+        # This process serves one mailbox: its own settings, session and cache file
+        set_log_level(task["log_level"])
+        column_config.DEFAULT_COLUMNS = task["columns"]
+        local_index.SEARCH_MODE = task["search_mode"]
+        gmail_search_tool.SHARDED_LISTING = task["sharded_listing"]
+        metadata_cache.CACHE_ENABLED = task["use_cache"]
+        metadata_cache.CACHE_FILE = metadata_cache.cache_file_for(account)
+        factory = task.get("session_factory")
+        session = factory(account) if factory is not None else GmailSession(account=account)
+        set_session(session)
+
+        # The same rows as search_gmail(): UTC dates and --since/--until (see iter_email_rows())
+        emails = iter_gmail(task["query"], stats=stats, session=session, raw=True,
+                            columns=fetch_columns_for(task["columns"], task["date_source"]))
+        records = iter_email_rows(emails, task["columns"], session.label_map(stats=stats), task["since_ms"],
+                                  task["until_ms"], task["date_source"])
+        export_columns = list(task["columns"])
+        if task["with_account_column"]:
+            records = ({ACCOUNT_COLUMN: account, **record} for record in records)
+            export_columns.insert(0, ACCOUNT_COLUMN)
+
+        if task["format"] == "parquet":
+            from src.tools.parquet_export_tool import stream_to_parquet
+            file_path, rows = stream_to_parquet(records, task["file"], columns=export_columns)
+        else:
+            from src.tools.csv_export_tool import stream_to_csv
+            file_path, rows = stream_to_csv(records, task["file"], columns=export_columns)
+        entry.update(status="ok", file=file_path, rows=rows)
+    except Exception as error:
+        print_log(PREFIX_TOOL, f"Account '{account}' failed: {error}")
+        entry.update(status="error", error=str(error))
+    entry.update(
+        seconds=round(time.perf_counter() - started, 3),
+        api_calls=stats["api_calls"],
+        retries=stats["retries"],
+        cache_hits=stats["cache_hits"],
+        failed_messages=stats["failed"],
+    )
+    return entry
+
+
+def merge_csv_files(part_paths: list[str], file_path: str) -> None:
+    """
+    Joins CSV files with the same header into one file: the first file is copied
+    whole, the others without their header line. Written under a temporary name
+    and renamed when complete.
+    """
+    temp_path = file_path + ".part"
+    try:
+        with open(temp_path, "wb") as merged:
+            for number, part_path in enumerate(part_paths):
+                with open(part_path, "rb") as part:
+                    if number > 0:
+                        # The header line (and its byte-order mark) is only needed once
+                        part.readline()
+                    while True:
+                        block = part.read(1024 * 1024)
+                        if not block:
+                            break
+                        merged.write(block)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def run_accounts(
+    gmail_query: str,
+    accounts: list[str],
+    processes: int | None = None,
+    output_dir: str | None = None,
+    export_format: str = "csv",
+    merge: bool = False,
+    columns: list[str] | None = None,
+    session_factory=None,
+) -> dict:
+    """
+    Runs one Gmail query for several accounts in parallel worker processes.
+
+    Args:
+        gmail_query (str): The Gmail search query.
+        accounts (list[str]): Saved account names (see auth_tool.list_accounts()).
+        processes (int): How many accounts are searched at the same time
+                         (defaults to one per account, at most DEFAULT_PROCESSES).
+        output_dir (str): Where to save the exports (defaults to a new timestamped
+                          folder in OUTPUT_DIR).
+        export_format (str): "csv" or "parquet".
+        merge (bool): Write one file with an "account" column instead of one file per account.
+        columns (list[str]): The columns to export (defaults to columns.DEFAULT_COLUMNS).
+        session_factory: Optional picklable function account -> GmailSession used by the workers.
+
+    Returns:
+        dict: The manifest (also saved as manifest.json in the output folder).
+    """
+    from src.tools import columns as column_config
+    from src.tools import email_table, gmail_search_tool, local_index, metadata_cache
+    from src.tools.auth_tool import token_file_for
+    from src.utils import LOG_LEVELS, LOG_LEVEL
+
+    if not accounts:
+        raise ValueError("No accounts given. Add one with: python main.py --add-account NAME")
+    for account in accounts:
+        # Checks the name before any process starts (raises ValueError)
+        token_file_for(account)
+    columns = column_config.normalize_columns(columns or column_config.DEFAULT_COLUMNS)
+    processes = max(1, min(len(accounts), processes or DEFAULT_PROCESSES))
+    if output_dir is None:
+        output_dir = os.path.join(OUTPUT_DIR, time.strftime("accounts_%Y-%m-%d_%H%M%S"))
+    os.makedirs(output_dir, exist_ok=True)
+    extension = "parquet" if export_format == "parquet" else "csv"
+    log_level = next((name for name, value in LOG_LEVELS.items() if value == LOG_LEVEL), "INFO").lower()
+
+    tasks = [
+        {
+            "account": account,
+            "query": gmail_query,
+            "file": os.path.join(output_dir, f"{account}.{extension}"),
+            "format": extension,
+            "columns": columns,
+            "with_account_column": merge,
+            "use_cache": metadata_cache.CACHE_ENABLED,
+            "search_mode": local_index.SEARCH_MODE,
+            "sharded_listing": gmail_search_tool.SHARDED_LISTING,
+            # Spawned workers do not see this process's settings, so they are passed on
+            "since_ms": email_table.SINCE_MS,
+            "until_ms": email_table.UNTIL_MS,
+            "date_source": email_table.DATE_SOURCE,
+            "log_level": log_level,
+            "session_factory": session_factory,
+        }
+        for account in accounts
+    ]
+    print_log(PREFIX_AGENT, f"Searching {len(accounts)} account(s) for '{gmail_query}', {processes} at a time.")
+
+    started = time.perf_counter()
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+    # "spawn" starts clean interpreters: no lock or connection is inherited from this process
+    with ProcessPoolExecutor(max_workers=processes, mp_context=get_context("spawn")) as pool:
+        entries = list(pool.map(export_account, tasks))
+
+    merged_file = None
+    parts = [entry["file"] for entry in entries if entry["status"] == "ok"]
+    if merge and parts:
+        merged_file = os.path.join(output_dir, f"all_accounts.{extension}")
+        if extension == "parquet":
+            from src.tools.parquet_export_tool import merge_parquet_files
+            merge_parquet_files(parts, merged_file)
+        else:
+            merge_csv_files(parts, merged_file)
+        for part in parts:
+            os.remove(part)
+        # The per-account files are gone; their rows are in the merged file now
+        for entry in entries:
+            if entry["status"] == "ok":
+                entry["file"] = merged_file
+
+    elapsed = time.perf_counter() - started
+    manifest = {
+        "query": gmail_query,
+        "started_at": started_at,
+        "elapsed_seconds": round(elapsed, 3),
+        "processes": processes,
+        # The sum of the per-account times: what running them one by one would cost
+        "account_seconds": round(sum(entry["seconds"] for entry in entries), 3),
+        "succeeded": sum(1 for entry in entries if entry["status"] == "ok"),
+        "failed": sum(1 for entry in entries if entry["status"] != "ok"),
+        "rows": sum(entry["rows"] for entry in entries),
+        "merged_file": merged_file,
+        "accounts": entries,
+    }
+    manifest_path = os.path.join(output_dir, "manifest.json")
+    temp_path = manifest_path + ".part"
+    with open(temp_path, "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, ensure_ascii=False)
+    os.replace(temp_path, manifest_path)
+    print_log(
+        PREFIX_AGENT,
+        f"{len(accounts)} account(s) done in {manifest['elapsed_seconds']}s "
+        f"({manifest['account_seconds']}s one after another): {manifest['succeeded']} ok, "
+        f"{manifest['failed']} failed, {manifest['rows']} rows. Manifest: {manifest_path}",
+    )
+    return manifest
@@ -1,28 +1,48 @@
 # File: src/agent_runner.py
 # REVERTED AND FIXED VERSION - Uses google-generativeai, with corrected model selection and robust error handling.
 
+# Nothing slow happens at import time: google.generativeai, the Gmail tools and the
+# model itself are only loaded on the first call to get_chat().
+
 import os
 import json
-import google.generativeai as genai
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
-from src.tools.gmail_search_tool import search_gmail
-from src.tools.csv_export_tool import export_to_csv
+from src import metrics
+from src.model_cache import get_cached_model, save_model_choice
+from src.query_translator import translate_prompt, remember_translation
 from src.utils import print_log, PREFIX_AGENT, PREFIX_LLM, PREFIX_TOOL
 
 # Load API Key
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-if not GEMINI_API_KEY:
-    # This is a critical error, but for the sake of running, we'll configure a client anyway
-    # The user is expected to have this set up in their environment.
-    print_log(PREFIX_AGENT, "Warning: GEMINI_API_KEY not found in .env file. Running might fail.")
+# The key under which our model choice is saved in the model cache
+MODEL_CACHE_KEY = "cli"
+
+# Answer prompts the local query translator understands without calling Gemini
+FAST_PATH_ENABLED = True
+
+# Most model round-trips in one turn (each round-trip can run several tools at once)
+MAX_ROUND_TRIPS = 5
+
+# Most tools that run at the same time when Gemini asks for several in one response
+MAX_PARALLEL_TOOLS = 4
 
-try:
-    genai.configure(api_key=GEMINI_API_KEY)
-except Exception as e:
-    print_log(PREFIX_AGENT, f"Error configuring Gemini API: {e}")
+# Used when the model list cannot be fetched and nothing is cached
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+# Prioritize the user's paid model, or a fast, capable one
+PREFERRED_MODELS = [
+    "gemini-2.5-pro",
+    "gemini-2.5-flash",
+    "gemini-1.5-pro-001",
+    "gemini-1.5-flash-001",
+    "gemini-pro", # The model that was failing due to quota
+]
 
 # System Instruction
 SYSTEM_INSTRUCTION = """
@@ -32,8 +52,8 @@ Your job is to:
 1. Understand the user's natural language request
 2. Convert it to a Gmail search query
 3. Call search_gmail with that query
-4. Call export_to_csv with the results
-5. Tell the user where the file was saved
+4. Call export_to_csv with the result_handle that search_gmail returned
+5. Tell the user where the file was saved (and how many emails it has)
 
 Examples of converting queries:
 - "last email" → "" (empty for recent)
@@ -43,135 +63,421 @@ Examples of converting queries:
 - "emails from last week" → "newer_than:7d"
 
 Always call BOTH tools in order: search_gmail, then export_to_csv.
+If the user asks for several separate searches, call search_gmail for all of them in the
+same response; they run at the same time. Likewise, export all result handles at once.
+search_gmail returns only a result_handle and summary numbers, never the emails themselves.
+Pass that result_handle string to export_to_csv unchanged.
+If the user asks for specific fields (e.g. sender, recipients, snippet, size), pass them to
+search_gmail as columns, e.g. columns="Date,From,Subject". Available columns: Date, Subject,
+From, To, Cc, Labels, snippet, sizeEstimate, threadId, internalDate, id.
+Only the requested columns are downloaded, so do not ask for more than needed.
+Searches may be answered from a local index of already-fetched mail. If the user asks
+for live, fresh or the very latest results, pass live=true to search_gmail.
+If the user asks for conversations or threads, pass thread_mode="threads" (one row per
+conversation) or thread_mode="messages" (every email of the matching conversations).
+If the user asks for Parquet (or a file for data analysis), call export_to_parquet
+with the same result_handle instead of export_to_csv.
+"""
+
+# Used to turn one prompt into a Gmail query without tools (batch mode)
+QUERY_ONLY_INSTRUCTION = """
+Convert the user's request into ONE Gmail search query.
+Reply with the query only: no explanation, no quotes, no code block.
+Examples:
+- "emails from bob@example.com" → from:bob@example.com
+- "urgent emails" → label:urgent
+- "emails from last week" → newer_than:7d
 """
 
 
-# List models and find the best one
-print_log(PREFIX_AGENT, "Finding available Gemini model...")
-try:
-    # Prioritize the user's paid model, or a fast, capable one
-    preferred_models = [
-        "gemini-2.5-pro",
-        "gemini-2.5-flash",
-        "gemini-1.5-pro-001",
-        "gemini-1.5-flash-001",
-        "gemini-pro", # The model that was failing due to quota
-    ]
-    
-    # Check which models are available to the user's key
-    available_models = [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
-    
-    selected_model = None
-    for pref in preferred_models:
-        if pref in available_models:
-            selected_model = pref
-            break
-    
-    if not selected_model:
-        # Fallback to a default if none of the preferred are available
-        selected_model = available_models[0] if available_models else "gemini-2.5-flash"
-        
-    print_log(PREFIX_AGENT, f"Using model: {selected_model}")
-    
-except Exception as e:
-    # Catching general Exception for robustness across different library versions
-    print_log(PREFIX_AGENT, f"Could not list models due to an error: {e}. Falling back to default model.")
-    selected_model = "gemini-2.5-flash"
-    print_log(PREFIX_AGENT, f"Using fallback model: {selected_model}")
-
-
-# Create the model
-model = genai.GenerativeModel(
-    model_name=selected_model,
-    system_instruction=SYSTEM_INSTRUCTION,
-    tools=[search_gmail, export_to_csv]
-)
-
-# Start chat
-chat = model.start_chat()
-print_log(PREFIX_AGENT, "Agent initialized successfully")
-
-
-def run_agent_turn(user_input: str) -> str:
+# Filled in by get_chat() on first use
+_chat = None
+_query_model = None
+_init_lock = threading.Lock()
+
+
+def _get_genai():
+    """
+    Imports and configures google.generativeai (slow, so only done when needed).
+    """
+    import google.generativeai as genai
+
+    if not GEMINI_API_KEY:
+        # This is a critical error, but for the sake of running, we'll configure a client anyway
+        # The user is expected to have this set up in their environment.
+        print_log(PREFIX_AGENT, "Warning: GEMINI_API_KEY not found in .env file. Running might fail.")
+
+    try:
+        genai.configure(api_key=GEMINI_API_KEY)
+    except Exception as e:
+        print_log(PREFIX_AGENT, f"Error configuring Gemini API: {e}")
+    return genai
+
+
+def select_model(genai) -> str:
+    """
+    Picks the Gemini model to use, preferring the choice saved in the model cache.
+
+    Args:
+        genai: The configured google.generativeai module.
+
+    Returns:
+        str: The model name.
+    """
+    cached_model = get_cached_model(MODEL_CACHE_KEY)
+    if cached_model:
+        print_log(PREFIX_AGENT, f"Using cached model choice: {cached_model}")
+        return cached_model
+
+    # List models and find the best one
+    print_log(PREFIX_AGENT, "Finding available Gemini model...")
+    try:
+        # Check which models are available to the user's key
+        available_models = [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
+
+        selected_model = None
+        for pref in PREFERRED_MODELS:
+            if pref in available_models:
+                selected_model = pref
+                break
+
+        if not selected_model:
+            # Fallback to a default if none of the preferred are available
+            selected_model = available_models[0] if available_models else DEFAULT_MODEL
+
+        print_log(PREFIX_AGENT, f"Using model: {selected_model}")
+        save_model_choice(MODEL_CACHE_KEY, selected_model)
+
+    except Exception as e:
+        # Catching general Exception for robustness across different library versions
+        # (the fallback is NOT cached, so the next start tries the listing again)
+        print_log(PREFIX_AGENT, f"Could not list models due to an error: {e}. Falling back to default model.")
+        selected_model = DEFAULT_MODEL
+        print_log(PREFIX_AGENT, f"Using fallback model: {selected_model}")
+
+    return selected_model
+
+
+def get_chat():
+    """
+    Returns the chat session, creating the model and chat on first use.
+    """
+    global _chat
+    with _init_lock:
+        if _chat is None:
+            genai = _get_genai()
+            from src.tools.gmail_search_tool import search_gmail
+            from src.tools.csv_export_tool import export_to_csv
+            from src.tools.parquet_export_tool import export_to_parquet
+
+            # Create the model
+            model = genai.GenerativeModel(
+                model_name=select_model(genai),
+                system_instruction=SYSTEM_INSTRUCTION,
+                tools=[search_gmail, export_to_csv, export_to_parquet]
+            )
+
+            # Start chat
+            _chat = model.start_chat()
+            print_log(PREFIX_AGENT, "Agent initialized successfully")
+    return _chat
+
+
+def set_chat(chat) -> None:
+    """
+    Replaces the chat session (e.g. with the scripted fake model of the replay
+    benchmark, see src/bench/fake_model.py). None creates a Gemini chat on next use.
+    """
+    global _chat
+    with _init_lock:
+        _chat = chat
+
+
+def _count_tokens(response) -> None:
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        metrics.increment("llm_tokens_in", getattr(usage, "prompt_token_count", 0) or 0)
+        metrics.increment("llm_tokens_out", getattr(usage, "candidates_token_count", 0) or 0)
+
+
+def translate_query_with_llm(prompt: str) -> str:
+    """
+    Asks Gemini for the Gmail query of a prompt, without running any tools.
+    The answer is remembered, so the same prompt never needs the LLM again.
+
+    Args:
+        prompt (str): The user's prompt.
+
+    Returns:
+        str: The Gmail query.
+    """
+    global _query_model
+    with _init_lock:
+        if _query_model is None:
+            genai = _get_genai()
+            _query_model = genai.GenerativeModel(
+                model_name=select_model(genai),
+                system_instruction=QUERY_ONLY_INSTRUCTION,
+            )
+        model = _query_model
+
+    with metrics.span("llm.round_trip"):
+        response = model.generate_content(prompt)
+    _count_tokens(response)
+    query = response.text.strip().strip("`").strip()
+    remember_translation(prompt, query, "parquet" if "parquet" in prompt.lower() else "csv")
+    return query
+
+
+def send_to_model(chat, content, on_text=None):
+    """
+    Sends one message to Gemini, timing the round-trip and counting the tokens.
+
+    Args:
+        chat: The chat session from get_chat().
+        content: The user's text or the function responses.
+        on_text: Optional function that gets the reply's text piece by piece while it
+                 streams in (without it, the whole reply is awaited at once).
+
+    Returns:
+        The model's (complete) response.
+    """
+    with metrics.span("llm.round_trip"):
+        if on_text is None:
+            response = chat.send_message(content)
+        else:
+            response = chat.send_message(content, stream=True)
+            for chunk in response:
+                for part in _parts_of(chunk):
+                    text = getattr(part, "text", "")
+                    if text:
+                        on_text(text)
+    _count_tokens(response)
+    return response
+
+
+def _parts_of(response) -> list:
+    """
+    Returns the parts of a response's first candidate (an empty list if there is none).
+    """
+    candidates = getattr(response, "candidates", None)
+    if not candidates:
+        return []
+    content = getattr(candidates[0], "content", None)
+    return list(getattr(content, "parts", None) or [])
+
+
+def function_calls_of(response) -> list:
+    """
+    Returns every function call of a response, in order.
+    Gemini can ask for several tools in one response (e.g. two searches).
+    """
+    calls = []
+    for part in _parts_of(response):
+        call = getattr(part, "function_call", None)
+        # Text parts still have an empty function_call field, so we check the name
+        if call is not None and getattr(call, "name", ""):
+            calls.append(call)
+    return calls
+
+
+def text_of(response) -> str:
+    """
+    Returns all the text parts of a response joined together.
+    """
+    return "".join(getattr(part, "text", "") or "" for part in _parts_of(response))
+
+
+def execute_tool(func_name: str, args: dict):
+    """
+    Runs one tool that Gemini asked for.
+
+    Args:
+        func_name (str): The tool's name.
+        args (dict): The arguments Gemini gave.
+
+    Returns:
+        The tool's result, or {"error": ...} when the call cannot be run.
+    """
+    from src.tools.gmail_search_tool import search_gmail
+    from src.tools.csv_export_tool import export_to_csv
+    from src.tools.parquet_export_tool import export_to_parquet
+
+    print_log(PREFIX_TOOL, f"Calling {func_name} with args: {args}")
+    tool_started = time.perf_counter()
+    try:
+        if func_name == "search_gmail":
+            # The function search_gmail expects a keyword argument 'gmail_query'
+            # We must ensure the LLM provides this key
+            if 'gmail_query' not in args:
+                result = {"error": "LLM failed to provide 'gmail_query' argument."}
+            else:
+                result = search_gmail(**args)
+        elif func_name == "export_to_csv":
+            # The function export_to_csv expects a keyword argument 'result_handle'
+            # This is the second step: the handle comes from the search_gmail result,
+            # so the emails themselves never pass through the LLM.
+            if 'result_handle' not in args:
+                result = {"error": "LLM failed to provide 'result_handle' argument from previous tool call."}
+            else:
+                result = export_to_csv(**args)
+        elif func_name == "export_to_parquet":
+            # Same handle as export_to_csv, but a typed, columnar file
+            if 'result_handle' not in args:
+                result = {"error": "LLM failed to provide 'result_handle' argument from previous tool call."}
+            else:
+                result = export_to_parquet(**args)
+        else:
+            result = {"error": f"Unknown function: {func_name}"}
+    except Exception as e:
+        # One failing tool must not lose the results of the others in the same response
+        print_log(PREFIX_TOOL, f"{func_name} failed: {e}")
+        result = {"error": str(e)}
+    metrics.record_duration("tool", time.perf_counter() - tool_started, tool=func_name)
+
+    print_log(PREFIX_TOOL, f"Function completed. Result: {str(result)[:100]}...")
+    return result
+
+
+def run_function_calls(calls) -> list[tuple[str, dict, object]]:
+    """
+    Runs all the function calls of one response, at the same time when there are several.
+
+    Args:
+        calls (list): The function calls from function_calls_of().
+
+    Returns:
+        list: (name, args, result) for every call, in the order Gemini asked for them.
+    """
+    # The Gemini SDK uses a different structure for arguments than OpenAI
+    # We need to extract the args dictionary correctly from the function call object
+    requests = [(call.name, dict(call.args) if call.args else {}) for call in calls]
+    if len(requests) == 1:
+        results = [execute_tool(*requests[0])]
+    else:
+        print_log(PREFIX_TOOL, f"Running {len(requests)} tool calls at the same time.")
+        with ThreadPoolExecutor(max_workers=min(len(requests), MAX_PARALLEL_TOOLS)) as pool:
+            results = list(pool.map(lambda request: execute_tool(*request), requests))
+    return [(name, args, result) for (name, args), result in zip(requests, results)]
+
+
+def run_fast_path(translation: dict) -> str:
+    """
+    Runs search + export for a prompt that was translated without the LLM.
+
+    Args:
+        translation (dict): The result of translate_prompt().
+
+    Returns:
+        str: The message for the user.
+    """
+    from src.tools.gmail_search_tool import search_gmail
+
+    query = translation["query"]
+    # A remembered LLM search may also have used other search_gmail arguments (e.g. columns)
+    search_args = translation.get("search_args") or {}
+    print_log(PREFIX_AGENT, f"Fast path ({translation['source']}): Gmail query '{query}'")
+    metrics.increment("fast_path_turns")
+    with metrics.span("fast_path"):
+        summary = search_gmail(query, **search_args)
+        if "error" in summary:
+            return f"The search for '{query}' failed: {summary['error']}"
+        if summary["count"] == 0:
+            return f"No emails matched the Gmail query '{query}', so nothing was exported."
+        if translation["export"] == "parquet":
+            from src.tools.parquet_export_tool import export_to_parquet
+            file_path = export_to_parquet(summary["result_handle"])
+        else:
+            from src.tools.csv_export_tool import export_to_csv
+            file_path = export_to_csv(summary["result_handle"])
+    return f"Found {summary['count']} email(s) for the Gmail query '{query}'. Saved to: {file_path}"
+
+
+def run_agent_turn(user_input: str, on_text=None) -> str:
     """
     Runs one turn of the conversation.
+    Prompts the local translator understands skip Gemini entirely.
+
+    Args:
+        user_input (str): The user's prompt.
+        on_text: Optional function that gets Gemini's answer piece by piece while it
+                 streams in, so it can be printed before the whole reply has arrived.
+
+    Returns:
+        str: The final answer for the user.
     """
     try:
+        if FAST_PATH_ENABLED:
+            translation = translate_prompt(user_input)
+            if translation is not None:
+                return run_fast_path(translation)
+
         print_log(PREFIX_LLM, "Processing request...")
-        
+        chat = get_chat()
+        # Already loaded by get_chat(), so this import is instant
+        import google.generativeai as genai
+
+        if on_text is not None:
+            turn_started = time.perf_counter()
+            first_text = []
+
+            def forward_text(text: str) -> None:
+                # Time to first output: how long the user waited for the first words
+                if not first_text:
+                    first_text.append(text)
+                    metrics.record_duration("llm.first_text", time.perf_counter() - turn_started)
+                on_text(text)
+        else:
+            forward_text = None
+
         # Send message
-        response = chat.send_message(user_input)
-        
-        # Handle function calls
-        max_iterations = 5
-        iteration = 0
-        
-        while iteration < max_iterations:
-            # Check if there's a function call
+        response = send_to_model(chat, user_input, forward_text)
+
+        # What the LLM searched (all the arguments) and exported, so we can remember its translation
+        searches = []
+        export_format = None
+
+        for _ in range(MAX_ROUND_TRIPS):
             if not response.candidates:
                 return "I encountered an error. Please try again."
-            
-            part = response.candidates[0].content.parts[0]
-            
-            # If it's text, we're done
-            if hasattr(part, 'text') and part.text:
-                return part.text
-            
-            # If it's a function call, execute it
-            if hasattr(part, 'function_call'):
-                fc = part.function_call
-                func_name = fc.name
-                
-                # Parse arguments
-                # The Gemini SDK uses a different structure for arguments than OpenAI
-                # We need to extract the args dictionary correctly from the function call object
-                args = dict(fc.args) if fc.args else {}
-                
-                print_log(PREFIX_TOOL, f"Calling {func_name} with args: {args}")
-                
-                # Execute the function
-                if func_name == "search_gmail":
-                    # The function search_gmail expects a keyword argument 'gmail_query'
-                    # We must ensure the LLM provides this key
-                    if 'gmail_query' not in args:
-                        result = {"error": "LLM failed to provide 'gmail_query' argument."}
-                    else:
-                        result = search_gmail(**args)
-                elif func_name == "export_to_csv":
-                    # The function export_to_csv expects a keyword argument 'email_data'
-                    # This is the second step, and the data should come from the previous tool call result
-                    # The LLM is expected to pass the result of the previous tool call here.
-                    if 'email_data' not in args:
-                        result = {"error": "LLM failed to provide 'email_data' argument from previous tool call."}
-                    else:
-                        result = export_to_csv(**args)
-                else:
-                    result = {"error": f"Unknown function: {func_name}"}
-                
-                print_log(PREFIX_TOOL, f"Function completed. Result: {str(result)[:100]}...")
-                
-                # Send result back to model
-                response = chat.send_message(
-                    genai.types.content_types.to_content({
-                        "parts": [{
+
+            calls = function_calls_of(response)
+
+            # No function calls left: the text is the final answer
+            if not calls:
+                # One search followed by an export: next time this prompt can skip the LLM
+                if len(searches) == 1 and export_format:
+                    search_args = {key: value for key, value in searches[0].items() if key != "gmail_query" and value}
+                    remember_translation(user_input, searches[0]["gmail_query"], export_format, search_args=search_args)
+                return text_of(response) or "Task completed successfully!"
+
+            # Run every tool of this response, then send all the results back in ONE message
+            executed = run_function_calls(calls)
+            for func_name, args, result in executed:
+                if func_name == "search_gmail" and "gmail_query" in args:
+                    searches.append(dict(args))
+                elif func_name in ("export_to_csv", "export_to_parquet") and "result_handle" in args:
+                    export_format = "parquet" if func_name == "export_to_parquet" else "csv"
+
+            response = send_to_model(
+                chat,
+                genai.types.content_types.to_content({
+                    "parts": [
+                        {
                             "function_response": {
                                 "name": func_name,
                                 "response": {"result": result}
                             }
-                        }]
-                    })
-                )
-                
-                iteration += 1
-            else:
-                break
-        
+                        }
+                        for func_name, _, result in executed
+                    ]
+                }),
+                forward_text,
+            )
+
         # If we get here, return whatever we have
-        if response.text:
-            return response.text
-        else:
-            return "Task completed successfully!"
-            
+        return text_of(response) or "Task completed successfully!"
+
     except Exception as e:
         print_log(PREFIX_AGENT, f"Error: {e}")
         return f"I encountered an error: {e}"
\ No newline at end of file
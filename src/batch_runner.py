@@ -0,0 +1,268 @@
+# File: src/batch_runner.py
+# Non-interactive batch mode: runs a whole file of prompts or Gmail queries at once.
+# We log in once, sync the metadata cache once and then run the searches in a small
+# pool of threads. Each search streams straight into its own export file, and a
+# manifest.json records what every line produced (file, row count, timing, errors).
+#
+# Batch file format (one search per line):
+#   # Lines starting with "#" are comments
+#   q: label:finance newer_than:1d        <- a raw Gmail query
+#   emails from bob@example.com as parquet <- a prompt (translated like in chat mode)
+
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src import metrics
+from src.query_translator import translate_prompt
+from src.utils import print_log, PREFIX_AGENT, PREFIX_TOOL
+
+# --- Configuration ---
+
+OUTPUT_DIR = "results"
+
+# How many searches run at the same time (they share one Gmail quota)
+DEFAULT_CONCURRENCY = 4
+
+# Prefixes that mark a line as a raw Gmail query instead of a prompt
+QUERY_PREFIXES = ("q:", "query:")
+
+# Longest file-name part taken from a query
+MAX_SLUG_LENGTH = 40
+
+
+def read_batch_file(path: str, default_export: str = "csv") -> list[dict]:
+    """
+    Reads a batch file into a list of jobs.
+
+    Args:
+        path (str): The batch file (one prompt or "q: <gmail query>" per line).
+        default_export (str): Export format for raw queries ("csv" or "parquet").
+
+    Returns:
+        list[dict]: One job per line, with line, input and kind ("query" or "prompt").
+    """
+    jobs = []
+    with open(path, "r", encoding="utf-8-sig") as batch_file:
+        for line_number, line in enumerate(batch_file, start=1):
+            text = line.strip()
+            if not text or text.startswith("#"):
+                continue
+            job = {"line": line_number, "input": text, "kind": "prompt", "export": default_export}
+            for prefix in QUERY_PREFIXES:
+                if text.lower().startswith(prefix):
+                    job["kind"] = "query"
+                    job["query"] = text[len(prefix):].strip()
+                    break
+            jobs.append(job)
+    return jobs
+
+
+def resolve_queries(jobs: list[dict]) -> None:
+    """
+    Turns every prompt job into a Gmail query (in place).
+
+    The local translator and its cache are tried first. Only prompts it does not
+    understand are sent to Gemini, one at a time, before any search starts.
+    """
+    for job in jobs:
+        if job["kind"] == "query":
+            job["source"] = "raw"
+            continue
+        translation = translate_prompt(job["input"])
+        if translation is not None:
+            job.update(query=translation["query"], export=translation["export"], source=translation["source"])
+        else:
+            try:
+                from src.agent_runner import translate_query_with_llm
+                job["query"] = translate_query_with_llm(job["input"])
+                job["source"] = "llm"
+                if "parquet" in job["input"].lower():
+                    job["export"] = "parquet"
+            except Exception as error:
+                job["error"] = f"Could not translate the prompt: {error}"
+        print_log(PREFIX_AGENT, f"Line {job['line']}: '{job['input']}' -> '{job.get('query', '?')}'")
+
+
+def _slug(text: str) -> str:
+    slug = re.sub(r"[^\w]+", "_", text.lower(), flags=re.UNICODE).strip("_")
+    return slug[:MAX_SLUG_LENGTH] or "all_mail"
+
+
+def run_job(job: dict, index: int, output_dir: str, records=None) -> dict:
+    """
+    Runs one search and streams its results into an export file.
+
+    Args:
+        job (dict): A job with a "query" (see resolve_queries()).
+        index (int): The job's position, used in the file name.
+        output_dir (str): Where to save the export.
+        records: The emails that were already fetched for this query, as an EmailTable
+                 (see fetch_deduplicated()). None means search now.
+
+    Returns:
+        dict: The job's manifest entry.
+    """
+    from src.tools import columns as column_config
+    from src.tools.batch_fetch_tool import new_fetch_stats
+    from src.tools.email_table import fetch_columns_for, iter_email_rows
+    from src.tools.gmail_search_tool import iter_gmail
+    from src.tools.gmail_session import get_session
+
+    entry = {key: job.get(key) for key in ("line", "input", "kind", "query", "source", "export")}
+    if job.get("error"):
+        entry.update(status="error", error=job["error"], rows=0, seconds=0.0, file=None)
+        return entry
+
+    extension = "parquet" if job["export"] == "parquet" else "csv"
+    file_path = os.path.join(output_dir, f"{index:03d}_{_slug(job['query'])}.{extension}")
+    stats = new_fetch_stats() if records is None else None
+    columns = column_config.normalize_columns(None)
+    started = time.perf_counter()
+    try:
+        if records is None:
+            # The same rows as search_gmail(): UTC dates and --since/--until (see iter_email_rows())
+            emails = iter_gmail(job["query"], stats=stats, sync_cache=False, columns=fetch_columns_for(columns),
+                                raw=True)
+            records = iter_email_rows(emails, columns, get_session().label_map())
+        if extension == "parquet":
+            from src.tools.parquet_export_tool import stream_to_parquet
+            file_path, rows = stream_to_parquet(records, file_path, columns=columns)
+        else:
+            from src.tools.csv_export_tool import stream_to_csv
+            file_path, rows = stream_to_csv(records, file_path, columns=columns)
+        entry.update(status="ok", file=file_path, rows=rows)
+    except Exception as error:
+        print_log(PREFIX_TOOL, f"Batch line {job['line']} failed: {error}")
+        entry.update(status="error", error=str(error), file=None, rows=0)
+    entry["seconds"] = round(time.perf_counter() - started, 3)
+    if stats is not None:
+        entry.update(api_calls=stats["api_calls"], retries=stats["retries"], cache_hits=stats["cache_hits"],
+                     failed_messages=stats["failed"])
+    metrics.record_duration("batch.job", entry["seconds"], status=entry["status"])
+    return entry
+
+
+def prepare_session():
+    """
+    Logs in, loads the label map and syncs the metadata cache ONCE for all jobs.
+    """
+    from src.tools import metadata_cache
+    from src.tools.gmail_session import get_session
+    from src.tools.rate_limiter import get_shared_limiter
+
+    session = get_session()
+    service = session.service()
+    session.label_map(limiter=get_shared_limiter())
+    if metadata_cache.CACHE_ENABLED:
+        metadata_cache.get_cache().sync(service, limiter=get_shared_limiter())
+
+
+def _write_manifest(path: str, manifest: dict) -> None:
+    temp_path = path + ".part"
+    with open(temp_path, "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def fetch_deduplicated(jobs: list[dict]) -> tuple[dict, dict]:
+    """
+    Fetches the emails of all jobs at once, so messages matched by several
+    queries are fetched only once (see collect_gmail_many()). Each query's emails
+    go into an EmailTable, which gets --sort, --since and --until like search_gmail().
+
+    Returns:
+        tuple: (query -> EmailTable, de-duplication summary for the manifest)
+    """
+    from src.tools import columns as column_config
+    from src.tools.batch_fetch_tool import new_fetch_stats
+    from src.tools.email_table import EmailTable, apply_date_options, fetch_columns_for
+    from src.tools.gmail_search_tool import collect_gmail_many
+    from src.tools.gmail_session import get_session
+
+    queries = [job["query"] for job in jobs if not job.get("error")]
+    columns = column_config.normalize_columns(None)
+    stats = new_fetch_stats()
+    outcome = collect_gmail_many(queries, stats=stats, sync_cache=False, columns=fetch_columns_for(columns), raw=True)
+    label_map = get_session().label_map()
+    tables = {}
+    for query, emails in outcome["results"].items():
+        table = EmailTable(columns, label_map)
+        for email in emails:
+            table.append(email)
+        tables[query] = apply_date_options(table)
+    summary = {
+        "listed": outcome["listed"],
+        "unique": outcome["unique"],
+        "saved_fetches": outcome["saved_fetches"],
+        "api_calls": stats["api_calls"],
+        "retries": stats["retries"],
+        "cache_hits": stats["cache_hits"],
+        "failed_messages": stats["failed"],
+    }
+    return tables, summary
+
+
+def run_batch(
+    batch_file: str,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    output_dir: str | None = None,
+    default_export: str = "csv",
+    dedup: bool = True,
+) -> dict:
+    """
+    Runs every search of a batch file and writes one export per line plus a manifest.
+
+    Args:
+        batch_file (str): The file of prompts / "q:" queries.
+        concurrency (int): How many searches run at the same time.
+        output_dir (str): Where to save the exports (defaults to a new timestamped
+                          folder in OUTPUT_DIR).
+        default_export (str): Export format for raw queries ("csv" or "parquet").
+        dedup (bool): Fetch messages shared by several queries only once. This keeps
+                      all results in memory until they are exported; with False every
+                      search streams straight to its file instead.
+
+    Returns:
+        dict: The manifest (also saved as manifest.json in the output folder).
+    """
+    jobs = read_batch_file(batch_file, default_export=default_export)
+    if output_dir is None:
+        output_dir = os.path.join(OUTPUT_DIR, time.strftime("batch_%Y-%m-%d_%H%M%S"))
+    os.makedirs(output_dir, exist_ok=True)
+    print_log(PREFIX_AGENT, f"Batch: {len(jobs)} search(es) from {batch_file}, {concurrency} at a time.")
+
+    started = time.perf_counter()
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+    resolve_queries(jobs)
+    prepare_session()
+
+    results, dedup_summary = fetch_deduplicated(jobs) if dedup else ({}, None)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch") as pool:
+        futures = [
+            pool.submit(run_job, job, index, output_dir, results.get(job.get("query")) if dedup else None)
+            for index, job in enumerate(jobs, start=1)
+        ]
+        entries = [future.result() for future in futures]
+
+    manifest = {
+        "batch_file": os.path.abspath(batch_file),
+        "started_at": started_at,
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+        "concurrency": concurrency,
+        "succeeded": sum(1 for entry in entries if entry["status"] == "ok"),
+        "failed": sum(1 for entry in entries if entry["status"] != "ok"),
+        "rows": sum(entry["rows"] for entry in entries),
+        "dedup": dedup_summary,
+        "jobs": entries,
+    }
+    manifest_path = os.path.join(output_dir, "manifest.json")
+    _write_manifest(manifest_path, manifest)
+    print_log(
+        PREFIX_AGENT,
+        f"Batch done in {manifest['elapsed_seconds']}s: {manifest['succeeded']} ok, "
+        f"{manifest['failed']} failed, {manifest['rows']} rows. Manifest: {manifest_path}",
+    )
+    return manifest
@@ -0,0 +1,432 @@
+# File: src/bench/fake_gmail.py
+# A fake Gmail API that runs inside our own process, for benchmarks and offline checks.
+# It serves a synthetic mailbox through an httplib2-compatible object, so the real
+# googleapiclient code (services, batch requests, retries) runs unchanged against it.
+
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from zoneinfo import ZoneInfo
+from urllib.parse import urlsplit, parse_qs
+
+import httplib2
+
+# The newest synthetic message is dated here; older ones go back in time
+MAILBOX_NEWEST = datetime(2025, 10, 27, 12, 0, tzinfo=timezone.utc)
+
+# The time zone Gmail reads after:/before: dates in
+GMAIL_TIME_ZONE = ZoneInfo("America/Los_Angeles")
+
+SYSTEM_LABELS = ["INBOX", "UNREAD", "IMPORTANT", "SENT", "STARRED", "CATEGORY_UPDATES"]
+
+SUBJECT_WORDS = ["invoice", "receipt", "travel", "meeting", "project", "update", "report",
+                 "חשבונית", "order", "newsletter", "urgent", "welcome", "reminder"]
+
+
+class SyntheticMailbox:
+    """
+    A deterministic, made-up mailbox. Messages are generated from their index on
+    demand, so even a very large mailbox needs almost no memory.
+    """
+
+    def __init__(
+        self,
+        size: int = 1000,
+        label_count: int = 20,
+        header_size: int = 60,
+        thread_size: int = 3,
+        minutes_between: int = 37,
+        seed: int = 42,
+    ):
+        """
+        Args:
+            size (int): Number of messages.
+            label_count (int): Number of user labels (system labels are added on top).
+            header_size (int): Approximate length of the Subject header, in characters.
+            thread_size (int): Messages per conversation thread.
+            minutes_between (int): Time between two consecutive messages.
+            seed (int): Seed that makes the mailbox reproducible.
+        """
+        self.size = size
+        self.header_size = header_size
+        self.thread_size = max(1, thread_size)
+        self.minutes_between = minutes_between
+        self.seed = seed
+        self.user_labels = {f"Label_{i}": f"Project-{i}" for i in range(label_count)}
+        self.labels = {label: label for label in SYSTEM_LABELS}
+        self.labels.update(self.user_labels)
+        self._user_label_ids = list(self.user_labels)
+        self.history_id = 100_000
+
+    # --- Message generation ---
+
+    @staticmethod
+    def message_id(index: int) -> str:
+        return f"{index + 0x18a00000000:016x}"
+
+    @staticmethod
+    def index_of(message_id: str) -> int:
+        return int(message_id, 16) - 0x18a00000000
+
+    def thread_id(self, index: int) -> str:
+        return self.message_id(index - index % self.thread_size)
+
+    def timestamp(self, index: int) -> datetime:
+        return MAILBOX_NEWEST - timedelta(minutes=index * self.minutes_between)
+
+    def label_ids(self, index: int) -> list[str]:
+        labels = ["INBOX"]
+        if index % 3 == 0:
+            labels.append("UNREAD")
+        if index % 7 == 0:
+            labels.append("IMPORTANT")
+        if self._user_label_ids:
+            labels.append(self._user_label_ids[(index * 7 + self.seed) % len(self._user_label_ids)])
+        return labels
+
+    def sender(self, index: int) -> str:
+        return f"sender{(index * 13 + self.seed) % 50}@example.com"
+
+    def subject(self, index: int) -> str:
+        word = SUBJECT_WORDS[(index + self.seed) % len(SUBJECT_WORDS)]
+        base = f"{word.capitalize()} #{index}"
+        return (base + " " + "x" * self.header_size)[: max(self.header_size, len(base))]
+
+    def message(self, index: int, metadata_headers: list[str] | None = None) -> dict:
+        """
+        Builds the messages.get(format="metadata") resource of one message.
+        """
+        sent = self.timestamp(index)
+        headers = [
+            {"name": "Date", "value": format_datetime(sent)},
+            {"name": "Subject", "value": self.subject(index)},
+            {"name": "From", "value": self.sender(index)},
+            {"name": "To", "value": "me@example.com"},
+        ]
+        if metadata_headers:
+            wanted = {name.lower() for name in metadata_headers}
+            headers = [header for header in headers if header["name"].lower() in wanted]
+        return {
+            "id": self.message_id(index),
+            "threadId": self.thread_id(index),
+            "labelIds": self.label_ids(index),
+            "snippet": f"Synthetic message {index}",
+            "sizeEstimate": 2000 + self.header_size * 4,
+            "historyId": str(self.history_id),
+            "internalDate": str(int(sent.timestamp() * 1000)),
+            "payload": {"mimeType": "text/plain", "headers": headers},
+        }
+
+    def thread(self, first: int, metadata_headers: list[str] | None = None) -> dict:
+        """
+        Builds the threads.get(format="metadata") resource of the thread starting at `first`.
+        """
+        indexes = range(first, min(first + self.thread_size, self.size))
+        # Gmail lists the messages of a thread oldest first
+        messages = [self.message(index, metadata_headers) for index in reversed(indexes)]
+        return {"id": self.message_id(first), "historyId": str(self.history_id), "messages": messages}
+
+    # --- Query matching ---
+
+    def matching_indexes(self, query: str):
+        """
+        Yields the indexes (newest first) of messages matching a Gmail query.
+
+        Supported: label:, from:, after:/before: (epoch seconds or YYYY/MM/DD),
+        newer_than:Nd and bare words (matched in the subject). Others are ignored.
+        """
+        filters = []
+        # Messages get older as the index grows, so date bounds narrow the range to scan
+        first, stop = 0, self.size
+        step = self.minutes_between * 60
+        for token in (query or "").split():
+            # Brackets only group terms; the fake applies all terms together anyway
+            token = token.strip("()")
+            key, _, value = token.partition(":")
+            key = key.lower()
+            if value and key == "label":
+                wanted = value.lower()
+                filters.append(lambda i, w=wanted: any(
+                    w in (label_id.lower(), self.labels.get(label_id, "").lower())
+                    for label_id in self.label_ids(i)))
+            elif value and key == "from":
+                filters.append(lambda i, w=value.lower(): w in self.sender(i))
+            elif value and key in ("after", "before"):
+                bound = _parse_query_date(value)
+                position = (MAILBOX_NEWEST.timestamp() - bound) / step if step else 0
+                if key == "after":
+                    filters.append(lambda i, b=bound: self.timestamp(i).timestamp() > b)
+                    stop = min(stop, max(0, int(position) + 1)) if step else stop
+                else:
+                    filters.append(lambda i, b=bound: self.timestamp(i).timestamp() < b)
+                    first = max(first, int(position)) if step else first
+            elif value and key == "newer_than" and value[:-1].isdigit():
+                days = int(value[:-1]) * {"d": 1, "m": 30, "y": 365}.get(value[-1], 1)
+                bound = (MAILBOX_NEWEST - timedelta(days=days)).timestamp()
+                filters.append(lambda i, b=bound: self.timestamp(i).timestamp() > b)
+            elif not value:
+                filters.append(lambda i, w=token.lower(): w in self.subject(i).lower())
+        for index in range(first, stop):
+            if all(check(index) for check in filters):
+                yield index
+
+
+def _parse_query_date(value: str) -> float:
+    # Like Gmail, dates are midnight Pacific time
+    if value.isdigit():
+        return float(value)
+    return datetime.strptime(value.replace("-", "/"), "%Y/%m/%d").replace(tzinfo=GMAIL_TIME_ZONE).timestamp()
+
+
+def _parse_fields_mask(mask: str) -> dict:
+    """
+    Parses a partial-response mask such as "id,payload/headers,messages(id,threadId)"
+    into a tree: {"id": {}, "payload": {"headers": {}}, "messages": {"id": {}, "threadId": {}}}.
+    An empty dict means "keep the whole value".
+    """
+    tree = {}
+    depth = 0
+    start = 0
+    parts = []
+    for position, char in enumerate(mask + ","):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append(mask[start:position].strip())
+            start = position + 1
+    for part in filter(None, parts):
+        if "(" in part and ("/" not in part or part.index("(") < part.index("/")):
+            name, _, inner = part.partition("(")
+            tree.setdefault(name, {}).update(_parse_fields_mask(inner[:-1]))
+        else:
+            name, _, rest = part.partition("/")
+            subtree = tree.setdefault(name, {})
+            if rest:
+                subtree.update(_parse_fields_mask(rest))
+    return tree
+
+
+def apply_fields_mask(value, tree: dict):
+    """
+    Keeps only the parts of a JSON value selected by a parsed fields mask.
+    Lists are filtered item by item, like the real API does.
+    """
+    if not tree:
+        return value
+    if isinstance(value, list):
+        return [apply_fields_mask(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {key: apply_fields_mask(value[key], subtree) for key, subtree in tree.items() if key in value}
+
+
+class FakeGmailBackend:
+    """
+    Answers Gmail API requests for a SyntheticMailbox and counts the traffic.
+
+    One backend can be shared by many FakeGmailHttp objects (one per thread).
+    """
+
+    def __init__(self, mailbox: SyntheticMailbox, latency: float = 0.0, error_rate: float = 0.0, seed: int = 7):
+        """
+        Args:
+            mailbox (SyntheticMailbox): The mailbox to serve.
+            latency (float): Seconds added to every HTTP request (network round-trip).
+            error_rate (float): Chance (0..1) that a single API call answers 429.
+            seed (int): Seed for the injected errors.
+        """
+        self.mailbox = mailbox
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._list_cache = {}
+        self.counters = {
+            "http_requests": 0, "api_calls": 0, "batch_sub_requests": 0, "injected_429": 0,
+            "bytes_sent": 0, "bytes_received": 0,
+        }
+        # Scripted errors for tests: message ID -> HTTP statuses its next messages.get calls answer
+        self.failures = {}
+        # The changes served by history.list (see add_history()). A startHistoryId older
+        # than oldest_history_id answers 404, like history Gmail no longer keeps.
+        self.history = []
+        self.oldest_history_id = 0
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    def _should_fail(self) -> bool:
+        if self.error_rate <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def _scripted_failure(self, path: str) -> int | None:
+        match = re.fullmatch(r"/messages/([0-9a-f]+)", path)
+        if not match:
+            return None
+        with self._lock:
+            statuses = self.failures.get(match.group(1))
+            return statuses.pop(0) if statuses else None
+
+    def add_history(self, **changes) -> str:
+        """
+        Records one mailbox change for history.list, e.g.
+        add_history(labelsAdded=[{"message": {"id": message_id}, "labelIds": ["STARRED"]}]).
+        The synthetic messages themselves do not change.
+
+        Returns:
+            str: The new historyId of the mailbox.
+        """
+        with self._lock:
+            self.mailbox.history_id += 1
+            self.history.append({"id": str(self.mailbox.history_id), **changes})
+            return str(self.mailbox.history_id)
+
+    def _history(self, params: dict) -> tuple[int, dict]:
+        # historyTypes is ignored: every recorded change is returned
+        start = int(params.get("startHistoryId", ["0"])[0])
+        if start < self.oldest_history_id:
+            return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+        with self._lock:
+            records = [record for record in self.history if int(record["id"]) > start]
+        return 200, {"history": records, "historyId": str(self.mailbox.history_id)}
+
+    def _matches(self, query: str) -> list[int]:
+        # Listing is repeated page by page, so remember the full match list per query
+        with self._lock:
+            cached = self._list_cache.get(query)
+        if cached is None:
+            cached = list(self.mailbox.matching_indexes(query))
+            with self._lock:
+                self._list_cache[query] = cached
+        return cached
+
+    def handle(self, method: str, uri: str) -> tuple[int, dict]:
+        """
+        Answers ONE API call.
+
+        Returns:
+            tuple: (HTTP status, JSON body)
+        """
+        self._count("api_calls")
+        if self._should_fail():
+            self._count("injected_429")
+            return 429, {"error": {"code": 429, "message": "Rate Limit Exceeded",
+                                   "errors": [{"reason": "rateLimitExceeded"}]}}
+
+        parts = urlsplit(uri)
+        params = parse_qs(parts.query)
+        path = re.sub(r"^.*/gmail/v1/users/[^/]+", "", parts.path)
+        status = self._scripted_failure(path)
+        if status is not None:
+            return status, {"error": {"code": status, "message": "Scripted failure"}}
+        status, payload = self._route(method, path, params)
+        if status == 200 and "fields" in params:
+            payload = apply_fields_mask(payload, _parse_fields_mask(params["fields"][0]))
+        return status, payload
+
+    def _route(self, method: str, path: str, params: dict) -> tuple[int, dict]:
+
+        if path == "/labels":
+            return 200, {"labels": [{"id": label_id, "name": name, "type": "user" if label_id.startswith("Label_") else "system"}
+                                    for label_id, name in self.mailbox.labels.items()]}
+        if path == "/profile":
+            return 200, {"emailAddress": "me@example.com", "messagesTotal": self.mailbox.size,
+                         "historyId": str(self.mailbox.history_id)}
+        if path == "/history":
+            return self._history(params)
+        if path == "/messages":
+            return 200, self._list(params, self.mailbox.message_id, "messages")
+        if path == "/threads":
+            return 200, self._list(params, self.mailbox.message_id, "threads", self._thread_matches)
+        match = re.fullmatch(r"/threads/([0-9a-f]+)", path)
+        if match:
+            first = self.mailbox.index_of(match.group(1))
+            if not 0 <= first < self.mailbox.size or first % self.mailbox.thread_size:
+                return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+            return 200, self.mailbox.thread(first, params.get("metadataHeaders"))
+        match = re.fullmatch(r"/messages/([0-9a-f]+)", path)
+        if match:
+            index = self.mailbox.index_of(match.group(1))
+            if not 0 <= index < self.mailbox.size:
+                return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+            return 200, self.mailbox.message(index, params.get("metadataHeaders"))
+        return 404, {"error": {"code": 404, "message": f"Fake Gmail does not know {method} {path}"}}
+
+    def _thread_matches(self, query: str) -> list[int]:
+        # A thread matches if any of its messages does; it is named after its newest message
+        size = self.mailbox.thread_size
+        return list(dict.fromkeys(index - index % size for index in self._matches(query)))
+
+    def _list(self, params: dict, make_id, key: str, matcher=None) -> dict:
+        query = params.get("q", [""])[0]
+        page_size = int(params.get("maxResults", ["100"])[0])
+        start = int(params.get("pageToken", ["0"])[0])
+        matches = (matcher or self._matches)(query)
+        page = matches[start:start + page_size]
+        response = {key: [{"id": make_id(i), "threadId": self.mailbox.thread_id(i)} for i in page],
+                    "resultSizeEstimate": len(matches)}
+        if start + page_size < len(matches):
+            response["nextPageToken"] = str(start + page_size)
+        return response
+
+
+class FakeGmailHttp:
+    """
+    An httplib2.Http stand-in that sends every request to a FakeGmailBackend.
+    It understands normal requests and multipart/mixed batch requests.
+    """
+
+    def __init__(self, backend: FakeGmailBackend):
+        self.backend = backend
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=None, connection_type=None):
+        backend = self.backend
+        backend._count("http_requests")
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        backend._count("bytes_sent", len(uri) + len(body or b""))
+        if backend.latency:
+            time.sleep(backend.latency)
+
+        content_type = (headers or {}).get("content-type", "")
+        if uri.rstrip("/").endswith("/batch") or "/batch/" in uri:
+            status, response_headers, content = 200, *self._batch(body, content_type)
+        else:
+            status, payload = backend.handle(method, uri)
+            response_headers = {"content-type": "application/json; charset=UTF-8"}
+            content = json.dumps(payload).encode("utf-8")
+
+        backend._count("bytes_received", len(content))
+        response_headers["status"] = str(status)
+        return httplib2.Response(response_headers), content
+
+    def _batch(self, body: bytes, content_type: str) -> tuple[dict, bytes]:
+        boundary = re.search(r'boundary="?([^";]+)"?', content_type).group(1)
+        answers = []
+        for part in body.decode("utf-8").split("--" + boundary)[1:]:
+            if part.startswith("--"):
+                break
+            part_headers, _, inner = part.replace("\r\n", "\n").partition("\n\n")
+            content_id = re.search(r"Content-ID: <(.+?)>", part_headers).group(1)
+            request_line = inner.strip().split("\n", 1)[0]
+            sub_method, sub_path, _ = request_line.split(" ", 2)
+            self.backend._count("batch_sub_requests")
+            status, payload = self.backend.handle(sub_method, sub_path)
+            answers.append(
+                f"--BATCH_BOUNDARY\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{json.dumps(payload)}\r\n"
+            )
+        content = ("".join(answers) + "--BATCH_BOUNDARY--").encode("utf-8")
+        return {"content-type": "multipart/mixed; boundary=BATCH_BOUNDARY"}, content
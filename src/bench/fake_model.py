@@ -0,0 +1,158 @@
+# File: src/bench/fake_model.py
+# A scripted stand-in for the Gemini chat session, for offline benchmarks of the
+# agent loop (see replay_agent.py). Instead of thinking, it plays back recorded
+# responses: function calls and text, one response per round-trip.
+#
+# A script turn looks like this (JSON):
+#   {"prompt": "invoices as csv",
+#    "responses": [
+#      [{"function_call": {"name": "search_gmail", "args": {"gmail_query": "invoice"}}}],
+#      [{"function_call": {"name": "export_to_csv", "args": {"result_handle": "{result_handle}"}}}],
+#      [{"text": "Saved {count:.0f} emails to {export_to_csv}."}]]}
+#
+# Strings like "{result_handle}" are filled in (str.format) from the function
+# responses the fake model received: every key of a dictionary result, the tool's
+# name for its latest result (e.g. the file path of an export), and "results" for
+# the list of results of the last message, e.g. "{results[1][result_handle]}" for
+# the second of two searches run at the same time. Numbers come back as floats.
+
+import time
+import google.generativeai as genai
+from google.generativeai import protos
+
+# Characters per streamed text chunk
+CHUNK_CHARS = 16
+
+# Rough size of one token, used to fill in the usage metadata
+BYTES_PER_TOKEN = 4
+
+
+class ScriptError(Exception):
+    """
+    Raised when the agent does something the script did not expect
+    (e.g. asks for more round-trips than the turn has responses).
+    """
+
+
+class ScriptedChat:
+    """
+    Behaves like a google.generativeai ChatSession, but answers from a script.
+
+    It also measures what a real chat would send and receive: the request is the
+    whole conversation so far (the SDK sends the history every time) plus the new
+    message, and the answer is the serialized response.
+    """
+
+    def __init__(self, latency: float = 0.0, chunk_delay: float = 0.0):
+        """
+        Args:
+            latency (float): Seconds before the first part of every answer (model "thinking").
+            chunk_delay (float): Seconds between two streamed chunks.
+        """
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.history = []
+        self.variables = {}
+        self._responses = []
+        self.reset_counters()
+
+    def reset_counters(self) -> None:
+        self.counters = {"round_trips": 0, "sent_bytes": 0, "received_bytes": 0}
+
+    def start_turn(self, responses: list[list[dict]]) -> None:
+        """
+        Loads the responses of the next turn (one list of parts per round-trip).
+        """
+        self._responses = list(responses)
+        self.reset_counters()
+
+    @property
+    def unused_responses(self) -> int:
+        return len(self._responses)
+
+    def _remember_results(self, content) -> None:
+        # The values the script may refer to, e.g. {result_handle}
+        results = []
+        for part in content.parts:
+            if not part.function_response.name:
+                continue
+            response = type(part.function_response).to_dict(part.function_response)
+            result = response.get("response", {}).get("result")
+            if isinstance(result, dict):
+                self.variables.update(result)
+            self.variables[response["name"]] = result
+            results.append(result)
+        if results:
+            self.variables["results"] = results
+
+    def _fill(self, value):
+        if isinstance(value, str):
+            try:
+                return value.format_map(self.variables)
+            except (KeyError, ValueError, IndexError) as error:
+                raise ScriptError(f"Cannot fill in {value!r}: {error}") from None
+        if isinstance(value, dict):
+            return {key: self._fill(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._fill(item) for item in value]
+        return value
+
+    def _chunks(self, parts: list[dict]) -> list[protos.GenerateContentResponse]:
+        # Text is streamed in small pieces; a function call always arrives whole
+        chunks = []
+        for part in parts:
+            if "function_call" in part:
+                call = self._fill(part["function_call"])
+                pieces = [protos.Part(function_call=protos.FunctionCall(name=call["name"], args=call.get("args", {})))]
+            else:
+                text = self._fill(part.get("text", ""))
+                pieces = [protos.Part(text=text[start:start + CHUNK_CHARS]) for start in range(0, len(text), CHUNK_CHARS)]
+            for piece in pieces:
+                chunks.append(protos.GenerateContentResponse(
+                    candidates=[protos.Candidate(content=protos.Content(role="model", parts=[piece]), index=0)]
+                ))
+        # An empty answer is still one (empty) chunk
+        return chunks or [protos.GenerateContentResponse(
+            candidates=[protos.Candidate(content=protos.Content(role="model"), index=0)]
+        )]
+
+    def send_message(self, content, stream: bool = False):
+        """
+        Plays back the next scripted response (like ChatSession.send_message).
+        """
+        if isinstance(content, str):
+            content = protos.Content(role="user", parts=[protos.Part(text=content)])
+        self._remember_results(content)
+        self.history.append(content)
+        sent_bytes = sum(len(protos.Content.serialize(item)) for item in self.history)
+        if not self._responses:
+            raise ScriptError("The agent asked for more round-trips than the script has responses.")
+        chunks = self._chunks(self._responses.pop(0))
+
+        merged = protos.GenerateContentResponse(candidates=[protos.Candidate(
+            content=protos.Content(role="model", parts=[part for chunk in chunks for part in chunk.candidates[0].content.parts]),
+            index=0,
+        )])
+        received_bytes = len(protos.GenerateContentResponse.serialize(merged))
+        # The usage metadata comes with the last chunk, like from the real API
+        chunks[-1].usage_metadata.prompt_token_count = sent_bytes // BYTES_PER_TOKEN
+        chunks[-1].usage_metadata.candidates_token_count = received_bytes // BYTES_PER_TOKEN
+        self.history.append(merged.candidates[0].content)
+        self.counters["round_trips"] += 1
+        self.counters["sent_bytes"] += sent_bytes
+        self.counters["received_bytes"] += received_bytes
+
+        if not stream:
+            time.sleep(self.latency + self.chunk_delay * (len(chunks) - 1))
+            merged.usage_metadata.prompt_token_count = sent_bytes // BYTES_PER_TOKEN
+            merged.usage_metadata.candidates_token_count = received_bytes // BYTES_PER_TOKEN
+            return genai.types.GenerateContentResponse.from_response(merged)
+
+        def play():
+            time.sleep(self.latency)
+            for number, chunk in enumerate(chunks):
+                if number:
+                    time.sleep(self.chunk_delay)
+                yield chunk
+
+        return genai.types.GenerateContentResponse.from_iterator(play())
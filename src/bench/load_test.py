@@ -0,0 +1,231 @@
+# File: src/bench/load_test.py
+# Load test for the ADK agent's tools: N agent sessions at the same time on ONE
+# asyncio event loop (the way "adk web" and "adk api_server" serve them), against
+# the fake Gmail backend. Each session does what the agent does for one prompt:
+# search_gmail, then export_to_csv with the returned handle.
+#
+#   --mode async     the async tools from async_tools.py (what agent.py registers)
+#   --mode blocking  the plain tools called on the event loop (what a sync tool does)
+#
+# Besides the session latencies it measures the event loop's lag: how late a
+# 10 ms timer fires. A blocking tool shows up there as a lag of a whole search.
+#
+# Example:
+#   python -m src.bench.load_test --sessions 20 --messages 2000 --latency-ms 20
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import tempfile
+import time
+
+from src import metrics
+from src.bench import run_benchmark
+from src.tools import async_tools, csv_export_tool, gmail_search_tool, local_index, metadata_cache
+from src.tools.gmail_session import set_session
+from src.utils import print_log, set_log_level, PREFIX_AGENT
+
+# How often the lag probe wakes up (seconds)
+PROBE_INTERVAL = 0.01
+
+
+def percentile(values: list[float], percent: float) -> float | None:
+    """
+    Returns the value that `percent` % of the values are at or below (nearest rank).
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def latency_summary(values: list[float]) -> dict:
+    """
+    Returns p50/p90/p99/max of a list of durations, in milliseconds.
+    """
+    summary = {}
+    for name, percent in (("p50", 50), ("p90", 90), ("p99", 99), ("max", 100)):
+        value = percentile(values, percent)
+        summary[f"{name}_ms"] = round(value * 1000, 1) if value is not None else None
+    return summary
+
+
+def tools_for(mode: str) -> tuple:
+    """
+    Returns the (search, export) coroutine functions of a mode.
+    """
+    if mode == "async":
+        return async_tools.search_gmail, async_tools.export_to_csv
+
+    # A sync tool under ADK runs right on the event loop, like these
+    async def search(gmail_query: str):
+        return gmail_search_tool.search_gmail(gmail_query)
+
+    async def export(result_handle: str):
+        return csv_export_tool.export_to_csv(result_handle)
+
+    return search, export
+
+
+async def run_session(number: int, args, tools: tuple, timings: list[dict]) -> None:
+    """
+    One agent session: a search for one label, then the export of its result.
+    Its latency counts from when the request arrived, so time spent waiting for
+    a blocked event loop is included (that is what the user waits for).
+    """
+    search, export = tools
+    delay = number * args.ramp_ms / 1000
+    started = time.perf_counter() + delay
+    await asyncio.sleep(delay)
+    query = f"label:Project-{number % max(1, args.labels)}"
+    summary = await search(query)
+    searched = time.perf_counter()
+    await export(summary["result_handle"])
+    done = time.perf_counter()
+    timings.append({
+        "session": number,
+        "rows": summary["count"],
+        "search_seconds": searched - started,
+        "export_seconds": done - searched,
+        "total_seconds": done - started,
+    })
+
+
+async def probe_loop_lag(lags: list[float], stop: asyncio.Event) -> None:
+    """
+    Wakes up every PROBE_INTERVAL and records how late it was.
+    """
+    while not stop.is_set():
+        expected = time.perf_counter() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def run_sessions(args) -> dict:
+    """
+    Runs all sessions at the same time and collects their timings.
+    """
+    tools = tools_for(args.mode)
+    timings = []
+    lags = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_loop_lag(lags, stop))
+
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(run_session(number, args, tools, timings)) for number in range(args.sessions)]
+    done, pending = await asyncio.wait(tasks, timeout=args.cancel_after)
+    # Sessions still running after --cancel-after are cancelled, like a user leaving
+    for task in pending:
+        task.cancel()
+    outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+    wall_seconds = time.perf_counter() - started
+
+    stop.set()
+    await probe
+    cancelled = sum(1 for outcome in outcomes if isinstance(outcome, asyncio.CancelledError))
+    failed = sum(
+        1 for outcome in outcomes
+        if isinstance(outcome, BaseException) and not isinstance(outcome, asyncio.CancelledError)
+    )
+    return {
+        "sessions": args.sessions,
+        "completed": len(timings),
+        "cancelled": cancelled,
+        "failed": failed,
+        "rows": sum(timing["rows"] for timing in timings),
+        "wall_seconds": round(wall_seconds, 3),
+        "sessions_per_sec": round(len(timings) / wall_seconds, 2) if wall_seconds else None,
+        "session_latency": latency_summary([timing["total_seconds"] for timing in timings]),
+        "search_latency": latency_summary([timing["search_seconds"] for timing in timings]),
+        "export_latency": latency_summary([timing["export_seconds"] for timing in timings]),
+        "loop_lag": latency_summary(lags),
+    }
+
+
+def run_load_test(args) -> dict:
+    """
+    Sets up the fake Gmail backend and runs one load test.
+    """
+    # The benchmark's defaults, with this test's mailbox and network settings
+    settings = run_benchmark.parse_args([])
+    for name in ("messages", "labels", "latency_ms", "error_rate", "quota"):
+        setattr(settings, name, getattr(args, name))
+    session, backend = run_benchmark.build_fake_session(settings)
+    run_benchmark.configure_fetch(settings)
+    set_session(session)
+    # Every search goes to the (fake) Gmail API: no cache, no local index
+    metadata_cache.CACHE_ENABLED = False
+    local_index.SEARCH_MODE = "live"
+    async_tools.MAX_WORKERS = args.max_workers
+    metrics.reset()
+
+    output_dir = csv_export_tool.OUTPUT_DIR
+    with tempfile.TemporaryDirectory() as temp_dir:
+        csv_export_tool.OUTPUT_DIR = temp_dir
+        try:
+            results = asyncio.run(run_sessions(args))
+            # Cancelled calls stop at their next check; this measures how long that took
+            started = time.perf_counter()
+            async_tools.shutdown(wait=True)
+            results["shutdown_seconds"] = round(time.perf_counter() - started, 3)
+        finally:
+            csv_export_tool.OUTPUT_DIR = output_dir
+    results["http_requests"] = backend.counters["http_requests"]
+    return {
+        "version": run_benchmark.code_version(),
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "results": results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent agent sessions against a fake Gmail API")
+    parser.add_argument("--sessions", type=int, default=20, help="Sessions running at the same time")
+    parser.add_argument("--mode", choices=["async", "blocking"], default="async",
+                        help="Async tools (thread pool) or the plain tools on the event loop")
+    parser.add_argument("--max-workers", type=int, default=async_tools.MAX_WORKERS,
+                        help="Tool threads in async mode")
+    parser.add_argument("--messages", type=int, default=2000, help="Size of the synthetic mailbox")
+    parser.add_argument("--labels", type=int, default=20, help="Number of user labels (one per session query)")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Latency added to every HTTP request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Chance (0..1) that an API call answers 429")
+    parser.add_argument("--quota", type=float, default=1_000_000, help="Quota units per second")
+    parser.add_argument("--ramp-ms", type=float, default=0.0, help="Delay between the session starts")
+    parser.add_argument("--cancel-after", type=float, default=None,
+                        help="Cancel the sessions still running after this many seconds")
+    parser.add_argument("--log-level", default="warning", help="Log level of the tools (default: warning)")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> dict:
+    args = parse_args(argv)
+    set_log_level(args.log_level)
+    report = run_load_test(args)
+    results = report["results"]
+    session_latency = results["session_latency"]
+    # Only the tools are quiet; the summary is always printed
+    set_log_level("info")
+    print_log(
+        PREFIX_AGENT,
+        f"Load test ({args.mode}): {results['completed']}/{results['sessions']} sessions in "
+        f"{results['wall_seconds']}s, latency p50 {session_latency['p50_ms']} ms, "
+        f"p90 {session_latency['p90_ms']} ms, p99 {session_latency['p99_ms']} ms, "
+        f"event loop lag max {results['loop_lag']['max_ms']} ms"
+        + (f", {results['cancelled']} cancelled" if results["cancelled"] else ""),
+    )
+    if args.json:
+        os.makedirs(os.path.dirname(args.json) or ".", exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as json_file:
+            json.dump(report, json_file, indent=2)
+        print_log(PREFIX_AGENT, f"Load test results saved to: {args.json}")
+    else:
+        print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
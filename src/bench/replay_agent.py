@@ -0,0 +1,215 @@
+# File: src/bench/replay_agent.py
+# Offline benchmark of the agent loop (run_agent_turn in agent_runner.py).
+# A scripted fake model (fake_model.py) plays back recorded function calls and
+# text, and the tools run for real against the fake Gmail backend. So changes to
+# the loop can be measured without a Gemini key or a Gmail account, e.g. in CI.
+#
+# For every turn it reports the model round-trips, the bytes sent to and received
+# from the model, the time spent in the model versus in the tools, the time to
+# the first streamed words and the total latency.
+#
+# Examples:
+#   python -m src.bench.replay_agent
+#   python -m src.bench.replay_agent --script my_script.json --max-round-trips 3 --json results/replay.json
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from src import agent_runner, metrics, query_translator
+from src.bench import run_benchmark
+from src.bench.fake_model import ScriptedChat
+from src.tools import csv_export_tool, local_index, metadata_cache, parquet_export_tool
+from src.tools.gmail_session import set_session
+from src.utils import print_log, set_log_level, PREFIX_AGENT
+
+# Used without --script: one plain search + export, two searches at once, and a
+# question that needs no tool at all
+DEFAULT_SCRIPT = {
+    "turns": [
+        {
+            "prompt": "Export the emails with the label Project-1",
+            "responses": [
+                [{"function_call": {"name": "search_gmail", "args": {"gmail_query": "label:Project-1"}}}],
+                [{"function_call": {"name": "export_to_csv", "args": {"result_handle": "{result_handle}"}}}],
+                [{"text": "I found {count:.0f} emails with the label Project-1 and saved them to {export_to_csv}."}],
+            ],
+        },
+        {
+            "prompt": "Export Project-2 as CSV and Project-3 as Parquet",
+            "responses": [
+                [
+                    {"function_call": {"name": "search_gmail", "args": {"gmail_query": "label:Project-2"}}},
+                    {"function_call": {"name": "search_gmail", "args": {"gmail_query": "label:Project-3"}}},
+                ],
+                [
+                    {"function_call": {"name": "export_to_csv", "args": {"result_handle": "{results[0][result_handle]}"}}},
+                    {"function_call": {"name": "export_to_parquet", "args": {"result_handle": "{results[1][result_handle]}"}}},
+                ],
+                [{"text": "Both exports are ready: {export_to_csv} and {export_to_parquet}."}],
+            ],
+        },
+        {
+            "prompt": "What can you do?",
+            "responses": [
+                [{"text": "I search your Gmail and export the matching emails to CSV or Parquet files."}],
+            ],
+        },
+    ]
+}
+
+
+def load_script(path: str | None) -> dict:
+    """
+    Reads a replay script (JSON, see fake_model.py for the format), or returns DEFAULT_SCRIPT.
+    """
+    if path is None:
+        return DEFAULT_SCRIPT
+    with open(path, "r", encoding="utf-8") as script_file:
+        return json.load(script_file)
+
+
+def _span_seconds(snapshot: dict, prefix: str) -> float:
+    # Total time of all spans whose name starts with prefix (e.g. "tool{" for every tool)
+    return sum(entry["total_seconds"] for name, entry in snapshot["spans"].items() if name.startswith(prefix))
+
+
+def run_turn(chat: ScriptedChat, turn: dict, stream: bool) -> dict:
+    """
+    Runs one scripted turn through run_agent_turn() and measures it.
+    """
+    chat.start_turn(turn["responses"])
+    metrics.reset()
+    streamed = []
+    started = time.perf_counter()
+    reply = agent_runner.run_agent_turn(turn["prompt"], on_text=streamed.append if stream else None)
+    total_seconds = time.perf_counter() - started
+
+    snapshot = metrics.snapshot()
+    counters = snapshot["counters"]
+    first_text = snapshot["spans"].get("llm.first_text")
+    # The turn ran as scripted if every response was used and the loop did not report an error
+    ok = chat.unused_responses == 0 and not reply.startswith("I encountered an error")
+    return {
+        "prompt": turn["prompt"],
+        "ok": ok,
+        "round_trips": chat.counters["round_trips"],
+        "tool_calls": sum(entry["count"] for name, entry in snapshot["spans"].items() if name.startswith("tool{")),
+        "sent_bytes": chat.counters["sent_bytes"],
+        "received_bytes": chat.counters["received_bytes"],
+        "tokens_in": counters.get("llm_tokens_in", 0),
+        "tokens_out": counters.get("llm_tokens_out", 0),
+        "model_seconds": round(_span_seconds(snapshot, "llm.round_trip"), 4),
+        # Tools of one response run at the same time, so this can exceed their wall time
+        "tool_seconds": round(_span_seconds(snapshot, "tool{"), 4),
+        "first_text_seconds": first_text["total_seconds"] if first_text else None,
+        "total_seconds": round(total_seconds, 4),
+        "reply": reply[:200],
+    }
+
+
+def run_replay(args) -> dict:
+    """
+    Sets up the fake model and the fake Gmail backend and replays the whole script.
+    """
+    script = load_script(args.script)
+    settings = run_benchmark.parse_args([])
+    for name in ("messages", "labels", "latency_ms"):
+        setattr(settings, name, getattr(args, name))
+    session, backend = run_benchmark.build_fake_session(settings)
+    run_benchmark.configure_fetch(settings)
+    set_session(session)
+    metadata_cache.CACHE_ENABLED = False
+    local_index.SEARCH_MODE = "live"
+    agent_runner.FAST_PATH_ENABLED = args.fast_path
+    chat = ScriptedChat(latency=args.model_latency_ms / 1000, chunk_delay=args.chunk_ms / 1000)
+    agent_runner.set_chat(chat)
+
+    saved = (csv_export_tool.OUTPUT_DIR, parquet_export_tool.OUTPUT_DIR, query_translator.QUERY_CACHE_FILE)
+    turns = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Exports and remembered translations go to a temporary folder, not into Private/
+        csv_export_tool.OUTPUT_DIR = parquet_export_tool.OUTPUT_DIR = temp_dir
+        query_translator.QUERY_CACHE_FILE = os.path.join(temp_dir, "query_cache.json")
+        try:
+            for turn in script["turns"]:
+                turns.append(run_turn(chat, turn, stream=not args.no_stream))
+        finally:
+            csv_export_tool.OUTPUT_DIR, parquet_export_tool.OUTPUT_DIR, query_translator.QUERY_CACHE_FILE = saved
+            agent_runner.set_chat(None)
+
+    if args.max_round_trips:
+        for turn in turns:
+            if turn["round_trips"] > args.max_round_trips:
+                turn["ok"] = False
+    return {
+        "version": run_benchmark.code_version(),
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "results": {
+            "turns": turns,
+            "failed_turns": sum(1 for turn in turns if not turn["ok"]),
+            "round_trips": sum(turn["round_trips"] for turn in turns),
+            "sent_bytes": sum(turn["sent_bytes"] for turn in turns),
+            "received_bytes": sum(turn["received_bytes"] for turn in turns),
+            "model_seconds": round(sum(turn["model_seconds"] for turn in turns), 4),
+            "tool_seconds": round(sum(turn["tool_seconds"] for turn in turns), 4),
+            "total_seconds": round(sum(turn["total_seconds"] for turn in turns), 4),
+            "http_requests": backend.counters["http_requests"],
+        },
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay scripted agent turns with a fake model and a fake Gmail API")
+    parser.add_argument("--script", help="Replay script (JSON); default: a built-in three-turn script")
+    parser.add_argument("--model-latency-ms", type=float, default=300.0,
+                        help="Fake model delay before the first part of each answer")
+    parser.add_argument("--chunk-ms", type=float, default=20.0, help="Delay between two streamed chunks")
+    parser.add_argument("--no-stream", action="store_true", help="Ask for whole answers instead of streaming")
+    parser.add_argument("--fast-path", action="store_true",
+                        help="Let the local query translator answer prompts it understands (skips the model)")
+    parser.add_argument("--messages", type=int, default=2000, help="Size of the synthetic mailbox")
+    parser.add_argument("--labels", type=int, default=20, help="Number of user labels")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency added to every Gmail HTTP request")
+    parser.add_argument("--max-round-trips", type=int, default=None,
+                        help="Count a turn as failed if it needs more model round-trips (for CI)")
+    parser.add_argument("--log-level", default="warning", help="Log level of the agent and tools (default: warning)")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> dict:
+    args = parse_args(argv)
+    set_log_level(args.log_level)
+    report = run_replay(args)
+    results = report["results"]
+    # Only the agent and tools are quiet; the summary is always printed
+    set_log_level("info")
+    for number, turn in enumerate(results["turns"], start=1):
+        first_text = f"{turn['first_text_seconds']:.3f}s" if turn["first_text_seconds"] is not None else "-"
+        print_log(
+            PREFIX_AGENT,
+            f"Turn {number}{'' if turn['ok'] else ' (FAILED)'}: {turn['round_trips']} round-trip(s), "
+            f"{turn['tool_calls']} tool call(s), {turn['sent_bytes']} B sent / {turn['received_bytes']} B received, "
+            f"model {turn['model_seconds']:.3f}s, tools {turn['tool_seconds']:.3f}s, "
+            f"first text {first_text}, total {turn['total_seconds']:.3f}s",
+        )
+    print_log(
+        PREFIX_AGENT,
+        f"Replay: {len(results['turns'])} turn(s), {results['round_trips']} round-trips, "
+        f"{results['total_seconds']}s, {results['failed_turns']} failed",
+    )
+    if args.json:
+        os.makedirs(os.path.dirname(args.json) or ".", exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as json_file:
+            json.dump(report, json_file, indent=2)
+        print_log(PREFIX_AGENT, f"Replay results saved to: {args.json}")
+    return report
+
+
+if __name__ == "__main__":
+    # A non-zero exit code fails a CI job when a turn broke or needed too many round-trips
+    sys.exit(1 if main()["results"]["failed_turns"] else 0)
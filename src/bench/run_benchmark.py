@@ -0,0 +1,307 @@
+# File: src/bench/run_benchmark.py
+# Offline benchmark for search_gmail's fetch pipeline and the exporters.
+# It runs the real code against the fake Gmail backend, so no account is needed.
+#
+# Example:
+#   python -m src.bench.run_benchmark --messages 5000 --latency-ms 20 --json results/bench.json
+#   python -m src.bench.run_benchmark --accounts 4 --messages 5000 --latency-ms 20
+
+import argparse
+import functools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from src import metrics
+from src.bench.fake_gmail import SyntheticMailbox, FakeGmailBackend, FakeGmailHttp
+from src.tools import gmail_search_tool, rate_limiter
+from src.tools.batch_fetch_tool import new_fetch_stats
+from src.tools.columns import normalize_columns
+from src.tools.email_table import EmailTable, apply_date_options, fetch_columns_for
+from src.tools.gmail_session import GmailSession
+from src.utils import print_log, PREFIX_AGENT
+
+
+def peak_rss_mb() -> float | None:
+    """
+    Returns the peak resident memory of this process in MB (None where unsupported).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def code_version() -> str:
+    """
+    Returns the current git commit (or "unknown"), so results can be compared between versions.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def build_fake_session(args) -> tuple[GmailSession, FakeGmailBackend]:
+    """
+    Creates a synthetic mailbox, a fake backend for it and a Gmail session that uses it.
+    """
+    mailbox = SyntheticMailbox(
+        size=args.messages,
+        label_count=args.labels,
+        header_size=args.header_size,
+        thread_size=args.thread_size,
+    )
+    backend = FakeGmailBackend(mailbox, latency=args.latency_ms / 1000, error_rate=args.error_rate)
+    session = GmailSession(http_factory=lambda: FakeGmailHttp(backend))
+    return session, backend
+
+
+def configure_fetch(args) -> None:
+    """
+    Applies the fetch settings (mode, batch size, workers, quota, backoff) of a benchmark run.
+    """
+    gmail_search_tool.FETCH_MODE = args.fetch_mode
+    gmail_search_tool.BATCH_SIZE = args.batch_size
+    gmail_search_tool.WORKERS = args.workers
+    gmail_search_tool.SHARDED_LISTING = args.list_mode == "sharded"
+    gmail_search_tool.LIST_WORKERS = args.list_workers
+    rate_limiter.set_shared_limiter(rate_limiter.TokenBucket(rate=args.quota))
+    rate_limiter.BACKOFF_BASE = args.backoff_base
+
+
+def fake_account_session(args, account: str) -> GmailSession:
+    """
+    Session factory for the accounts benchmark. It runs inside each worker process,
+    so it also applies the fetch settings there; every account gets its own mailbox.
+    """
+    configure_fetch(args)
+    session, _ = build_fake_session(args)
+    return session
+
+
+def run_accounts_benchmark(args) -> dict:
+    """
+    Runs the same query for args.accounts fake accounts, one after another (1 process)
+    and in parallel (args.processes), and returns both wall times.
+    """
+    from src import account_runner
+    from src.tools import metadata_cache
+
+    accounts = [f"account{number}" for number in range(1, args.accounts + 1)]
+    factory = functools.partial(fake_account_session, args)
+    columns = normalize_columns(args.columns)
+    runs = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache_enabled = metadata_cache.CACHE_ENABLED
+        metadata_cache.CACHE_ENABLED = False
+        try:
+            for name, processes in (("sequential", 1), ("parallel", args.processes or args.accounts)):
+                manifest = account_runner.run_accounts(
+                    args.query, accounts, processes, os.path.join(temp_dir, name),
+                    "parquet" if args.export == "parquet" else "csv", columns=columns, session_factory=factory,
+                )
+                runs[name] = {
+                    "processes": manifest["processes"],
+                    "wall_seconds": manifest["elapsed_seconds"],
+                    "account_seconds": manifest["account_seconds"],
+                    "rows": manifest["rows"],
+                    "failed": manifest["failed"],
+                }
+        finally:
+            metadata_cache.CACHE_ENABLED = cache_enabled
+    sequential, parallel = runs["sequential"]["wall_seconds"], runs["parallel"]["wall_seconds"]
+    return {
+        "version": code_version(),
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "results": {
+            "accounts": args.accounts,
+            "cpu_count": os.cpu_count(),
+            **runs,
+            "speedup": round(sequential / parallel, 2) if parallel else None,
+        },
+    }
+
+
+def run_benchmark(args) -> dict:
+    """
+    Runs one benchmark and returns its results as a dictionary.
+    """
+    session, backend = build_fake_session(args)
+    configure_fetch(args)
+    metrics.reset()
+
+    stats = new_fetch_stats()
+    # Conversation rows are always dictionaries; per-email rows can go into an EmailTable
+    use_table = args.representation == "table" and args.thread_mode != "threads"
+    columns = normalize_columns(args.columns)
+    fetch_columns = fetch_columns_for(columns, args.date_source) if use_table else columns
+    if args.trace_memory:
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    if args.thread_mode == "off":
+        searcher = gmail_search_tool.iter_gmail(
+            args.query, limit=args.limit, stats=stats, use_cache=False, session=session, columns=fetch_columns,
+            raw=use_table,
+        )
+    else:
+        searcher = gmail_search_tool.iter_threads(
+            args.query, limit=args.limit, stats=stats, use_cache=False, session=session, columns=fetch_columns,
+            aggregate=args.thread_mode == "threads", raw=use_table,
+        )
+    if use_table:
+        records = EmailTable(columns, session.label_map(), date_source=args.date_source)
+        for email in searcher:
+            records.append(email)
+        records.finish()
+    else:
+        records = list(searcher)
+    fetch_seconds = time.perf_counter() - started
+
+    sort_seconds = None
+    if use_table and args.sort != "api":
+        started = time.perf_counter()
+        records = apply_date_options(records, sort=args.sort)
+        sort_seconds = time.perf_counter() - started
+    if args.trace_memory:
+        # What the search results still hold once the search is done
+        records_mb = (tracemalloc.get_traced_memory()[0] - baseline) / (1024 * 1024)
+
+    export_seconds = None
+    export_bytes = None
+    if args.export != "none":
+        with tempfile.TemporaryDirectory() as temp_dir:
+            started = time.perf_counter()
+            if args.export == "parquet":
+                from src.tools.parquet_export_tool import stream_to_parquet
+                path, _ = stream_to_parquet(records, os.path.join(temp_dir, "bench.parquet"))
+            else:
+                from src.tools.csv_export_tool import stream_to_csv
+                path, _ = stream_to_csv(records, os.path.join(temp_dir, "bench.csv"))
+            export_seconds = time.perf_counter() - started
+            export_bytes = os.path.getsize(path)
+
+    traced = {}
+    if args.trace_memory:
+        traced_peak_mb = (tracemalloc.get_traced_memory()[1] - baseline) / (1024 * 1024)
+        tracemalloc.stop()
+        traced = {"records_mb": round(records_mb, 1), "traced_peak_mb": round(traced_peak_mb, 1)}
+
+    counters = backend.counters
+    return {
+        "version": code_version(),
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "results": {
+            "messages": len(records),
+            "fetch_seconds": round(fetch_seconds, 4),
+            "messages_per_sec": round(len(records) / fetch_seconds, 1) if fetch_seconds else None,
+            "http_requests": counters["http_requests"],
+            # API calls sent inside batch requests (each one is also counted in api_calls)
+            "sub_requests": counters["batch_sub_requests"],
+            "api_calls": counters["api_calls"],
+            "calls_per_message": round(counters["http_requests"] / len(records), 4) if records else None,
+            "retries": stats["retries"],
+            "injected_429": counters["injected_429"],
+            "failed": stats["failed"],
+            "bytes_sent": counters["bytes_sent"],
+            "bytes_received": counters["bytes_received"],
+            "bytes_per_message": round(counters["bytes_received"] / len(records), 1) if records else None,
+            "sort_seconds": round(sort_seconds, 4) if sort_seconds is not None else None,
+            "export": args.export,
+            "export_seconds": round(export_seconds, 4) if export_seconds is not None else None,
+            "export_bytes": export_bytes,
+            "peak_rss_mb": round(peak_rss_mb(), 1) if peak_rss_mb() is not None else None,
+            **traced,
+        },
+        "metrics": metrics.snapshot(),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark with a fake Gmail API")
+    parser.add_argument("--messages", type=int, default=2000, help="Size of the synthetic mailbox")
+    parser.add_argument("--labels", type=int, default=20, help="Number of user labels")
+    parser.add_argument("--header-size", type=int, default=60, help="Approximate Subject length in characters")
+    parser.add_argument("--thread-size", type=int, default=3, help="Messages per conversation thread")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency added to every HTTP request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Chance (0..1) that an API call answers 429")
+    parser.add_argument("--query", default="", help="Gmail query to run against the synthetic mailbox")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many messages")
+    parser.add_argument("--fetch-mode", choices=["batch", "pool"], default="batch")
+    parser.add_argument("--batch-size", type=int, default=gmail_search_tool.BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=gmail_search_tool.WORKERS)
+    parser.add_argument("--thread-mode", choices=["off", "messages", "threads"], default="off",
+                        help="Fetch whole conversations with threads.get (per-email or per-conversation rows)")
+    parser.add_argument("--list-mode", choices=["sharded", "pages"], default="pages",
+                        help="List unlimited searches in parallel time windows or page by page")
+    parser.add_argument("--list-workers", type=int, default=gmail_search_tool.LIST_WORKERS,
+                        help="Time windows listed at the same time")
+    parser.add_argument("--quota", type=float, default=1_000_000,
+                        help="Quota units per second (use 250 to simulate the real Gmail limit)")
+    parser.add_argument("--backoff-base", type=float, default=0.05, help="First retry delay in seconds")
+    parser.add_argument("--columns", default=None,
+                        help="Comma-separated columns to fetch (default: Date,Subject,Labels)")
+    parser.add_argument("--representation", choices=["table", "dicts"], default="table",
+                        help="Keep the results in a compact EmailTable (like search_gmail) or a list of dictionaries")
+    parser.add_argument("--sort", choices=["api", "date", "date-desc"], default="api",
+                        help="Sort the results by date after the search (table representation only)")
+    parser.add_argument("--date-source", choices=["raw", "internal", "header"], default="internal",
+                        help="Date column: the header as written (raw), internalDate, or the headers parsed in one batch")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Measure the memory held by the results and the peak with tracemalloc (slower)")
+    parser.add_argument("--accounts", type=int, default=0,
+                        help="Run the query for this many fake accounts in worker processes instead")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Worker processes for --accounts (default: one per account, at most one per core)")
+    parser.add_argument("--export", choices=["csv", "parquet", "none"], default="csv")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> dict:
+    args = parse_args(argv)
+    if args.accounts:
+        report = run_accounts_benchmark(args)
+        results = report["results"]
+        print_log(
+            PREFIX_AGENT,
+            f"Accounts benchmark: {args.accounts} accounts, {results['parallel']['rows']} rows, "
+            f"{results['sequential']['wall_seconds']}s one after another, "
+            f"{results['parallel']['wall_seconds']}s with {results['parallel']['processes']} processes "
+            f"(speedup {results['speedup']}x on {results['cpu_count']} cores)",
+        )
+    else:
+        report = run_benchmark(args)
+        results = report["results"]
+        export_text = f"{results['export_seconds']}s" if results["export_seconds"] is not None else "skipped"
+        print_log(
+            PREFIX_AGENT,
+            f"Benchmark: {results['messages']} msgs in {results['fetch_seconds']}s "
+            f"({results['messages_per_sec']} msg/s), {results['http_requests']} HTTP requests, "
+            f"{results['retries']} retries, export {export_text}, "
+            f"peak RSS {results['peak_rss_mb']} MB"
+            + (f", results {results['records_mb']} MB (traced peak {results['traced_peak_mb']} MB)"
+               if "records_mb" in results else ""),
+        )
+    if args.json:
+        os.makedirs(os.path.dirname(args.json) or ".", exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as json_file:
+            json.dump(report, json_file, indent=2)
+        print_log(PREFIX_AGENT, f"Benchmark results saved to: {args.json}")
+    else:
+        print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+# File: src/job_runner.py
+# Checkpointed export jobs: one big Gmail query exported page by page, so a crash,
+# an expired token or Ctrl+C never loses the work already done.
+#
+# Each job has its own folder in JOBS_DIR with:
+#   checkpoint.json     - the query, the next page token and how much output is valid
+#   fetched_ids.txt     - the IDs of every message already written (one per line)
+#   export.csv.part     - the rows written so far (CSV jobs), or
+#   part-00001.parquet  - one small file per page (Parquet jobs, joined at the end)
+#
+# After every page the rows and IDs are flushed to disk FIRST and the checkpoint is
+# written LAST. On resume, anything written after the last checkpoint is cut off
+# again, so no row is ever written twice.
+
+import csv
+import io
+import json
+import os
+import time
+from src import metrics
+from src.tools import columns as column_config
+from src.utils import print_log, PREFIX_AGENT, PREFIX_TOOL
+
+# --- Configuration ---
+
+OUTPUT_DIR = "results"
+JOBS_DIR = os.path.join(OUTPUT_DIR, "jobs")
+
+# IDs listed (and committed) per checkpoint (500 is the messages().list maximum)
+PAGE_SIZE = 500
+
+CHECKPOINT_FILE = "checkpoint.json"
+IDS_FILE = "fetched_ids.txt"
+CSV_PART_FILE = "export.csv.part"
+
+
+def _job_dir(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, job_id)
+
+
+def load_checkpoint(job_id: str) -> dict:
+    """
+    Reads the checkpoint of a job.
+
+    Raises:
+        FileNotFoundError: If there is no such job.
+    """
+    path = os.path.join(_job_dir(job_id), CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No job '{job_id}' in {JOBS_DIR}")
+    with open(path, "r", encoding="utf-8") as checkpoint_file:
+        return json.load(checkpoint_file)
+
+
+def save_checkpoint(checkpoint: dict) -> None:
+    """
+    Writes a checkpoint atomically (a crash leaves the previous one intact).
+    """
+    checkpoint["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    path = os.path.join(_job_dir(checkpoint["job_id"]), CHECKPOINT_FILE)
+    temp_path = path + ".part"
+    with open(temp_path, "w", encoding="utf-8") as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file, indent=2, ensure_ascii=False)
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+    os.replace(temp_path, path)
+
+
+def _truncate(path: str, size: int) -> None:
+    # Cuts off whatever was appended after the last checkpoint
+    with open(path, "ab") as file:
+        file.truncate(size)
+
+
+def _append(path: str, write) -> int:
+    """
+    Appends to a file with write(text_stream), syncs it to disk and returns the new size.
+    """
+    with open(path, "ab") as binary:
+        # Plain UTF-8 here: the byte-order mark is only written once, with the header
+        with io.TextIOWrapper(binary, encoding="utf-8", newline="") as stream:
+            write(stream)
+            stream.flush()
+            os.fsync(binary.fileno())
+            return binary.tell()
+
+
+def create_job(
+    gmail_query: str,
+    export_format: str = "csv",
+    columns: list[str] | None = None,
+    since_ms: int | None = None,
+    until_ms: int | None = None,
+    date_source: str | None = None,
+) -> dict:
+    """
+    Creates a new job folder and its first checkpoint.
+
+    The date options are saved in the checkpoint, so a resumed job writes its
+    rows exactly like the pages written before.
+
+    Args:
+        gmail_query (str): The Gmail search query to export.
+        export_format (str): "csv" or "parquet".
+        columns (list[str]): The columns to export (defaults to columns.DEFAULT_COLUMNS).
+        since_ms (int): Only export emails dated at or after this time (defaults to email_table.SINCE_MS).
+        until_ms (int): Only export emails dated before this time (defaults to email_table.UNTIL_MS).
+        date_source (str): "raw", "internal" or "header" (defaults to email_table.DATE_SOURCE).
+
+    Returns:
+        dict: The checkpoint of the new job.
+    """
+    from src.tools import email_table
+    from src.tools.csv_export_tool import ENCODING
+
+    # A second job in the same second gets a number ("job_..._2"). Creating the
+    # folder is the check, so two processes can never pick the same ID.
+    base_id = time.strftime("job_%Y%m%d_%H%M%S")
+    job_id = base_id
+    number = 2
+    while True:
+        job_dir = _job_dir(job_id)
+        try:
+            os.makedirs(job_dir, exist_ok=False)
+            break
+        except FileExistsError:
+            job_id = f"{base_id}_{number}"
+            number += 1
+    columns = column_config.normalize_columns(columns)
+    checkpoint = {
+        "job_id": job_id,
+        "query": gmail_query,
+        "format": export_format,
+        "columns": columns,
+        "since_ms": email_table.SINCE_MS if since_ms is None else since_ms,
+        "until_ms": email_table.UNTIL_MS if until_ms is None else until_ms,
+        "date_source": date_source or email_table.DATE_SOURCE,
+        "file": os.path.join(OUTPUT_DIR, f"{job_id}.{'parquet' if export_format == 'parquet' else 'csv'}"),
+        "status": "running",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "next_page_token": None,
+        "listing_done": False,
+        "pages": 0,
+        "rows": 0,
+        "ids_bytes": 0,
+        "output_bytes": 0,
+        "parts": 0,
+        "failed_ids": [],
+    }
+    open(os.path.join(job_dir, IDS_FILE), "wb").close()
+    if export_format == "csv":
+        # The header (with the byte-order mark Excel needs) is written once, up front
+        with open(os.path.join(job_dir, CSV_PART_FILE), "w", encoding=ENCODING, newline="") as csv_file:
+            csv.writer(csv_file).writerow(columns)
+        checkpoint["output_bytes"] = os.path.getsize(os.path.join(job_dir, CSV_PART_FILE))
+    save_checkpoint(checkpoint)
+    print_log(PREFIX_AGENT, f"Created job {job_id} for '{gmail_query}'.")
+    return checkpoint
+
+
+def _restore(checkpoint: dict) -> set[str]:
+    """
+    Throws away output written after the last checkpoint and returns the fetched IDs.
+    """
+    job_dir = _job_dir(checkpoint["job_id"])
+    ids_path = os.path.join(job_dir, IDS_FILE)
+    _truncate(ids_path, checkpoint["ids_bytes"])
+    if checkpoint["format"] == "csv":
+        _truncate(os.path.join(job_dir, CSV_PART_FILE), checkpoint["output_bytes"])
+    else:
+        for name in os.listdir(job_dir):
+            if name.startswith("part-") and int(name[5:10]) > checkpoint["parts"]:
+                os.remove(os.path.join(job_dir, name))
+    with open(ids_path, "r", encoding="utf-8") as ids_file:
+        return {line.strip() for line in ids_file if line.strip()}
+
+
+def _write_records(checkpoint: dict, records: list[dict], message_ids: list[str]) -> None:
+    """
+    Appends one page of records and their IDs to the job files, then checkpoints.
+    """
+    job_dir = _job_dir(checkpoint["job_id"])
+    columns = checkpoint["columns"]
+    if records:
+        if checkpoint["format"] == "csv":
+            from src.tools.csv_export_tool import format_labels
+
+            def write_rows(stream):
+                writer = csv.writer(stream)
+                for record in records:
+                    writer.writerow([
+                        format_labels(record.get(column)) if column == "Labels" else record.get(column, "")
+                        for column in columns
+                    ])
+
+            checkpoint["output_bytes"] = _append(os.path.join(job_dir, CSV_PART_FILE), write_rows)
+        else:
+            from src.tools.parquet_export_tool import stream_to_parquet
+            part_path = os.path.join(job_dir, f"part-{checkpoint['parts'] + 1:05d}.parquet")
+            stream_to_parquet(records, part_path, columns=columns)
+            checkpoint["parts"] += 1
+    checkpoint["ids_bytes"] = _append(
+        os.path.join(job_dir, IDS_FILE), lambda stream: stream.writelines(f"{msg_id}\n" for msg_id in message_ids)
+    )
+    checkpoint["rows"] += len(records)
+    metrics.increment("job_rows", len(records))
+    save_checkpoint(checkpoint)
+
+
+def _fetch_page(message_ids: list[str], session, cache, label_map: dict, checkpoint: dict, limiter, stats: dict):
+    """
+    Fetches one page of messages. Returns (records, IDs written, IDs that failed).
+
+    The records are built like search_gmail() rows: UTC dates, and only the emails
+    inside the job's since/until range. Emails outside the range are still counted
+    as written, so they are not fetched again on resume.
+    """
+    from src.tools.email_table import fetch_columns_for, iter_email_rows
+    from src.tools.gmail_search_tool import FETCH_MODE, fetch_chunk
+
+    columns = checkpoint["columns"]
+    # Checkpoints written before the date options existed have none of them
+    date_source = checkpoint.get("date_source", "raw")
+    emails = fetch_chunk(message_ids, session, session.service(), cache, FETCH_MODE, limiter, stats,
+                         fetch_columns_for(columns, date_source))
+    fetched, written, failed = [], [], []
+    for msg_id, email in zip(message_ids, emails):
+        if email is None:
+            failed.append(msg_id)
+        else:
+            fetched.append(email)
+            written.append(msg_id)
+    records = list(iter_email_rows(fetched, columns, label_map, checkpoint.get("since_ms"),
+                                   checkpoint.get("until_ms"), date_source))
+    return records, written, failed
+
+
+def _finalize(checkpoint: dict) -> None:
+    """
+    Moves the finished export to its final name atomically and cleans up the job folder.
+    """
+    job_dir = _job_dir(checkpoint["job_id"])
+    os.makedirs(os.path.dirname(checkpoint["file"]) or ".", exist_ok=True)
+    if checkpoint["format"] == "csv":
+        os.replace(os.path.join(job_dir, CSV_PART_FILE), checkpoint["file"])
+    else:
+        from src.tools.parquet_export_tool import merge_parquet_files, stream_to_parquet
+        parts = [os.path.join(job_dir, f"part-{index:05d}.parquet") for index in range(1, checkpoint["parts"] + 1)]
+        if parts:
+            merge_parquet_files(parts, checkpoint["file"])
+        else:
+            stream_to_parquet([], checkpoint["file"], columns=checkpoint["columns"])
+        for part in parts:
+            os.remove(part)
+    os.remove(os.path.join(job_dir, IDS_FILE))
+    checkpoint["status"] = "done"
+    save_checkpoint(checkpoint)
+
+
+def run_job(checkpoint: dict) -> dict:
+    """
+    Runs (or continues) a job until the export is complete.
+
+    Args:
+        checkpoint (dict): The job's checkpoint (from create_job() or load_checkpoint()).
+
+    Returns:
+        dict: The final checkpoint ("status" is "done" and "file" is the export).
+    """
+    from googleapiclient.errors import HttpError
+    from src.tools import metadata_cache
+    from src.tools.batch_fetch_tool import new_fetch_stats
+    from src.tools.gmail_session import get_session
+    from src.tools.rate_limiter import execute_with_backoff, get_shared_limiter
+
+    if checkpoint["status"] == "done":
+        print_log(PREFIX_AGENT, f"Job {checkpoint['job_id']} is already finished: {checkpoint['file']}")
+        return checkpoint
+
+    fetched_ids = _restore(checkpoint)
+    if fetched_ids:
+        print_log(PREFIX_AGENT, f"Resuming job {checkpoint['job_id']}: {len(fetched_ids)} email(s) already exported.")
+
+    session = get_session()
+    limiter = get_shared_limiter()
+    stats = new_fetch_stats()
+    service = session.service()
+    label_map = session.label_map(limiter=limiter, stats=stats)
+    cache = metadata_cache.get_cache() if metadata_cache.CACHE_ENABLED else None
+    if cache is not None:
+        cache.sync(service, limiter=limiter, stats=stats)
+
+    started = time.monotonic()
+    while not checkpoint["listing_done"]:
+        page_token = checkpoint["next_page_token"]
+        request = service.users().messages().list(
+            userId="me", q=checkpoint["query"], maxResults=PAGE_SIZE, pageToken=page_token,
+            fields=column_config.LIST_FIELDS_MASK,
+        )
+        try:
+            result = execute_with_backoff(request, "messages.list", limiter=limiter, stats=stats)
+        except HttpError as error:
+            if page_token is None or int(error.resp.status) != 400:
+                raise
+            # An old page token can expire; list again from the start, skipping what we have
+            print_log(PREFIX_TOOL, "The saved page token was rejected. Listing again from the first page.")
+            checkpoint["next_page_token"] = None
+            continue
+
+        page_ids = [msg["id"] for msg in result.get("messages", []) if msg["id"] not in fetched_ids]
+        records, written, failed = _fetch_page(page_ids, session, cache, label_map, checkpoint, limiter, stats)
+        fetched_ids.update(written)
+        checkpoint["failed_ids"] = sorted(set(checkpoint["failed_ids"]) | set(failed))
+        checkpoint["next_page_token"] = result.get("nextPageToken")
+        checkpoint["listing_done"] = not checkpoint["next_page_token"]
+        checkpoint["pages"] += 1
+        _write_records(checkpoint, records, written)
+        print_log(PREFIX_TOOL, f"Job page {checkpoint['pages']}: {checkpoint['rows']} row(s) saved.")
+
+    # One more try for messages that failed (e.g. after too many retries)
+    retry_ids = [msg_id for msg_id in checkpoint["failed_ids"] if msg_id not in fetched_ids]
+    if retry_ids:
+        records, written, failed = _fetch_page(retry_ids, session, cache, label_map, checkpoint, limiter, stats)
+        checkpoint["failed_ids"] = failed
+        _write_records(checkpoint, records, written)
+
+    _finalize(checkpoint)
+    metrics.record_duration("job", time.monotonic() - started)
+    print_log(
+        PREFIX_AGENT,
+        f"Job {checkpoint['job_id']} done: {checkpoint['rows']} row(s) saved to {checkpoint['file']}"
+        + (f" ({len(checkpoint['failed_ids'])} message(s) could not be fetched)." if checkpoint["failed_ids"] else "."),
+    )
+    return checkpoint
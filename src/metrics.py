@@ -0,0 +1,170 @@
+# File: src/metrics.py
+# Lightweight, thread-safe run metrics: timing spans and counters.
+# Every stage (auth, label listing, message fetch, Gemini round-trips, export)
+# reports here. At the end of a run we write one JSON summary and, optionally,
+# a Prometheus text file (for the node_exporter "textfile" collector).
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Prefix for every Prometheus metric name
+PROMETHEUS_PREFIX = "gmail_exporter"
+
+_lock = threading.Lock()
+_counters = {}
+_spans = {}
+_run_started = time.time()
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted(labels.items())))
+
+
+def increment(name: str, amount: float = 1, **labels) -> None:
+    """
+    Adds to a counter.
+
+    Args:
+        name (str): Counter name, e.g. "api_calls".
+        amount (float): How much to add.
+        **labels: Optional labels, e.g. method="messages.get".
+    """
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+@contextmanager
+def span(name: str, **labels):
+    """
+    Times a block of code and adds the duration to the span's totals.
+
+    Example:
+        with span("fetch", mode="batch"):
+            ...
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_duration(name, time.perf_counter() - started, **labels)
+
+
+def record_duration(name: str, seconds: float, **labels) -> None:
+    """
+    Adds one measured duration to a span (for code that cannot use "with span()").
+    """
+    key = _key(name, labels)
+    with _lock:
+        entry = _spans.get(key)
+        if entry is None:
+            entry = _spans[key] = {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+        entry["count"] += 1
+        entry["total_seconds"] += seconds
+        entry["max_seconds"] = max(entry["max_seconds"], seconds)
+
+
+def _display_name(key: tuple) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{label}={value}" for label, value in labels) + "}"
+
+
+def snapshot() -> dict:
+    """
+    Returns all counters and spans collected so far.
+
+    Returns:
+        dict: started_at, elapsed_seconds, counters and spans.
+    """
+    with _lock:
+        return {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(_run_started)),
+            "elapsed_seconds": round(time.time() - _run_started, 3),
+            "counters": {_display_name(key): value for key, value in sorted(_counters.items())},
+            "spans": {
+                _display_name(key): {
+                    "count": entry["count"],
+                    "total_seconds": round(entry["total_seconds"], 4),
+                    "max_seconds": round(entry["max_seconds"], 4),
+                }
+                for key, entry in sorted(_spans.items())
+            },
+        }
+
+
+def reset() -> None:
+    """Forgets all counters and spans and restarts the run clock."""
+    global _run_started
+    with _lock:
+        _counters.clear()
+        _spans.clear()
+        _run_started = time.time()
+
+
+def _write_atomically(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = path + ".part"
+    with open(temp_path, "w", encoding="utf-8") as output:
+        output.write(text)
+    os.replace(temp_path, path)
+
+
+def write_json_summary(path: str) -> str:
+    """
+    Writes the run summary as JSON.
+
+    Args:
+        path (str): The file to write.
+
+    Returns:
+        str: The path that was written.
+    """
+    _write_atomically(path, json.dumps(snapshot(), indent=2))
+    return path
+
+
+def _prometheus_name(name: str) -> str:
+    return PROMETHEUS_PREFIX + "_" + name.replace(".", "_").replace("-", "_")
+
+
+def _prometheus_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = []
+    for label, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        escaped.append(f'{label}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def write_prometheus(path: str) -> str:
+    """
+    Writes all metrics in the Prometheus text exposition format.
+
+    Counters become "<prefix>_<name>_total"; spans become
+    "<prefix>_<name>_seconds_sum" / "_count" / "_max".
+
+    Args:
+        path (str): The file to write (e.g. a node_exporter textfile directory).
+
+    Returns:
+        str: The path that was written.
+    """
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        spans = sorted(_spans.items())
+    for (name, labels), value in counters:
+        lines.append(f"{_prometheus_name(name)}_total{_prometheus_labels(labels)} {value}")
+    for (name, labels), entry in spans:
+        metric = _prometheus_name(name) + "_seconds"
+        lines.append(f"{metric}_sum{_prometheus_labels(labels)} {entry['total_seconds']:.6f}")
+        lines.append(f"{metric}_count{_prometheus_labels(labels)} {entry['count']}")
+        lines.append(f"{metric}_max{_prometheus_labels(labels)} {entry['max_seconds']:.6f}")
+    _write_atomically(path, "\n".join(lines) + "\n")
+    return path
@@ -0,0 +1,58 @@
+# File: src/model_cache.py
+# This file remembers which Gemini model we picked last time.
+# Listing the models is a slow network call, so we save the answer in a small
+# JSON file and trust it for a day. Offline starts can then skip the listing.
+
+import json
+import os
+import time
+from src.utils import PRIVATE_DIR
+
+# --- Configuration ---
+
+MODEL_CACHE_FILE = os.path.join(PRIVATE_DIR, "model_cache.json")
+
+# How long (in seconds) a saved model choice is trusted: one day
+MODEL_CACHE_TTL = 24 * 60 * 60
+
+
+def _read_cache() -> dict:
+    try:
+        with open(MODEL_CACHE_FILE, "r", encoding="utf-8") as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def get_cached_model(key: str, ttl: float = MODEL_CACHE_TTL) -> str | None:
+    """
+    Returns the saved model name for `key` if it is still fresh.
+
+    Args:
+        key (str): Which agent the choice belongs to (e.g. "cli" or "adk").
+        ttl (float): Maximum age of the saved choice, in seconds.
+
+    Returns:
+        str | None: The model name, or None if there is no fresh choice.
+    """
+    entry = _read_cache().get(key)
+    if not entry or time.time() - entry.get("saved_at", 0) > ttl:
+        return None
+    return entry.get("model")
+
+
+def save_model_choice(key: str, model_name: str) -> None:
+    """
+    Saves the chosen model name for `key`.
+
+    Args:
+        key (str): Which agent the choice belongs to (e.g. "cli" or "adk").
+        model_name (str): The model that was selected.
+    """
+    cache = _read_cache()
+    cache[key] = {"model": model_name, "saved_at": time.time()}
+    os.makedirs(PRIVATE_DIR, exist_ok=True)
+    temp_path = MODEL_CACHE_FILE + ".part"
+    with open(temp_path, "w", encoding="utf-8") as cache_file:
+        json.dump(cache, cache_file, indent=2)
+    os.replace(temp_path, MODEL_CACHE_FILE)
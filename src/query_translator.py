@@ -0,0 +1,364 @@
+# File: src/query_translator.py
+# A fast, rule-based translator from plain-English prompts to Gmail queries.
+# Most prompts look like the examples in our system instruction ("emails from X",
+# "label Y", "after 2024-10-01", "last week", "about Z"). For those we do not need
+# Gemini at all: we build the query here and run search + export directly.
+# If any part of the prompt is not understood, we return None and the LLM takes over.
+#
+# Every translation (ours, or the one Gemini picked) is remembered in a small JSON
+# file, keyed by the normalised prompt, so a repeated prompt is answered instantly.
+
+import json
+import os
+import re
+import threading
+import time
+from src.utils import PRIVATE_DIR
+
+# --- Configuration ---
+
+QUERY_CACHE_FILE = os.path.join(PRIVATE_DIR, "query_cache.json")
+
+# How long (in seconds) a remembered translation is trusted: 30 days
+QUERY_CACHE_TTL = 30 * 24 * 60 * 60
+
+# The oldest translations are dropped when the cache grows past this size
+QUERY_CACHE_MAX_ENTRIES = 500
+
+# Bump this when the rules change, so old translations are not reused
+RULES_VERSION = 3
+
+# Share of the prompt's words that must be understood (1.0 = every word)
+MIN_CONFIDENCE = 1.0
+
+# Longest free-text topic we translate ourselves (longer ones go to the LLM)
+MAX_TOPIC_WORDS = 3
+
+# Words that carry no search meaning ("show me all my emails ...")
+FILLER_WORDS = {
+    "a", "all", "an", "and", "any", "are", "as", "at", "csv", "download", "email", "emails",
+    "export", "file", "find", "for", "from", "get", "give", "i", "in", "into", "is", "list",
+    "mail", "mails", "me", "message", "messages", "my", "need", "of", "please", "received",
+    "save", "search", "sent", "show", "that", "the", "to", "want", "were", "which", "with",
+}
+
+MONTHS = {
+    name: number
+    for number, names in enumerate(
+        [("jan", "january"), ("feb", "february"), ("mar", "march"), ("apr", "april"),
+         ("may",), ("jun", "june"), ("jul", "july"), ("aug", "august"),
+         ("sep", "sept", "september"), ("oct", "october"), ("nov", "november"), ("dec", "december")],
+        start=1,
+    )
+    for name in names
+}
+
+# Time words that must never be read as a sender ("emails from last week")
+TIME_WORDS = {"last", "past", "this", "today", "yesterday"} | set(MONTHS)
+NOT_SENDERS = sorted(TIME_WORDS | FILLER_WORDS, key=len, reverse=True)
+
+_EMAIL = r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"
+_ISO_DATE = r"(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})"
+_NAMED_DATE = r"(" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\.?\s+(\d{1,2})(?:st|nd|rd|th)?,?\s+(\d{4})"
+_DATE = rf"(?:{_ISO_DATE}|{_NAMED_DATE})"
+_YEAR = r"((?:19|20)\d{2})\b(?![-/.]\d)"
+
+# Prompts with these words (once absolute dates are taken out) are never remembered:
+# "yesterday", "since monday" or "this month" mean another date on another day
+_RELATIVE_WORDS = (
+    r"\b(?:today|tonight|yesterday|tomorrow|now|recent|recently|ago|this|last|past|next|previous"
+    r"|weekend|days?|weeks?|months?|years?"
+    r"|(?:mon|tues|wednes|thurs|fri|satur|sun)days?|" + "|".join(MONTHS) + r")\b"
+)
+_UNITS = {"day": "d", "month": "m", "year": "y"}
+
+_cache_lock = threading.Lock()
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Turns a prompt into the key used by the translation cache.
+
+    Lower-cases it, unifies quotes, removes the final punctuation and squeezes spaces,
+    so "Emails from Bob!" and "emails  from bob" share one entry.
+
+    Args:
+        prompt (str): The user's prompt.
+
+    Returns:
+        str: The normalised prompt.
+    """
+    text = prompt.lower().replace("“", '"').replace("”", '"').replace("‘", "'").replace("’", "'")
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip(".!?,; ").strip()
+
+
+def _date_text(match, first_group: int) -> str:
+    """
+    Returns a matched _DATE as "YYYY/MM/DD" (Gmail's date format).
+    """
+    year, month, day = match.group(first_group, first_group + 1, first_group + 2)
+    if year is None:
+        month_name, day, year = match.group(first_group + 3, first_group + 4, first_group + 5)
+        month = MONTHS[month_name]
+    return f"{int(year):04d}/{int(month):02d}/{int(day):02d}"
+
+
+def _quote(text: str) -> str:
+    """
+    Quotes a value for a Gmail query if it contains spaces.
+    """
+    return f'"{text}"' if " " in text else text
+
+
+def _label_name(text: str) -> str:
+    # Gmail queries write spaces in label names as dashes
+    return re.sub(r"\s+", "-", text.strip())
+
+
+def _days_ago(days: int) -> str:
+    """
+    Returns the local calendar date `days` days before today as "YYYY/MM/DD".
+    """
+    now = time.localtime()
+    # Noon, so a daylight saving change cannot move us to another day
+    day = time.mktime((now.tm_year, now.tm_mon, now.tm_mday - days, 12, 0, 0, 0, 0, -1))
+    return time.strftime("%Y/%m/%d", time.localtime(day))
+
+
+def _period_start(unit: str) -> str:
+    """
+    Returns the first local calendar day of the current week (Monday), month or year.
+    """
+    now = time.localtime()
+    days = {"week": now.tm_wday, "month": now.tm_mday - 1, "year": now.tm_yday - 1}[unit]
+    return _days_ago(days)
+
+
+def _relative_time(number: str | None, unit: str) -> str:
+    count = int(number) if number else 1
+    unit = unit.rstrip("s")
+    if unit == "week":
+        return f"newer_than:{count * 7}d"
+    return f"newer_than:{count}{_UNITS[unit]}"
+
+
+def _or_values(text: str) -> list[str]:
+    """
+    Splits "'a' or 'b', c" into ["a", "b", "c"].
+    """
+    parts = re.split(r"\s*(?:,|\bor\b)\s*", text)
+    return [part.strip(" '\"") for part in parts if part.strip(" '\"")]
+
+
+def _group(terms: list[str]) -> str:
+    # {a b} means "a OR b" in a Gmail query
+    return terms[0] if len(terms) == 1 else "{" + " ".join(terms) + "}"
+
+
+def _apply_rules(text: str) -> tuple[list[str], str, str]:
+    """
+    Applies every rule to a normalised prompt.
+
+    Returns:
+        tuple: (query parts, export format, the text that no rule understood)
+    """
+    parts = []
+    export_format = "csv"
+
+    def consume(pattern, build):
+        nonlocal text
+        def replace(match):
+            result = build(match)
+            if result:
+                parts.append(result)
+            return " "
+        text = re.sub(pattern, replace, text)
+
+    def set_format(match):
+        nonlocal export_format
+        export_format = match.group(1)
+        return None
+
+    consume(r"\b(?:as |to |in )?(?:a )?(parquet|csv)(?: file| format)?\b", set_format)
+
+    # A whole year ("from 2023" is a date, not a sender)
+    consume(rf"\b(?:in|from|during|of)(?: the year)? {_YEAR}",
+            lambda m: f"after:{m.group(1)}/01/01 before:{int(m.group(1)) + 1}/01/01")
+
+    # Senders and recipients
+    consume(rf"\bfrom ((?:'{_EMAIL}'|\"{_EMAIL}\"|{_EMAIL})(?:\s*(?:,|or)\s*(?:'{_EMAIL}'|\"{_EMAIL}\"|{_EMAIL}))*)",
+            lambda m: _group([f"from:{value}" for value in _or_values(m.group(1))]))
+    # Numbers and time words are never senders ("from 15", "from march"); the LLM reads those
+    consume(rf"\bfrom ['\"]?(?!(?:{'|'.join(NOT_SENDERS)})\b|\d+\b)([a-z0-9][\w.-]*)['\"]?(?=\s|$)",
+            lambda m: f"from:{m.group(1)}")
+    # "emails I sent to X": the sender is me
+    consume(rf"\b(?:that |which )?i(?:'ve| have)? sent (?:an? |any )?(?:e?mails? |messages? )?to ['\"]?({_EMAIL})['\"]?",
+            lambda m: f"from:me to:{m.group(1)}")
+    consume(rf"\b(?:sent )?to ['\"]?({_EMAIL})['\"]?", lambda m: f"to:{m.group(1)}")
+
+    # Subject and labels
+    consume(r"\b(?:with )?(?:the |a )?subject(?: line)?(?: is| of)? ['\"]([^'\"]+)['\"]",
+            lambda m: f'subject:"{m.group(1)}"' if " " in m.group(1) else f"subject:{m.group(1)}")
+    consume(r"\b(?:with |in |under )?(?:the |a )?labels? (?:named |called )?((?:['\"][^'\"]+['\"]|[\w/-]+)"
+            r"(?:\s*(?:,|or)\s*(?:['\"][^'\"]+['\"]|[\w/-]+))*)",
+            lambda m: _group([f"label:{_label_name(value)}" for value in _or_values(m.group(1))]))
+    consume(r"\blabel(?:l)?ed ['\"]?([\w/-]+)['\"]?", lambda m: f"label:{m.group(1)}")
+
+    # Message state
+    consume(r"\b(unread|starred|important)\b", lambda m: f"is:{m.group(1)}")
+    consume(r"\b(?:with|having|that have|which have) (?:an |any )?attachments?\b", lambda m: "has:attachment")
+
+    # Absolute dates
+    consume(rf"\bbetween ['\"]?{_DATE}['\"]? and ['\"]?{_DATE}['\"]?",
+            lambda m: f"after:{_date_text(m, 1)} before:{_date_text(m, 7)}")
+    consume(rf"\b(after|since|before|until) ['\"]?{_DATE}['\"]?",
+            lambda m: f"{'before' if m.group(1) in ('before', 'until') else 'after'}:{_date_text(m, 2)}")
+    consume(rf"\bon ['\"]?{_DATE}['\"]?",
+            lambda m: f"after:{_date_text(m, 1)} before:{_next_day(_date_text(m, 1))}")
+
+    # Relative dates: "this month" is the calendar month, "the past month" the last 30 days
+    consume(r"\b(?:in |from |during )?this (week|month|year)\b", lambda m: f"after:{_period_start(m.group(1))}")
+    consume(r"\b(?:in |from |during )?(?:the )?(?:last|past) (?:(\d+) )?(day|week|month|year)s?\b",
+            lambda m: _relative_time(m.group(1), m.group(2)))
+    # Calendar days (in local time), not the last 24/48 hours
+    consume(r"\b(?:from )?today\b", lambda m: f"after:{_days_ago(0)}")
+    consume(r"\b(?:from )?yesterday\b", lambda m: f"after:{_days_ago(1)} before:{_days_ago(0)}")
+
+    # Free-text topic: "about X", "containing the words X or Y"
+    def topic(match):
+        words = _or_values(match.group(1))
+        if not words or sum(len(word.split()) for word in words) > MAX_TOPIC_WORDS:
+            return "?topic-too-long"
+        terms = [_quote(word) for word in words]
+        return terms[0] if len(terms) == 1 else " OR ".join(terms)
+
+    consume(r"\b(?:about|regarding|mentioning|containing(?: the words?)?|with the words?)"
+            r" ((?:['\"][^'\"]+['\"]|[\w-]+)(?:\s*(?:,|or)\s*(?:['\"][^'\"]+['\"]|[\w-]+))*)",
+            topic)
+
+    return parts, export_format, text
+
+
+def _next_day(date_text: str) -> str:
+    day = time.strptime(date_text, "%Y/%m/%d")
+    return time.strftime("%Y/%m/%d", time.localtime(time.mktime(day) + 36 * 60 * 60))
+
+
+def translate_with_rules(prompt: str) -> dict | None:
+    """
+    Translates a prompt into a Gmail query with the local rules only.
+
+    Args:
+        prompt (str): The user's prompt.
+
+    Returns:
+        dict | None: {"query", "export", "confidence", "source"}, or None when the
+                     prompt is not understood well enough (the LLM should handle it).
+    """
+    text = normalize_prompt(prompt)
+    parts, export_format, leftover = _apply_rules(text)
+
+    unknown = [word for word in re.findall(r"[\w@.'-]+", leftover) if word.strip("'.") not in FILLER_WORDS]
+    understood = len(parts)
+    confidence = understood / (understood + len(unknown)) if understood else 0.0
+    if confidence < MIN_CONFIDENCE or any(part.startswith("?") for part in parts):
+        return None
+
+    return {"query": " ".join(parts), "export": export_format, "confidence": round(confidence, 3), "source": "rules"}
+
+
+def _read_cache() -> dict:
+    try:
+        with open(QUERY_CACHE_FILE, "r", encoding="utf-8") as cache_file:
+            cache = json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+    if cache.get("rules_version") != RULES_VERSION:
+        return {}
+    return cache.get("entries", {})
+
+
+def _write_cache(entries: dict) -> None:
+    if len(entries) > QUERY_CACHE_MAX_ENTRIES:
+        newest = sorted(entries.items(), key=lambda item: item[1].get("saved_at", 0), reverse=True)
+        entries = dict(newest[:QUERY_CACHE_MAX_ENTRIES])
+    os.makedirs(PRIVATE_DIR, exist_ok=True)
+    temp_path = QUERY_CACHE_FILE + ".part"
+    with open(temp_path, "w", encoding="utf-8") as cache_file:
+        json.dump({"rules_version": RULES_VERSION, "entries": entries}, cache_file, indent=2, ensure_ascii=False)
+    os.replace(temp_path, QUERY_CACHE_FILE)
+
+
+def _names_relative_time(text: str) -> bool:
+    """
+    True if a normalised prompt has a date that depends on the day it is asked
+    ("yesterday", "since monday", "in march"). Full dates and years do not count.
+    """
+    text = re.sub(_DATE, " ", text)
+    text = re.sub(rf"(?:the year )?{_YEAR}", " ", text)
+    return re.search(_RELATIVE_WORDS, text) is not None
+
+
+def remember_translation(
+    prompt: str,
+    query: str,
+    export_format: str = "csv",
+    source: str = "llm",
+    search_args: dict | None = None,
+) -> None:
+    """
+    Saves the Gmail query used for a prompt, so the same prompt skips the LLM next time.
+    Prompts with relative dates ("yesterday", "this month", "last week") are not saved,
+    because the query that fits them changes from day to day.
+
+    Args:
+        prompt (str): The user's prompt.
+        query (str): The Gmail query that was run for it.
+        export_format (str): "csv" or "parquet".
+        source (str): Who made the translation ("rules" or "llm").
+        search_args (dict): The other search_gmail() arguments that were used
+                            (e.g. columns), so a replay exports the same rows.
+    """
+    key = normalize_prompt(prompt)
+    search_args = search_args or {}
+    if _names_relative_time(key):
+        return
+    with _cache_lock:
+        entries = _read_cache()
+        entry = entries.get(key)
+        if (entry and entry.get("query") == query and entry.get("export") == export_format
+                and entry.get("search_args", {}) == search_args):
+            return
+        entries[key] = {"query": query, "export": export_format, "source": source, "saved_at": time.time()}
+        if search_args:
+            entries[key]["search_args"] = search_args
+        _write_cache(entries)
+
+
+def translate_prompt(prompt: str, ttl: float = QUERY_CACHE_TTL) -> dict | None:
+    """
+    Translates a prompt into a Gmail query without the LLM, if we can.
+
+    The translation cache is checked first, then the local rules. New rule
+    translations are added to the cache.
+
+    Args:
+        prompt (str): The user's prompt.
+        ttl (float): Maximum age of a cached translation, in seconds.
+
+    Returns:
+        dict | None: {"query", "export", "confidence", "source"} (plus "search_args" for
+                     a remembered search with other arguments), or None if the LLM
+                     should translate this prompt.
+    """
+    with _cache_lock:
+        entry = _read_cache().get(normalize_prompt(prompt))
+    if entry and time.time() - entry.get("saved_at", 0) <= ttl:
+        return {"query": entry["query"], "export": entry.get("export", "csv"), "confidence": 1.0,
+                "source": f"cache ({entry.get('source', 'rules')})", "search_args": entry.get("search_args", {})}
+
+    translation = translate_with_rules(prompt)
+    if translation is not None:
+        remember_translation(prompt, translation["query"], translation["export"], source="rules")
+    return translation
@@ -0,0 +1,99 @@
+# File: src/tools/async_tools.py
+# Async versions of the agent's tools, for the ADK agent (agent.py).
+# "adk web" and "adk api_server" run every session on ONE asyncio event loop, and
+# a normal (blocking) tool stops that loop until it returns: while one user's
+# search downloads thousands of emails, every other session waits.
+#
+# The Gmail client (googleapiclient) and the file writers are blocking code, so
+# each call runs in a small, bounded thread pool instead, and the event loop keeps
+# serving the other sessions. When a call is cancelled (e.g. the user leaves),
+# the thread is told to stop at its next check (see cancellation.py).
+#
+# The tools keep the names, arguments and docstrings of the blocking versions,
+# so Gemini sees exactly the same tool descriptions.
+
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.tools import cancellation
+from src.tools.gmail_search_tool import search_gmail as _search_gmail
+from src.tools.csv_export_tool import export_to_csv as _export_to_csv
+from src.tools.parquet_export_tool import export_to_parquet as _export_to_parquet
+from src.utils import print_log, PREFIX_TOOL
+
+# --- Configuration ---
+
+# Most tool calls that run at the same time (more calls wait for a free thread).
+# They share one Gmail quota, so more threads would mostly wait for the limiter.
+MAX_WORKERS = 8
+
+
+# Created on first use, shared by all sessions of the process
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="gmail-tool")
+    return _executor
+
+
+def shutdown(wait: bool = True) -> None:
+    """
+    Stops the tool thread pool (a new one is created on the next call).
+
+    Args:
+        wait (bool): Wait until the running calls have returned (cancelled ones
+                     return at their next check).
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Runs a blocking function in the tool thread pool without blocking the event loop.
+
+    If the waiting task is cancelled, a call that has not started yet is dropped
+    and a running one is asked to stop (it raises ToolCancelled at its next check).
+
+    Args:
+        func: The blocking function.
+        *args, **kwargs: Its arguments.
+
+    Returns:
+        Whatever func returns.
+    """
+    cancel_event = threading.Event()
+    # The thread runs in a copy of our context, with its own cancel event
+    context = contextvars.copy_context()
+    context.run(cancellation.set_cancel_event, cancel_event)
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_get_executor(), functools.partial(context.run, func, *args, **kwargs))
+    try:
+        return await future
+    except asyncio.CancelledError:
+        cancel_event.set()
+        print_log(PREFIX_TOOL, f"{func.__name__} cancelled.")
+        raise
+
+
+def _async_tool(func):
+    # Same name, signature and docstring as the blocking tool, but awaitable
+    @functools.wraps(func)
+    async def tool(*args, **kwargs):
+        return await run_blocking(func, *args, **kwargs)
+    return tool
+
+
+search_gmail = _async_tool(_search_gmail)
+export_to_csv = _async_tool(_export_to_csv)
+export_to_parquet = _async_tool(_export_to_parquet)
@@ -1,36 +1,81 @@
 # File: src/tools/auth_tool.py
 # This tool handles getting permission to access a user's Gmail account.
 # It uses the "credentials.json" file and creates a "token.json" file.
+# Extra mailboxes (e.g. shared ones) each get their own token file in
+# Private/tokens/, named after the account (see "--add-account").
 
 import os
+import re
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 
 # Import our custom print function from the utils.py file
-from src.utils import print_log, PREFIX_TOOL
+from src.utils import print_log, PREFIX_TOOL, PRIVATE_DIR
 
 # --- Configuration ---
 
-# Define the directory for private files
-PRIVATE_DIR = "Private"
-
 # This is where your secret file is stored
 CREDENTIALS_FILE = os.path.join(PRIVATE_DIR, "credentials.json") 
 
 # This is where we'll save the "permission slip"
 TOKEN_FILE = os.path.join(PRIVATE_DIR, "token.json") 
 
+# One "permission slip" per extra account: Private/tokens/<account>.json
+TOKENS_DIR = os.path.join(PRIVATE_DIR, "tokens")
+
 # This tells Google what we want to do.
 # We are only asking to *read* emails, not send or delete them.
 SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
 
 # --- Main Function ---
 
-def get_gmail_credentials() -> Credentials:
+def token_file_for(account: str | None = None) -> str:
+    """
+    Returns the token file of an account (None is the default account, token.json).
+
+    Args:
+        account (str): A name for the account, e.g. "support" or "team@example.com".
+
+    Raises:
+        ValueError: If the name is empty or has characters that are unsafe in a file name.
+    """
+    if account is None:
+        return TOKEN_FILE
+    if not re.fullmatch(r"[\w.@+-]+", account):
+        raise ValueError(f"Invalid account name '{account}'. Use letters, digits and . @ + - _ only.")
+    return os.path.join(TOKENS_DIR, f"{account}.json")
+
+def list_accounts() -> list[str]:
+    """
+    Returns the names of the accounts that have a saved token, sorted.
+    """
+    if not os.path.isdir(TOKENS_DIR):
+        return []
+    return sorted(name[:-5] for name in os.listdir(TOKENS_DIR) if name.endswith(".json"))
+
+def save_credentials(creds: Credentials, account: str | None = None) -> None:
+    """
+    Saves credentials to the account's token file so the next run does not need a login.
+
+    Args:
+        creds (Credentials): The credentials to save.
+        account (str): The account name (None: the default token.json).
+    """
+    token_file = token_file_for(account)
+    os.makedirs(os.path.dirname(token_file), exist_ok=True)
+    with open(token_file, "w") as token:
+        token.write(creds.to_json())
+        print_log(PREFIX_TOOL, f"Credentials saved to {token_file} for future use.")
+
+def get_gmail_credentials(account: str | None = None) -> Credentials:
     """
     Gets valid Google credentials for the Gmail API.
     It will handle the login pop-up, save the token, and refresh it.
+
+    Args:
+        account (str): Which account's token to use (None: the default token.json).
+                       A new account opens the login pop-up once; sign in to that mailbox.
     
     Returns:
         Credentials: A valid Google credentials object.
@@ -44,9 +89,10 @@ def get_gmail_credentials() -> Credentials:
         print_log(PREFIX_TOOL, f"Created directory: {PRIVATE_DIR}")
     
     # --- 1. Check if "permission slip" (token.json) already exists ---
-    if os.path.exists(TOKEN_FILE):
-        print_log(PREFIX_TOOL, f"Found existing token: {TOKEN_FILE}")
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+    token_file = token_file_for(account)
+    if os.path.exists(token_file):
+        print_log(PREFIX_TOOL, f"Found existing token: {token_file}")
+        creds = Credentials.from_authorized_user_file(token_file, SCOPES)
 
     # --- 2. If no valid "permission slip", get a new one ---
     if not creds or not creds.valid:
@@ -67,9 +113,7 @@ def get_gmail_credentials() -> Credentials:
             print_log(PREFIX_TOOL, "Login successful!")
 
         # --- 3. Save the new "permission slip" for next time ---
-        with open(TOKEN_FILE, "w") as token:
-            token.write(creds.to_json())
-            print_log(PREFIX_TOOL, f"Credentials saved to {TOKEN_FILE} for future use.")
+        save_credentials(creds, account)
 
     print_log(PREFIX_TOOL, "Authentication successful. Credentials ready.")
     return creds
@@ -0,0 +1,174 @@
+# File: src/tools/batch_fetch_tool.py
+# This tool fetches many Gmail messages at once using Gmail "batch" HTTP requests.
+# Instead of one HTTPS round-trip per message, up to 100 "get" calls travel
+# together inside a single multipart request.
+
+import time
+from src import metrics
+from src.tools.rate_limiter import is_retryable_error, backoff_delay, QUOTA_UNITS
+from src.utils import print_log, PREFIX_TOOL
+
+# --- Configuration ---
+
+# Gmail refuses batches with more than 100 sub-requests
+BATCH_LIMIT = 100
+
+# Google recommends 50 or fewer to avoid per-user rate limiting
+DEFAULT_BATCH_SIZE = 50
+
+# How many times we retry the sub-requests that failed with a temporary error
+MAX_RETRIES = 4
+
+
+def new_fetch_stats() -> dict:
+    """
+    Creates an empty statistics dictionary for a fetch run.
+
+    Returns:
+        dict: Counters for fetched messages, API calls, retries, failures and cache hits.
+    """
+    return {"messages": 0, "api_calls": 0, "retries": 0, "failed": 0, "cache_hits": 0}
+
+
+def calls_per_message(stats: dict) -> float:
+    """
+    Calculates how many HTTP round-trips were needed per fetched message.
+
+    Args:
+        stats (dict): A statistics dictionary from new_fetch_stats().
+
+    Returns:
+        float: API calls divided by messages (0.0 if nothing was fetched).
+    """
+    if not stats["messages"]:
+        return 0.0
+    return stats["api_calls"] / stats["messages"]
+
+
+def fetch_messages_batched(
+    service,
+    message_ids: list[str],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    http=None,
+    stats: dict | None = None,
+    limiter=None,
+    **get_kwargs,
+) -> list[dict | None]:
+    """
+    Fetches many messages with Gmail batch requests.
+
+    Args:
+        service: A Gmail API service object from build("gmail", "v1").
+        message_ids (list[str]): The message IDs to fetch.
+        batch_size (int): Sub-requests per batch (1 to BATCH_LIMIT).
+        http: Optional HTTP transport for the batch (e.g. a fake one for testing).
+        stats (dict): Optional statistics dictionary to update.
+        limiter: Optional TokenBucket; every sub-request costs its own quota units.
+        **get_kwargs: Extra arguments for messages().get(), e.g. format="metadata".
+
+    Returns:
+        list: The message resources, in the same order as message_ids.
+              A message that failed permanently is None.
+    """
+    if not 1 <= batch_size <= BATCH_LIMIT:
+        raise ValueError(f"batch_size must be between 1 and {BATCH_LIMIT}, got {batch_size}")
+    if stats is None:
+        stats = new_fetch_stats()
+    with metrics.span("fetch", mode="batch"):
+        return _fetch_batched(service, message_ids, batch_size, http, stats, limiter, get_kwargs, "messages")
+
+
+def fetch_threads_batched(
+    service,
+    thread_ids: list[str],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    http=None,
+    stats: dict | None = None,
+    limiter=None,
+    **get_kwargs,
+) -> list[dict | None]:
+    """
+    Fetches many conversation threads with Gmail batch requests.
+
+    One threads().get returns every message of a conversation, so a thread of
+    five emails costs one sub-request (10 quota units) instead of five (25 units).
+
+    Args:
+        service: A Gmail API service object from build("gmail", "v1").
+        thread_ids (list[str]): The thread IDs to fetch.
+        batch_size (int): Sub-requests per batch (1 to BATCH_LIMIT).
+        http: Optional HTTP transport for the batch (e.g. a fake one for testing).
+        stats (dict): Optional statistics dictionary to update ("messages" counts
+                      the messages inside the fetched threads).
+        limiter: Optional TokenBucket; every sub-request costs its own quota units.
+        **get_kwargs: Extra arguments for threads().get(), e.g. format="metadata".
+
+    Returns:
+        list: The thread resources, in the same order as thread_ids.
+              A thread that failed permanently is None.
+    """
+    if not 1 <= batch_size <= BATCH_LIMIT:
+        raise ValueError(f"batch_size must be between 1 and {BATCH_LIMIT}, got {batch_size}")
+    if stats is None:
+        stats = new_fetch_stats()
+    with metrics.span("fetch", mode="threads"):
+        return _fetch_batched(service, thread_ids, batch_size, http, stats, limiter, get_kwargs, "threads")
+
+
+def _fetch_batched(service, ids, batch_size, http, stats, limiter, get_kwargs, kind) -> list[dict | None]:
+    """Does the work of fetch_messages_batched() and fetch_threads_batched() (inside their timing span)."""
+    # Building users().messages() / threads() parses the discovery document, so do it only once
+    resource = service.users().threads() if kind == "threads" else service.users().messages()
+    method = f"{kind}.get"
+    results = [None] * len(ids)
+    pending = list(range(len(ids)))
+    attempt = 0
+
+    while pending:
+        retry_later = []
+
+        def on_response(request_id, response, exception):
+            index = int(request_id)
+            if exception is None:
+                results[index] = response
+            elif is_retryable_error(exception) and attempt < MAX_RETRIES:
+                retry_later.append(index)
+            else:
+                print_log(PREFIX_TOOL, f"Could not fetch {kind[:-1]} {ids[index]}: {exception}")
+                stats["failed"] += 1
+
+        # Send the pending IDs in groups of batch_size
+        for start in range(0, len(pending), batch_size):
+            group = pending[start:start + batch_size]
+            batch = service.new_batch_http_request(callback=on_response)
+            for index in group:
+                request = resource.get(
+                    userId="me", id=ids[index], **get_kwargs
+                )
+                batch.add(request, request_id=str(index))
+            units = QUOTA_UNITS[method] * len(group)
+            if limiter is not None:
+                limiter.acquire(units)
+            batch.execute(http=http)
+            stats["api_calls"] += 1
+            metrics.increment("api_calls", method="batch")
+            metrics.increment("batch_sub_requests", len(group))
+            metrics.increment("quota_units", units)
+
+        if not retry_later:
+            break
+
+        # Only the failed sub-requests are sent again, after a growing, random pause
+        delay = backoff_delay(attempt)
+        print_log(PREFIX_TOOL, f"Retrying {len(retry_later)} {kind} in {delay:.1f}s...")
+        time.sleep(delay)
+        stats["retries"] += len(retry_later)
+        metrics.increment("retries", len(retry_later), method=method)
+        pending = sorted(retry_later)
+        attempt += 1
+
+    if kind == "threads":
+        stats["messages"] += sum(len(result.get("messages", [])) for result in results if result is not None)
+    else:
+        stats["messages"] += sum(1 for result in results if result is not None)
+    return results
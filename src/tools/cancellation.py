@@ -0,0 +1,67 @@
+# File: src/tools/cancellation.py
+# Lets a running tool notice that its caller gave up.
+# A thread cannot be stopped from the outside, so the async tools (async_tools.py)
+# hand each call a threading.Event. Long loops (collecting the emails of a search,
+# writing the rows of an export) check it and stop cleanly once it is set.
+
+import threading
+from contextvars import ContextVar
+
+# The cancel event of the tool call running in this context (None: cannot be cancelled)
+_cancel_event: ContextVar[threading.Event | None] = ContextVar("cancel_event", default=None)
+
+
+class ToolCancelled(Exception):
+    """
+    Raised inside a tool when its call was cancelled.
+    """
+
+
+def set_cancel_event(event: threading.Event | None) -> None:
+    """
+    Sets the cancel event for the tool call running in the current context.
+    """
+    _cancel_event.set(event)
+
+
+def current_cancel_event() -> threading.Event | None:
+    """
+    Returns the cancel event of the current tool call (None outside the async tools).
+    Loops fetch it once and then only check event.is_set(), which is very cheap.
+    """
+    return _cancel_event.get()
+
+
+def raise_if_cancelled(event: threading.Event | None = None) -> None:
+    """
+    Raises ToolCancelled if the tool call was cancelled.
+
+    Args:
+        event: The event to check (defaults to current_cancel_event()).
+    """
+    if event is None:
+        event = _cancel_event.get()
+    if event is not None and event.is_set():
+        raise ToolCancelled("The tool call was cancelled.")
+
+
+def cancellable(items, event: threading.Event | None, every: int = 1000):
+    """
+    Passes items through, checking the cancel event every `every` items.
+    With no event, the items are returned unchanged (no overhead at all).
+
+    Args:
+        items: Any iterable (e.g. the rows of an export).
+        event: The cancel event (from current_cancel_event()).
+        every (int): How many items pass between two checks.
+    """
+    if event is None:
+        return items
+    return _checked(items, event, every)
+
+
+def _checked(items, event: threading.Event, every: int):
+    for number, item in enumerate(items):
+        if number % every == 0 and event.is_set():
+            raise ToolCancelled("The tool call was cancelled.")
+        yield item
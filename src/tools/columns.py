@@ -0,0 +1,125 @@
+# File: src/tools/columns.py
+# The columns a search can return, and where each one comes from in a Gmail message.
+# Knowing the columns up front lets us ask Gmail for ONLY that data:
+# "metadataHeaders" limits the headers and the "fields" mask limits the JSON fields,
+# so every response is smaller and faster to parse.
+
+# --- Configuration ---
+
+# Columns read from a message header (column name -> header name)
+HEADER_COLUMNS = {"Date": "Date", "Subject": "Subject", "From": "From", "To": "To", "Cc": "Cc"}
+
+# Columns read from a top-level field of the message resource
+FIELD_COLUMNS = {
+    "Labels": "labelIds",
+    "snippet": "snippet",
+    "sizeEstimate": "sizeEstimate",
+    "threadId": "threadId",
+    "internalDate": "internalDate",
+    "id": "id",
+}
+
+AVAILABLE_COLUMNS = list(HEADER_COLUMNS) + list(FIELD_COLUMNS)
+
+# What a search returns when no columns are given (e.g. set by "--columns")
+DEFAULT_COLUMNS = ["Date", "Subject", "Labels"]
+
+# What the local search index (local_index.py) needs for every message
+INDEX_COLUMNS = ["Date", "Subject", "From", "Labels", "internalDate"]
+
+# The columns of a per-conversation row (search_gmail(thread_mode="threads"))
+THREAD_COLUMNS = ["threadId", "Subject", "From", "FirstDate", "LastDate", "MessageCount", "Labels"]
+
+# What is fetched for every message of a thread to build those rows
+THREAD_FETCH_COLUMNS = ["Date", "Subject", "From", "Labels", "internalDate"]
+
+# Always fetched: "id" keeps the results in order, "labelIds" and "historyId"
+# keep the metadata cache correct
+ALWAYS_FETCHED_FIELDS = ["id", "labelIds", "historyId"]
+
+# Fields that the metadata cache keeps next to the headers and labels
+EXTRA_FIELDS = ["snippet", "sizeEstimate", "threadId", "internalDate"]
+
+# messages.list only needs the IDs and the next page token
+LIST_FIELDS_MASK = "messages/id,nextPageToken"
+THREAD_LIST_FIELDS_MASK = "threads/id,nextPageToken"
+
+_LOOKUP = {name.lower(): name for name in AVAILABLE_COLUMNS}
+
+
+def normalize_columns(columns=None) -> list[str]:
+    """
+    Checks a column selection and returns it with the official spelling.
+
+    Args:
+        columns: None or "" (the default columns), a comma-separated string
+                 ("date, from, subject") or a list of names. Case does not matter.
+
+    Returns:
+        list[str]: The column names, in the requested order, without duplicates.
+
+    Raises:
+        ValueError: If a column name is unknown.
+    """
+    if not columns:
+        return list(DEFAULT_COLUMNS)
+    if isinstance(columns, str):
+        columns = columns.split(",")
+    selected = []
+    for column in columns:
+        name = _LOOKUP.get(str(column).strip().lower())
+        if name is None:
+            raise ValueError(f"Unknown column '{column}'. Available columns: {', '.join(AVAILABLE_COLUMNS)}")
+        if name not in selected:
+            selected.append(name)
+    return selected
+
+
+def headers_for(columns: list[str]) -> list[str]:
+    """
+    Returns the header names needed for these columns (for "metadataHeaders").
+    """
+    return [HEADER_COLUMNS[column] for column in columns if column in HEADER_COLUMNS]
+
+
+def extra_fields_for(columns: list[str]) -> list[str]:
+    """
+    Returns the extra resource fields needed for these columns (e.g. "snippet").
+    """
+    return [FIELD_COLUMNS[column] for column in columns if FIELD_COLUMNS.get(column) in EXTRA_FIELDS]
+
+
+def fields_mask(columns: list[str]) -> str:
+    """
+    Builds the partial-response "fields" mask for messages.get.
+
+    Example:
+        fields_mask(["Date", "Subject", "Labels"]) -> "id,labelIds,historyId,payload/headers"
+    """
+    fields = list(ALWAYS_FETCHED_FIELDS) + extra_fields_for(columns)
+    if headers_for(columns):
+        fields.append("payload/headers")
+    return ",".join(fields)
+
+
+def get_kwargs_for(columns: list[str]) -> dict:
+    """
+    Returns the messages.get() arguments that fetch exactly these columns.
+    """
+    kwargs = {"format": "metadata", "fields": fields_mask(columns)}
+    headers = headers_for(columns)
+    if headers:
+        kwargs["metadataHeaders"] = headers
+    return kwargs
+
+
+def thread_get_kwargs_for(columns: list[str]) -> dict:
+    """
+    Returns the threads.get() arguments that fetch exactly these columns for
+    every message of a thread.
+    """
+    kwargs = {"format": "metadata", "fields": f"id,historyId,messages({fields_mask(columns)})"}
+    headers = headers_for(columns)
+    if headers:
+        kwargs["metadataHeaders"] = headers
+    return kwargs
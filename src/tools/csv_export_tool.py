@@ -1,52 +1,210 @@
 # File: src/tools/csv_export_tool.py
 # Simple version - NO @tool decorator needed
 # IMPORTANT: Do NOT import this file into itself!
+# Rows are streamed to disk one by one with the csv module, so exports of any
+# size use the same small amount of memory.
 
-import pandas as pd
+import csv
+import gzip
+import io
+import itertools
 import os
+import time
+from src import metrics
+from src.tools.cancellation import cancellable, current_cancel_event
+from src.tools.columns import DEFAULT_COLUMNS, normalize_columns
+from src.tools.email_table import EmailTable
+from src.tools.result_store import get_result_store
 from src.utils import print_log, get_timestamped_filename, PREFIX_TOOL
 
 OUTPUT_DIR = "results"
 
-def export_to_csv(email_data: list[dict]) -> str:
+# UTF-8-sig encoding is CRITICAL for Hebrew/RTL support in Excel
+ENCODING = "utf-8-sig"
+
+# Supported compression types and the file extension they add
+COMPRESSION_EXTENSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def format_labels(labels) -> str:
+    """
+    Converts a list of labels into a single readable string.
+
+    Args:
+        labels: A list (or any iterable) of label names. A string is kept as-is.
+
+    Returns:
+        str: The labels joined with ", ".
+    """
+    if isinstance(labels, str):
+        return labels
+    if not labels:
+        return ""
+    return ", ".join(str(label) for label in labels)
+
+
+def _open_binary(path: str, compression: str | None):
     """
-    Exports a list of email data to a timestamped CSV file.
-    
+    Opens a file for binary writing, optionally through a compressor.
+    """
+    if compression is None:
+        return open(path, "wb")
+    if compression == "gzip":
+        return gzip.open(path, "wb")
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as error:
+            raise ImportError("zstd output needs the 'zstandard' package: pip install zstandard") from error
+        return zstandard.ZstdCompressor().stream_writer(open(path, "wb"))
+    raise ValueError(f"Unknown compression '{compression}'. Use one of: gzip, zstd")
+
+
+def _dict_rows(records, columns: list[str]):
+    # The CSV rows of email dictionaries (label lists become one string)
+    labels_index = columns.index("Labels") if "Labels" in columns else None
+    for record in records:
+        row = [record.get(column, "") for column in columns]
+        if labels_index is not None:
+            row[labels_index] = format_labels(row[labels_index])
+        yield row
+
+
+def stream_to_csv(
+    records,
+    file_path: str | None = None,
+    compression: str | None = None,
+    columns: list[str] | None = None,
+) -> tuple[str, int]:
+    """
+    Writes records to a CSV file row by row.
+
+    The rows go to a temporary file first, which is renamed to the final name
+    only after the last row is written. A crash never leaves a half-written export.
+
     Args:
-        email_data: The list of email dictionaries from the search_gmail tool,
-                   where each dictionary has Date, Subject, and Labels fields.
-                                 
+        records: Any iterable of email dictionaries (a list, or the iter_gmail() generator),
+                 or an EmailTable (its columns are written directly).
+        file_path (str): Where to save the file (defaults to a timestamped name in OUTPUT_DIR).
+        compression (str): None, "gzip" or "zstd".
+        columns (list[str]): The columns to write, in order (defaults to the keys
+                             of the first record).
+
+    Returns:
+        tuple: (path of the saved file, number of rows written)
+    """
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Unknown compression '{compression}'. Use one of: gzip, zstd")
+
+    if file_path is None:
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        filename = get_timestamped_filename("gmail_export", "csv") + COMPRESSION_EXTENSIONS[compression]
+        file_path = os.path.join(OUTPUT_DIR, filename)
+    temp_path = file_path + ".part"
+
+    if isinstance(records, EmailTable):
+        # A table hands out ready-made rows from its columns, no dictionary per email
+        columns = columns or list(records.columns)
+        rows = records.iter_rows(columns)
+    else:
+        # Without explicit columns, the first record tells us which columns the search returned
+        records = iter(records)
+        first = next(records, None)
+        if first is not None:
+            records = itertools.chain([first], records)
+        if columns is None:
+            columns = list(first) if first is not None else list(DEFAULT_COLUMNS)
+        rows = _dict_rows(records, columns)
+    # An async tool call that is cancelled stops here (and its .part file is removed)
+    rows = cancellable(rows, current_cancel_event())
+
+    rows_written = 0
+    started = time.perf_counter()
+    try:
+        with io.TextIOWrapper(_open_binary(temp_path, compression), encoding=ENCODING, newline="") as stream:
+            writer = csv.writer(stream)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow(row)
+                rows_written += 1
+        # Atomic on the same filesystem: readers see either nothing or the full file
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    metrics.record_duration("export", time.perf_counter() - started, format="csv")
+    metrics.increment("rows_written", rows_written, format="csv")
+    metrics.increment("bytes_written", os.path.getsize(file_path), format="csv")
+    return file_path, rows_written
+
+
+def select_export_columns(result_handle: str, columns: str = "") -> list[str] | str | None:
+    """
+    Works out which columns to export for a stored search result.
+
+    Args:
+        result_handle (str): The handle of the search result.
+        columns (str): Optional comma-separated subset of the searched columns.
+
+    Returns:
+        The column list (None means "whatever the records have"), or an error
+        message string if a column is unknown or was not fetched by the search.
+    """
+    stored_columns = get_result_store().get_columns(result_handle)
+    if not columns:
+        return stored_columns
+    # Columns of the stored result (e.g. the conversation columns of thread mode) match as they are
+    stored_lookup = {name.lower(): name for name in stored_columns or []}
+    requested = [name.strip().lower() for name in columns.split(",") if name.strip()]
+    if requested and all(name in stored_lookup for name in requested):
+        return list(dict.fromkeys(stored_lookup[name] for name in requested))
+    try:
+        selected = normalize_columns(columns)
+    except ValueError as error:
+        return str(error)
+    missing = [column for column in selected if stored_columns is not None and column not in stored_columns]
+    if missing:
+        return (f"Column(s) {', '.join(missing)} were not fetched by this search. "
+                f"Run search_gmail again with columns=\"{','.join(stored_columns + missing)}\".")
+    return selected
+
+
+def export_to_csv(result_handle: str, columns: str = "") -> str:
+    """
+    Exports the emails of a search result to a timestamped CSV file.
+
+    Args:
+        result_handle: The result_handle returned by the search_gmail tool
+                      (e.g., "res_1a2b3c4d").
+        columns: Optional comma-separated columns to write (default: the
+                 columns the search fetched).
+
     Returns:
         The path to the saved CSV file.
     """
+    # Older callers pass the list of emails itself, which still works
+    if isinstance(result_handle, list):
+        email_data = result_handle
+        export_columns = normalize_columns(columns) if columns else None
+    else:
+        email_data = get_result_store().get(result_handle)
+        if email_data is None:
+            print_log(PREFIX_TOOL, f"Unknown result handle: '{result_handle}'")
+            return f"Unknown result handle '{result_handle}'. Run search_gmail first."
+        export_columns = select_export_columns(result_handle, columns)
+        if isinstance(export_columns, str):
+            print_log(PREFIX_TOOL, export_columns)
+            return export_columns
+
     if not email_data:
         print_log(PREFIX_TOOL, "No email data provided to export.")
         return "No data to export."
 
     print_log(PREFIX_TOOL, f"Preparing to export {len(email_data)} emails to CSV...")
-    
-    # Create the 'results' directory if it doesn't exist
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    
-    # Use pandas to create a DataFrame (vectorized, no loops!)
-    df = pd.DataFrame(email_data)
-    
-    # Format the data for readability
-    # Convert list of labels into a single string
-    if "Labels" in df.columns:
-        df["Labels"] = df["Labels"].apply(lambda x: ", ".join(x) if isinstance(x, list) else "")
-        
-    # Re-order columns for nice output
-    df = df[["Date", "Subject", "Labels"]]
-
-    # Generate filename and save
-    filename = get_timestamped_filename("gmail_export", "csv")
-    file_path = os.path.join(OUTPUT_DIR, filename)
-    
-    # UTF-8-sig encoding is CRITICAL for Hebrew/RTL support in Excel
-    encoding = "utf-8-sig" 
-    
-    df.to_csv(file_path, index=False, encoding=encoding)
-    
-    print_log(PREFIX_TOOL, f"SUCCESS! Data exported to: {file_path}")
+
+    file_path, rows_written = stream_to_csv(email_data, columns=export_columns)
+
+    print_log(PREFIX_TOOL, f"SUCCESS! {rows_written} rows exported to: {file_path}")
     return file_path
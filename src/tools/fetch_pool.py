@@ -0,0 +1,121 @@
+# File: src/tools/fetch_pool.py
+# This tool fetches message details with a small pool of worker threads.
+# httplib2 (used by googleapiclient) is NOT thread-safe, so every worker
+# builds and keeps its own Gmail service object.
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from googleapiclient.errors import HttpError
+from src import metrics
+from src.tools.rate_limiter import execute_with_backoff, get_shared_limiter
+from src.utils import print_log, PREFIX_TOOL
+
+# --- Configuration ---
+
+# How many messages are fetched at the same time
+DEFAULT_WORKERS = 8
+
+
+class FetchPool:
+    """
+    Worker threads that stay alive for a whole search, so every page of IDs
+    reuses the same threads and the Gmail service each of them built.
+
+    Use it as a context manager:
+        with FetchPool(session.service) as pool:
+            fetch_messages_concurrent(ids, session.service, pool=pool)
+    """
+
+    def __init__(self, service_factory, workers: int = DEFAULT_WORKERS):
+        """
+        Args:
+            service_factory: A function that returns a NEW Gmail service object.
+                             It is called once per worker thread.
+            workers (int): The number of worker threads.
+        """
+        self.service_factory = service_factory
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gmail-fetch")
+        self._local = threading.local()
+
+    def messages(self):
+        """
+        Returns the users().messages() resource of the calling worker thread.
+        It is built the first time the thread needs it (it is slow to build).
+        """
+        if not hasattr(self._local, "messages"):
+            self._local.messages = self.service_factory().users().messages()
+        return self._local.messages
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def fetch_messages_concurrent(
+    message_ids: list[str],
+    service_factory,
+    workers: int = DEFAULT_WORKERS,
+    limiter=None,
+    stats: dict | None = None,
+    pool: FetchPool | None = None,
+    **get_kwargs,
+) -> list[dict | None]:
+    """
+    Fetches many messages in parallel with a bounded pool of workers.
+
+    Args:
+        message_ids (list[str]): The message IDs to fetch.
+        service_factory: A function that returns a NEW Gmail service object.
+                         It is called once per worker thread.
+        workers (int): The number of worker threads.
+        limiter: The TokenBucket shared by all workers (defaults to the process one).
+        stats (dict): Optional statistics dictionary (see new_fetch_stats()) to update.
+        pool (FetchPool): Worker threads to reuse (e.g. for every page of one search).
+                          Without it, a pool is started and stopped for this call.
+        **get_kwargs: Extra arguments for messages().get(), e.g. format="metadata".
+
+    Returns:
+        list: The message resources, in the same order as message_ids.
+              A message that failed permanently is None (the rest are kept).
+    """
+    if pool is None:
+        with FetchPool(service_factory, workers=workers) as own_pool:
+            return fetch_messages_concurrent(
+                message_ids, service_factory, workers, limiter, stats, pool=own_pool, **get_kwargs
+            )
+
+    limiter = limiter or get_shared_limiter()
+    stats_lock = threading.Lock()
+
+    def fetch_one(msg_id: str):
+        call_stats = {"api_calls": 0, "retries": 0}
+        try:
+            request = pool.messages().get(userId="me", id=msg_id, **get_kwargs)
+            email = execute_with_backoff(request, "messages.get", limiter=limiter, stats=call_stats)
+        except HttpError as error:
+            print_log(PREFIX_TOOL, f"Could not fetch message {msg_id}: {error}")
+            email = None
+        if stats is not None:
+            with stats_lock:
+                stats["api_calls"] += call_stats["api_calls"]
+                stats["retries"] += call_stats["retries"]
+                if email is None:
+                    stats["failed"] += 1
+                else:
+                    stats["messages"] += 1
+        return email
+
+    started = time.monotonic()
+    with metrics.span("fetch", mode="pool"):
+        results = list(pool.executor.map(fetch_one, message_ids))
+
+    if stats is not None:
+        with stats_lock:
+            stats["fetch_seconds"] = stats.get("fetch_seconds", 0.0) + (time.monotonic() - started)
+    return results
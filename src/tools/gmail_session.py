@@ -0,0 +1,198 @@
+# File: src/tools/gmail_session.py
+# This file holds everything a search needs that does NOT change between searches:
+# the credentials, the Gmail service objects and the label ID -> name map.
+# Building them once per process makes every search after the first one start instantly.
+
+import json
+import threading
+import time
+import google_auth_httplib2
+import httplib2
+from google.auth.transport.requests import Request
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from src import metrics
+from src.tools.auth_tool import get_gmail_credentials, save_credentials
+from src.tools.rate_limiter import execute_with_backoff
+from src.utils import print_log, PREFIX_TOOL
+
+# --- Configuration ---
+
+# How long (in seconds) the label map is trusted before it is listed again
+LABEL_MAP_TTL = 300
+
+
+class CountingHttp:
+    """
+    Wraps an HTTP object and counts requests and bytes for the run metrics.
+    Everything else (e.g. .credentials, used for token refresh) is passed through.
+    """
+
+    def __init__(self, http):
+        self._http = http
+
+    def request(self, uri, method="GET", body=None, headers=None, *args, **kwargs):
+        response, content = self._http.request(uri, method, body, headers, *args, **kwargs)
+        metrics.increment("http_requests")
+        metrics.increment("bytes_sent", len(uri) + len(body or b""))
+        metrics.increment("bytes_received", len(content or b""))
+        return response, content
+
+    def __getattr__(self, name):
+        return getattr(self._http, name)
+
+
+class GmailSession:
+    """
+    Process-level Gmail state shared by all tool calls.
+
+    - Credentials are loaded once and only refreshed when they expire.
+    - The Gmail discovery document is read once from the copy bundled with
+      googleapiclient, so building a service needs no network and no parsing.
+    - Every thread gets its own service object (httplib2 is not thread-safe).
+    - The label map is cached for LABEL_MAP_TTL seconds.
+    """
+
+    def __init__(
+        self,
+        credentials_provider=None,
+        http_factory=None,
+        label_ttl: float = LABEL_MAP_TTL,
+        account: str | None = None,
+    ):
+        """
+        Args:
+            credentials_provider: A function that returns Google credentials
+                                  (defaults to get_gmail_credentials for `account`).
+            http_factory: Optional function returning an HTTP object to use instead of
+                          credentials (for example a fake Gmail backend).
+            label_ttl (float): Seconds before the label map is listed again.
+            account (str): The saved account to use (None: the default token.json).
+        """
+        self.account = account
+        self._credentials_provider = credentials_provider or (lambda: get_gmail_credentials(account))
+        self._http_factory = http_factory
+        self.label_ttl = label_ttl
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._generation = 0
+        self._creds = None
+        self._discovery_doc = None
+        self._label_map = None
+        self._label_map_time = 0.0
+
+    def credentials(self):
+        """
+        Returns valid credentials, refreshing them only when they have expired.
+        """
+        with self._lock:
+            if self._creds is None:
+                with metrics.span("auth"):
+                    self._creds = self._credentials_provider()
+            elif not self._creds.valid and self._creds.refresh_token:
+                print_log(PREFIX_TOOL, "Session credentials expired. Refreshing token...")
+                self._creds.refresh(Request())
+                save_credentials(self._creds, self.account)
+            return self._creds
+
+    def _get_discovery_doc(self) -> dict:
+        with self._lock:
+            if self._discovery_doc is None:
+                self._discovery_doc = json.loads(get_static_doc("gmail", "v1"))
+            return self._discovery_doc
+
+    def new_service(self):
+        """
+        Builds a NEW Gmail service object from the cached discovery document.
+        """
+        doc = self._get_discovery_doc()
+        if self._http_factory is not None:
+            http = self._http_factory()
+        else:
+            http = google_auth_httplib2.AuthorizedHttp(self.credentials(), http=httplib2.Http())
+        return build_from_document(doc, http=CountingHttp(http))
+
+    def service(self):
+        """
+        Returns the Gmail service object that belongs to the calling thread.
+        """
+        if getattr(self._local, "generation", None) != self._generation:
+            self._local.service = self.new_service()
+            self._local.generation = self._generation
+        elif self._http_factory is None:
+            # Make sure expired credentials are refreshed before the next call
+            self.credentials()
+        return self._local.service
+
+    def label_map(self, limiter=None, stats: dict | None = None) -> dict:
+        """
+        Returns the label ID -> readable name map, listing labels only when the cache is stale.
+
+        Args:
+            limiter: Optional TokenBucket for the quota.
+            stats (dict): Optional statistics dictionary to update.
+        """
+        with self._lock:
+            if self._label_map is not None and time.monotonic() - self._label_map_time < self.label_ttl:
+                return self._label_map
+
+        print_log(PREFIX_TOOL, "Fetching label names from Gmail...")
+        with metrics.span("labels.list"):
+            labels_response = execute_with_backoff(
+                self.service().users().labels().list(userId="me"), "labels.list", limiter=limiter, stats=stats
+            )
+        label_map = {label["id"]: label["name"] for label in labels_response.get("labels", [])}
+        print_log(PREFIX_TOOL, f"Loaded {len(label_map)} label mappings")
+
+        with self._lock:
+            self._label_map = label_map
+            self._label_map_time = time.monotonic()
+        return label_map
+
+    def invalidate(self, labels: bool = True, services: bool = False, credentials: bool = False) -> None:
+        """
+        Drops cached state so it is rebuilt on next use.
+
+        Args:
+            labels (bool): Forget the label map (e.g. after labels were renamed).
+            services (bool): Rebuild the service objects of every thread.
+            credentials (bool): Load the credentials again (also rebuilds the services).
+        """
+        with self._lock:
+            if labels:
+                self._label_map = None
+            if credentials:
+                self._creds = None
+            if services or credentials:
+                self._generation += 1
+
+
+# One session for the whole process, created on first use
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> GmailSession:
+    """
+    Returns the process-wide Gmail session, creating it on first use.
+
+    Returns:
+        GmailSession: The shared session.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = GmailSession()
+    return _session
+
+
+def set_session(session: GmailSession | None) -> None:
+    """
+    Replaces the process-wide session (None means "create a new one on next use").
+
+    Args:
+        session (GmailSession): The session to use from now on.
+    """
+    global _session
+    with _session_lock:
+        _session = session
@@ -0,0 +1,280 @@
+# File: src/tools/local_index.py
+# Answers Gmail searches from the local metadata cache, without calling the API.
+# The cache (metadata_cache.py) keeps subject, sender, labels and date of every
+# message we fetched, with a full-text index on subject and sender. Here we turn a
+# Gmail query into SQL over that data, so repeat searches take milliseconds.
+#
+# Supported: from:, subject:, label:, is:/in: system labels (unread, inbox, ...),
+# after:/before:, newer_than:/older_than:. Bare words and "quoted phrases" are
+# only answered in "local" mode: the index matches them in subject and sender,
+# while Gmail also searches the body, so the result can be smaller.
+# Anything else (OR, has:, negation, spam and trash, ...) raises UnsupportedQuery,
+# and the caller searches Gmail instead.
+
+import re
+import shlex
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from src.tools import columns as column_config
+from src.utils import print_log, PREFIX_TOOL
+
+# --- Configuration ---
+
+# Where searches are answered (e.g. set by "--search-mode"):
+# "auto"  - from the local index when it holds the whole mailbox and understands the query
+# "live"  - always from Gmail
+# "local" - always from the local index (fails for queries it does not understand)
+SEARCH_MODE = "auto"
+
+# Operators we can answer locally
+SUPPORTED_OPERATORS = {"from", "subject", "label", "in", "is", "after", "before", "newer_than", "older_than"}
+
+# is:/in: values that are simply system labels
+SYSTEM_LABELS = {
+    "unread": "UNREAD", "starred": "STARRED", "important": "IMPORTANT",
+    "inbox": "INBOX", "sent": "SENT", "draft": "DRAFT", "spam": "SPAM", "trash": "TRASH",
+}
+
+# Like Gmail, searches leave out spam and trash. The index is built from a normal
+# listing, which has no spam or trash either, so searches for them go to Gmail.
+HIDDEN_LABELS = ("SPAM", "TRASH")
+
+# Matches one label in the JSON list of label IDs (see _like_label())
+LABEL_MATCH = "label_ids LIKE ? ESCAPE '\\'"
+
+# Gmail reads after:/before: dates as midnight Pacific time, whatever the user's time zone
+GMAIL_TIME_ZONE = ZoneInfo("America/Los_Angeles")
+
+_UNIT_SECONDS = {"d": 86_400, "m": 30 * 86_400, "y": 365 * 86_400}
+
+
+class UnsupportedQuery(ValueError):
+    """Raised when a Gmail query uses something the local index cannot answer."""
+
+
+def _fts_phrase(text: str) -> str:
+    # A double-quoted FTS5 string; inner quotes are doubled
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _like_label(label_id: str) -> str:
+    # A LIKE pattern for one label ID in the JSON list; "_" and "%" in the ID are literal
+    escaped = label_id.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f'%"{escaped}"%'
+
+
+def _date_ms(value: str) -> int:
+    """
+    Converts an after:/before: value (YYYY/MM/DD, YYYY-MM-DD or epoch seconds) to epoch ms.
+    Dates are read as midnight Pacific time, like Gmail does.
+    """
+    if value.isdigit():
+        return int(value) * 1000
+    try:
+        day = datetime.strptime(value.replace("-", "/"), "%Y/%m/%d").replace(tzinfo=GMAIL_TIME_ZONE)
+    except ValueError as error:
+        raise UnsupportedQuery(f"Unsupported date '{value}'") from error
+    return int(day.timestamp() * 1000)
+
+
+def _label_ids(name: str, label_map: dict) -> list[str]:
+    """
+    Finds the label IDs for a label: query value (Gmail writes spaces and "/" as "-").
+    """
+    wanted = name.lower().replace(" ", "-").replace("/", "-")
+    return [
+        label_id for label_id, label_name in label_map.items()
+        if wanted in (label_id.lower(), label_name.lower().replace(" ", "-").replace("/", "-"))
+    ]
+
+
+def compile_query(
+    gmail_query: str,
+    label_map: dict,
+    now: float | None = None,
+    allow_text: bool = False,
+) -> tuple[str, list]:
+    """
+    Turns a Gmail query into an SQL WHERE clause over the cache's "messages" table.
+
+    Args:
+        gmail_query (str): The Gmail query.
+        label_map (dict): Label ID -> readable name (for label: by name).
+        now (float): The current time in epoch seconds (for newer_than:).
+        allow_text (bool): Answer bare words and phrases from subject and sender only
+                           (Gmail also searches the body). Without it they raise UnsupportedQuery.
+
+    Returns:
+        tuple: (SQL condition, parameters)
+
+    Raises:
+        UnsupportedQuery: If the query uses an operator we cannot answer locally.
+    """
+    now = time.time() if now is None else now
+    try:
+        tokens = shlex.split(gmail_query or "", posix=True)
+    except ValueError as error:
+        raise UnsupportedQuery(str(error)) from error
+
+    conditions = []
+    params = []
+    text_terms = []
+    for token in tokens:
+        if token.upper() in ("OR", "AND") or token.startswith(("-", "{", "(")):
+            raise UnsupportedQuery(f"'{token}' is not supported offline")
+        key, separator, value = token.partition(":")
+        key = key.lower()
+        if not separator or key not in SUPPORTED_OPERATORS:
+            if separator and re.fullmatch(r"[a-z_]+", key):
+                raise UnsupportedQuery(f"'{key}:' is not supported offline")
+            if not allow_text:
+                raise UnsupportedQuery(f"'{token}' is searched in the message body, which the index does not have")
+            text_terms.append(_fts_phrase(token))
+        elif not value:
+            raise UnsupportedQuery(f"'{token}' has no value")
+        elif key == "from":
+            text_terms.append("sender : " + _fts_phrase(value))
+        elif key == "subject":
+            text_terms.append("subject : " + _fts_phrase(value))
+        elif key in ("is", "in"):
+            if value.lower() not in SYSTEM_LABELS or SYSTEM_LABELS[value.lower()] in HIDDEN_LABELS:
+                raise UnsupportedQuery(f"'{token}' is not supported offline")
+            conditions.append(LABEL_MATCH)
+            params.append(_like_label(SYSTEM_LABELS[value.lower()]))
+        elif key == "label":
+            label_ids = _label_ids(value, label_map)
+            if any(label_id in HIDDEN_LABELS for label_id in label_ids):
+                raise UnsupportedQuery(f"'{token}' is not supported offline")
+            if not label_ids:
+                # Gmail finds nothing for an unknown label, and so do we
+                conditions.append("0")
+                continue
+            conditions.append("(" + " OR ".join(LABEL_MATCH for _ in label_ids) + ")")
+            params.extend(_like_label(label_id) for label_id in label_ids)
+        elif key == "after":
+            conditions.append("date_ms >= ?")
+            params.append(_date_ms(value))
+        elif key == "before":
+            conditions.append("date_ms < ?")
+            params.append(_date_ms(value))
+        else:  # newer_than / older_than
+            match = re.fullmatch(r"(\d+)([dmy])", value.lower())
+            if not match:
+                raise UnsupportedQuery(f"Unsupported period '{value}'")
+            bound = int((now - int(match.group(1)) * _UNIT_SECONDS[match.group(2)]) * 1000)
+            conditions.append("date_ms >= ?" if key == "newer_than" else "date_ms < ?")
+            params.append(bound)
+
+    # Messages moved to spam or trash after they were cached are still left out
+    for label_id in HIDDEN_LABELS:
+        conditions.append("NOT " + LABEL_MATCH)
+        params.append(_like_label(label_id))
+    if text_terms:
+        conditions.append("rowid IN (SELECT rowid FROM message_text WHERE message_text MATCH ?)")
+        params.append(" AND ".join(text_terms))
+    return (" AND ".join(conditions) or "1"), params
+
+
+def covers(columns: list[str]) -> bool:
+    """
+    True if the index has these columns for every message (see columns.INDEX_COLUMNS).
+    """
+    return all(column in column_config.INDEX_COLUMNS or column == "id" for column in columns)
+
+
+def search_ids(
+    cache,
+    gmail_query: str,
+    label_map: dict,
+    limit: int | None = None,
+    allow_text: bool = False,
+) -> list[str]:
+    """
+    Returns the IDs of cached messages matching a Gmail query, newest first.
+
+    Args:
+        cache: The MetadataCache.
+        gmail_query (str): The Gmail query.
+        label_map (dict): Label ID -> readable name.
+        limit (int): The most IDs to return (None means all).
+        allow_text (bool): Answer bare words from subject and sender (see compile_query()).
+
+    Raises:
+        UnsupportedQuery: If the query cannot be answered locally.
+    """
+    condition, params = compile_query(gmail_query, label_map, allow_text=allow_text)
+    return cache.search_index(condition, params, limit)
+
+
+def iter_local(
+    gmail_query: str,
+    cache,
+    label_map: dict,
+    limit: int | None = None,
+    columns: list[str] | None = None,
+    raw: bool = False,
+    allow_text: bool = False,
+):
+    """
+    Yields the emails matching a query from the local index only (no API calls).
+
+    Args:
+        gmail_query (str): The Gmail query.
+        cache: The MetadataCache.
+        label_map (dict): Label ID -> readable name.
+        limit (int): The most emails to yield.
+        columns (list[str]): The columns to return. Columns that were never
+                             fetched for a message come back empty.
+        raw (bool): Yield the cached message resources instead of email dictionaries.
+        allow_text (bool): Answer bare words from subject and sender (see compile_query()).
+
+    Yields:
+        dict: One email per matching message, newest first.
+
+    Raises:
+        UnsupportedQuery: If the query cannot be answered locally.
+    """
+    # Imported here to avoid a circular import (gmail_search_tool imports this module)
+    from src.tools.gmail_search_tool import parse_email
+
+    columns = column_config.normalize_columns(columns)
+    started = time.perf_counter()
+    message_ids = search_ids(cache, gmail_query, label_map, limit, allow_text=allow_text)
+    print_log(
+        PREFIX_TOOL,
+        f"Local index: {len(message_ids)} match(es) for '{gmail_query}' in {(time.perf_counter() - started) * 1000:.1f} ms.",
+    )
+    for start in range(0, len(message_ids), 500):
+        chunk = message_ids[start:start + 500]
+        cached = cache.get_many(chunk)
+        for msg_id in chunk:
+            if msg_id in cached:
+                yield cached[msg_id] if raw else parse_email(cached[msg_id], label_map, columns)
+
+
+def build_index(session=None, stats: dict | None = None) -> int:
+    """
+    Fetches the metadata of EVERY message in the mailbox into the cache, so the
+    local index can answer searches on its own. Run it once; later syncs keep it
+    complete. Messages that are already cached with the needed data are skipped.
+
+    Args:
+        session: The GmailSession to use (defaults to the process-wide one).
+        stats (dict): Optional statistics dictionary to update.
+
+    Returns:
+        int: The number of messages in the index.
+    """
+    from src.tools import metadata_cache
+    from src.tools.gmail_search_tool import iter_gmail
+
+    cache = metadata_cache.get_cache()
+    print_log(PREFIX_TOOL, "Building the local index of the whole mailbox (this can take a while)...")
+    count = 0
+    for _ in iter_gmail("", stats=stats, use_cache=True, session=session, columns=column_config.INDEX_COLUMNS,
+                        mode="live"):
+        count += 1
+    cache.set_meta("index_complete", time.strftime("%Y-%m-%dT%H:%M:%S"))
+    print_log(PREFIX_TOOL, f"Local index complete: {count} message(s).")
+    return count
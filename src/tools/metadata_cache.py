@@ -0,0 +1,473 @@
+# File: src/tools/metadata_cache.py
+# This tool keeps a local SQLite copy of the message metadata we already fetched.
+# Gmail messages never change, except for their labels, so a message only has to
+# be downloaded once. Label changes are brought up to date with users.history.list.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from src.tools.columns import EXTRA_FIELDS
+from src.utils import print_log, PREFIX_TOOL, PRIVATE_DIR
+
+# --- Configuration ---
+
+# The cache holds private mail data, so it lives next to token.json
+CACHE_FILE = os.path.join(PRIVATE_DIR, "metadata_cache.sqlite")
+
+# The most messages we keep; the least recently used ones are removed first
+MAX_ENTRIES = 200_000
+
+# history.list page size (500 is the API maximum)
+HISTORY_PAGE_SIZE = 500
+
+# Set to False (e.g. with "--no-cache") to always fetch from Gmail
+CACHE_ENABLED = True
+
+
+def cache_file_for(account: str | None = None) -> str:
+    """
+    Returns the cache file of an account. Every mailbox needs its own cache (the
+    message IDs and history IDs belong to one mailbox); None is the default account.
+    """
+    if account is None:
+        return os.path.join(PRIVATE_DIR, "metadata_cache.sqlite")
+    return os.path.join(PRIVATE_DIR, "caches", f"{account}.sqlite")
+
+
+def _index_values(header_list: list[dict], extra: dict) -> tuple:
+    """
+    Returns (subject, sender, date in epoch milliseconds) for the search index.
+
+    The date is Gmail's internalDate when we have it (that is what after:/before:
+    use), otherwise the Date header.
+    """
+    headers = {header["name"].lower(): header["value"] for header in header_list}
+    date_ms = None
+    if extra.get("internalDate"):
+        date_ms = int(extra["internalDate"])
+    elif headers.get("date"):
+        try:
+            date_ms = int(parsedate_to_datetime(headers["date"]).timestamp() * 1000)
+        except (TypeError, ValueError):
+            date_ms = None
+    return headers.get("subject"), headers.get("from"), date_ms
+
+
+class MetadataCache:
+    """
+    An on-disk cache of Gmail message metadata, keyed by message ID.
+
+    Each entry stores the message headers, its label IDs, the historyId it was
+    fetched at and any extra fields (snippet, threadId, ...). Because a search may
+    fetch only some headers, each entry also remembers which header names it has.
+    The mailbox historyId of the last sync is kept too.
+
+    Subject, sender and date are also kept in their own columns, with a full-text
+    (FTS5) index on subject and sender, so local_index.py can answer searches offline.
+    """
+
+    def __init__(self, path: str = CACHE_FILE, max_entries: int = MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " id TEXT PRIMARY KEY,"
+            " headers TEXT NOT NULL,"
+            " label_ids TEXT NOT NULL,"
+            " history_id TEXT,"
+            " last_access REAL NOT NULL,"
+            " header_names TEXT,"
+            " extra TEXT,"
+            " subject TEXT,"
+            " sender TEXT,"
+            " date_ms INTEGER)"
+        )
+        # Caches created by older versions lack the newer columns
+        existing = {row[1] for row in self._db.execute("PRAGMA table_info(messages)")}
+        added = []
+        for column, column_type in (("header_names", "TEXT"), ("extra", "TEXT"), ("subject", "TEXT"),
+                                    ("sender", "TEXT"), ("date_ms", "INTEGER")):
+            if column not in existing:
+                self._db.execute(f"ALTER TABLE messages ADD COLUMN {column} {column_type}")
+                added.append(column)
+        self._db.execute("CREATE INDEX IF NOT EXISTS messages_last_access ON messages (last_access)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS messages_date ON messages (date_ms)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._create_text_index()
+        if "subject" in added:
+            self._backfill_index_columns()
+        self._db.commit()
+
+    def _create_text_index(self) -> None:
+        """
+        Creates the FTS5 index on subject and sender, kept up to date by triggers.
+        """
+        # "INSERT OR REPLACE" only fires the delete trigger with recursive triggers on
+        self._db.execute("PRAGMA recursive_triggers = ON")
+        self._db.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS message_text USING fts5("
+            " subject, sender, content='messages', content_rowid='rowid',"
+            " tokenize='unicode61 remove_diacritics 2')"
+        )
+        self._db.execute(
+            "CREATE TRIGGER IF NOT EXISTS messages_text_insert AFTER INSERT ON messages BEGIN"
+            " INSERT INTO message_text(rowid, subject, sender) VALUES (new.rowid, new.subject, new.sender);"
+            " END"
+        )
+        self._db.execute(
+            "CREATE TRIGGER IF NOT EXISTS messages_text_delete AFTER DELETE ON messages BEGIN"
+            " INSERT INTO message_text(message_text, rowid, subject, sender)"
+            " VALUES ('delete', old.rowid, old.subject, old.sender);"
+            " END"
+        )
+
+    def _backfill_index_columns(self) -> None:
+        """
+        Fills subject, sender and date for entries written by an older version.
+        """
+        rows = self._db.execute("SELECT id, headers, extra FROM messages").fetchall()
+        updates = []
+        for msg_id, header_list, extra in rows:
+            values = _index_values(json.loads(header_list), json.loads(extra) if extra else {})
+            updates.append((*values, msg_id))
+        self._db.executemany("UPDATE messages SET subject = ?, sender = ?, date_ms = ? WHERE id = ?", updates)
+        self._db.execute("INSERT INTO message_text(message_text) VALUES ('rebuild')")
+
+    # --- Reading and writing messages ---
+
+    def get_many(self, message_ids: list[str], headers: list[str] | None = None, extra_fields=()) -> dict:
+        """
+        Looks up cached messages.
+
+        Args:
+            message_ids (list[str]): The IDs to look up.
+            headers (list[str]): Header names that must be cached (None: no requirement).
+            extra_fields: Extra fields that must be cached, e.g. ["snippet"].
+
+        Returns:
+            dict: Maps each cached ID to a message resource shaped like the
+                  messages().get(format="metadata") response. IDs that are missing,
+                  or cached without all the needed data, are left out.
+        """
+        needed_headers = {name.lower() for name in headers or []}
+        found = {}
+        now = time.time()
+        with self._lock:
+            # SQLite limits the number of "?" placeholders, so ask in chunks
+            for start in range(0, len(message_ids), 500):
+                chunk = message_ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    "SELECT id, headers, label_ids, history_id, header_names, extra"
+                    f" FROM messages WHERE id IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                for msg_id, header_list, label_ids, history_id, header_names, extra in rows:
+                    # NULL header_names means "all headers" (fetched without metadataHeaders)
+                    if header_names is not None and not needed_headers <= set(json.loads(header_names)):
+                        continue
+                    extra = json.loads(extra) if extra else {}
+                    if any(field not in extra for field in extra_fields):
+                        continue
+                    found[msg_id] = {
+                        "id": msg_id,
+                        "labelIds": json.loads(label_ids),
+                        "historyId": history_id,
+                        "payload": {"headers": json.loads(header_list)},
+                        **extra,
+                    }
+            if found:
+                self._db.executemany(
+                    "UPDATE messages SET last_access = ? WHERE id = ?",
+                    [(now, msg_id) for msg_id in found],
+                )
+                self._db.commit()
+        return found
+
+    def put_many(self, emails: list[dict], headers: list[str] | None = None) -> None:
+        """
+        Stores fetched messages and removes the oldest ones if the cache is full.
+
+        Data already cached for a message (other headers, extra fields) is kept,
+        so searches with different columns fill in the same entry.
+
+        Args:
+            emails (list[dict]): Message resources from messages().get(format="metadata").
+            headers (list[str]): The header names that were requested
+                                 (None means all headers were fetched).
+        """
+        if not emails:
+            return
+        now = time.time()
+        new_names = None if headers is None else sorted({name.lower() for name in headers})
+        with self._lock:
+            ids = [email["id"] for email in emails]
+            previous = {}
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for msg_id, header_list, header_names, extra in self._db.execute(
+                    f"SELECT id, headers, header_names, extra FROM messages WHERE id IN ({placeholders})", chunk
+                ):
+                    previous[msg_id] = (header_list, header_names, extra)
+
+            rows = []
+            for email in emails:
+                header_list = email.get("payload", {}).get("headers", [])
+                names = new_names
+                extra = {field: email[field] for field in EXTRA_FIELDS if field in email}
+                if email["id"] in previous:
+                    old_headers, old_names, old_extra = previous[email["id"]]
+                    merged = {header["name"].lower(): header for header in json.loads(old_headers)}
+                    merged.update((header["name"].lower(), header) for header in header_list)
+                    header_list = list(merged.values())
+                    if old_names is None or names is None:
+                        names = None
+                    else:
+                        names = sorted(set(json.loads(old_names)) | set(names))
+                    extra = {**(json.loads(old_extra) if old_extra else {}), **extra}
+                rows.append((
+                    email["id"],
+                    json.dumps(header_list, ensure_ascii=False),
+                    json.dumps(email.get("labelIds", [])),
+                    email.get("historyId"),
+                    now,
+                    None if names is None else json.dumps(names),
+                    json.dumps(extra, ensure_ascii=False) if extra else None,
+                    *_index_values(header_list, extra),
+                ))
+            self._db.executemany(
+                "INSERT OR REPLACE INTO messages (id, headers, label_ids, history_id, last_access,"
+                " header_names, extra, subject, sender, date_ms) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._db.commit()
+        self.evict()
+
+    def search_index(self, condition: str, params: list, limit: int | None = None) -> list[str]:
+        """
+        Returns the IDs of cached messages matching an SQL condition, newest first.
+
+        Args:
+            condition (str): A WHERE condition over the messages table (built by
+                             local_index.compile_query()); "message_text" is the
+                             full-text index.
+            params (list): The values for the "?" placeholders of the condition.
+            limit (int): The most IDs to return (None means all).
+        """
+        sql = f"SELECT id FROM messages WHERE {condition} ORDER BY date_ms DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = list(params) + [limit]
+        with self._lock:
+            return [row[0] for row in self._db.execute(sql, params)]
+
+    def evict(self) -> int:
+        """
+        Removes the least recently used messages beyond max_entries.
+
+        Returns:
+            int: The number of removed messages.
+        """
+        with self._lock:
+            (count,) = self._db.execute("SELECT COUNT(*) FROM messages").fetchone()
+            extra = count - self.max_entries
+            if extra <= 0:
+                return 0
+            self._db.execute(
+                "DELETE FROM messages WHERE id IN "
+                "(SELECT id FROM messages ORDER BY last_access LIMIT ?)",
+                (extra,),
+            )
+            # The local index no longer holds the whole mailbox
+            self._db.execute("DELETE FROM meta WHERE key = 'index_complete'")
+            self._db.commit()
+        print_log(PREFIX_TOOL, f"Cache full: removed {extra} least recently used message(s).")
+        return extra
+
+    def clear(self) -> None:
+        """Removes every cached message and the stored historyId."""
+        with self._lock:
+            self._db.execute("DELETE FROM messages")
+            self._db.execute("DELETE FROM meta")
+            self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    # --- Mailbox history ---
+
+    def get_history_id(self) -> str | None:
+        """Returns the mailbox historyId of the last sync, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'history_id'").fetchone()
+        return row[0] if row else None
+
+    def set_history_id(self, history_id: str) -> None:
+        """Stores the mailbox historyId the cache is up to date with."""
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('history_id', ?)", (str(history_id),))
+            self._db.commit()
+
+    def get_meta(self, key: str) -> str | None:
+        """Returns a stored setting (e.g. "index_complete"), or None."""
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str | None) -> None:
+        """Stores a setting (None removes it)."""
+        with self._lock:
+            if value is None:
+                self._db.execute("DELETE FROM meta WHERE key = ?", (key,))
+            else:
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+            self._db.commit()
+
+    def is_index_complete(self) -> bool:
+        """True if every message of the mailbox is cached (see local_index.build_index())."""
+        return self.get_meta("index_complete") is not None
+
+    def _apply_label_change(self, message: dict, added: list[str], removed: list[str]) -> None:
+        """Updates the label IDs of one cached message (no-op if it is not cached)."""
+        with self._lock:
+            row = self._db.execute("SELECT label_ids FROM messages WHERE id = ?", (message["id"],)).fetchone()
+            if row is None:
+                return
+            if "labelIds" in message:
+                # History records carry the full, current label list when available
+                labels = list(message["labelIds"])
+            else:
+                labels = [label for label in json.loads(row[0]) if label not in removed]
+                labels += [label for label in added if label not in labels]
+            self._db.execute("UPDATE messages SET label_ids = ? WHERE id = ?", (json.dumps(labels), message["id"]))
+
+    def sync(self, service, limiter=None, stats: dict | None = None) -> None:
+        """
+        Brings cached labels up to date with users.history.list.
+
+        On the very first run there is nothing to sync, so the current mailbox
+        historyId is stored as the starting point for the next run. The same
+        happens after a reset, when Gmail no longer has the stored history (404).
+        Once the local index holds the whole mailbox, newly arrived messages are
+        fetched too, so the index stays complete.
+
+        Args:
+            service: A Gmail API service object.
+            limiter: Optional TokenBucket for the quota.
+            stats (dict): Optional statistics dictionary to update.
+        """
+        # Imported here so "--no-cache" can be set without loading the Google libraries
+        from googleapiclient.errors import HttpError
+        from src.tools.rate_limiter import execute_with_backoff
+
+        history_types = ["labelAdded", "labelRemoved", "messageDeleted"]
+        keep_complete = self.is_index_complete()
+        if keep_complete:
+            history_types.append("messageAdded")
+        added_ids = []
+
+        start_history_id = self.get_history_id()
+        if start_history_id is None:
+            self._start_history(service, limiter, stats)
+            return
+
+        page_token = None
+        changes = 0
+        latest_history_id = start_history_id
+        try:
+            while True:
+                request = service.users().history().list(
+                    userId="me",
+                    startHistoryId=start_history_id,
+                    historyTypes=history_types,
+                    maxResults=HISTORY_PAGE_SIZE,
+                    pageToken=page_token,
+                )
+                response = execute_with_backoff(request, "history.list", limiter=limiter, stats=stats)
+                for record in response.get("history", []):
+                    for change in record.get("labelsAdded", []):
+                        self._apply_label_change(change["message"], change.get("labelIds", []), [])
+                        changes += 1
+                    for change in record.get("labelsRemoved", []):
+                        self._apply_label_change(change["message"], [], change.get("labelIds", []))
+                        changes += 1
+                    for change in record.get("messagesDeleted", []):
+                        with self._lock:
+                            self._db.execute("DELETE FROM messages WHERE id = ?", (change["message"]["id"],))
+                        changes += 1
+                    for change in record.get("messagesAdded", []):
+                        added_ids.append(change["message"]["id"])
+                latest_history_id = response.get("historyId", latest_history_id)
+                page_token = response.get("nextPageToken")
+                if not page_token:
+                    break
+        except HttpError as error:
+            if int(error.resp.status) != 404:
+                raise
+            # Gmail only keeps about a week of history; after that we start fresh
+            print_log(PREFIX_TOOL, "Cache history is too old to sync. Clearing the cache.")
+            self.clear()
+            # Start recording again from now, or the next run would miss the changes in between
+            self._start_history(service, limiter, stats)
+            return
+
+        with self._lock:
+            self._db.commit()
+        if added_ids:
+            self._fetch_added(service, added_ids, limiter, stats)
+        self.set_history_id(latest_history_id)
+        if changes or added_ids:
+            print_log(PREFIX_TOOL, f"Cache synced: applied {changes} label/delete change(s), {len(added_ids)} new message(s).")
+
+    def _start_history(self, service, limiter, stats: dict | None) -> None:
+        """
+        Stores the current mailbox historyId as the starting point of the next sync.
+        """
+        from src.tools.rate_limiter import execute_with_backoff
+
+        profile = execute_with_backoff(
+            service.users().getProfile(userId="me"), "getProfile", limiter=limiter, stats=stats
+        )
+        self.set_history_id(profile["historyId"])
+
+    def _fetch_added(self, service, message_ids: list[str], limiter, stats: dict | None) -> None:
+        """
+        Fetches messages that arrived since the last sync, with the columns the index needs.
+        """
+        from src.tools.batch_fetch_tool import fetch_messages_batched
+        from src.tools.columns import INDEX_COLUMNS, get_kwargs_for, headers_for
+
+        message_ids = list(dict.fromkeys(message_ids))
+        fetched = fetch_messages_batched(
+            service, message_ids, stats=stats, limiter=limiter, **get_kwargs_for(INDEX_COLUMNS)
+        )
+        self.put_many([email for email in fetched if email is not None], headers=headers_for(INDEX_COLUMNS))
+
+
+# One cache object per process, opened on first use
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> MetadataCache:
+    """
+    Returns the process-wide metadata cache, opening it on first use.
+
+    Returns:
+        MetadataCache: The shared cache.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MetadataCache(CACHE_FILE)
+    return _cache
@@ -0,0 +1,334 @@
+# File: src/tools/parquet_export_tool.py
+# This tool saves search results as a Parquet file for data analysis.
+# Unlike the CSV, the columns keep their real types: "Date" and "internalDate" are
+# UTC timestamps, "sizeEstimate" is an integer and "Labels" is a list of strings,
+# so nothing has to be parsed again later. (Conversation rows get the same
+# treatment: "FirstDate"/"LastDate" are timestamps, "MessageCount" an integer.)
+# Needs the optional "pyarrow" package (pip install pyarrow).
+
+import itertools
+import os
+import time
+from email.utils import parsedate_to_datetime
+from src import metrics
+from src.tools.cancellation import current_cancel_event, raise_if_cancelled
+from src.tools.columns import DEFAULT_COLUMNS
+from src.tools.csv_export_tool import select_export_columns
+from src.tools.email_table import EmailTable, MISSING
+from src.tools.result_store import get_result_store
+from src.utils import print_log, get_timestamped_filename, PREFIX_TOOL
+
+OUTPUT_DIR = "results"
+
+# How many rows are collected before they are written as one Parquet row group
+ROW_GROUP_SIZE = 50_000
+
+# RFC 2822 date formats we try, from most to least common (after clean-up)
+DATE_FORMATS = ["%d %b %Y %H:%M:%S %z", "%d %b %Y %H:%M %z"]
+
+# Arrow's %Y also accepts 2-digit years ("3 Jan 24" becomes the year 24), so
+# earlier years are left to Python's email parser (which reads 2024)
+MIN_FAST_PATH_YEAR = 1970
+
+
+def _import_pyarrow():
+    """
+    Imports pyarrow, with a helpful message if it is not installed.
+    """
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.parquet
+    except ImportError as error:
+        raise ImportError("Parquet export needs the 'pyarrow' package: pip install pyarrow") from error
+    return pyarrow
+
+
+def parse_dates_utc(date_headers):
+    """
+    Parses RFC 2822 "Date" header strings into UTC timestamps, all at once.
+
+    The strings are cleaned with vectorised regex replaces (drop "(IDT)"-style
+    comments and the weekday, turn "GMT" into "+0000") and parsed with Arrow's
+    strptime. Only the few strings that still fail (or come out before
+    MIN_FAST_PATH_YEAR) go through Python's email parser.
+
+    Args:
+        date_headers: A list (or Arrow array) of Date header strings.
+
+    Returns:
+        pyarrow.TimestampArray: Millisecond UTC timestamps (null where the date is unreadable).
+    """
+    pa = _import_pyarrow()
+    pc = pa.compute
+
+    raw = pa.array(date_headers, type=pa.string())
+    cleaned = pc.replace_substring_regex(raw, r"\s*\([^)]*\)\s*$", "")
+    cleaned = pc.replace_substring_regex(cleaned, r"^\s*[A-Za-z]{3},\s*", "")
+    cleaned = pc.replace_substring_regex(cleaned, r"\s(GMT|UT|UTC|Z)$", " +0000")
+
+    timestamps = pc.strptime(cleaned, format=DATE_FORMATS[0], unit="ms", error_is_null=True)
+    for date_format in DATE_FORMATS[1:]:
+        if timestamps.null_count == raw.null_count:
+            break
+        retry = pc.strptime(cleaned, format=date_format, unit="ms", error_is_null=True)
+        timestamps = pc.coalesce(timestamps, retry)
+    too_early = pc.less(pc.year(timestamps), MIN_FAST_PATH_YEAR)
+    timestamps = pc.if_else(too_early, pa.scalar(None, timestamps.type), timestamps)
+
+    # Slow path, only for the (rare) dates Arrow could not read
+    missing = pc.and_(pc.is_null(timestamps), pc.is_valid(raw))
+    if pc.any(missing).as_py():
+        values = timestamps.to_pylist()
+        for index in pc.indices_nonzero(missing).to_pylist():
+            try:
+                values[index] = parsedate_to_datetime(raw[index].as_py())
+            except (TypeError, ValueError):
+                values[index] = None
+        timestamps = pa.array(values, type=pa.timestamp("ms", tz="UTC"))
+
+    return timestamps.cast(pa.timestamp("ms", tz="UTC"))
+
+
+def _column_type(pa, column: str):
+    """
+    Returns the Arrow type of a column (text unless listed here).
+    """
+    if column in ("Date", "FirstDate", "LastDate", "internalDate"):
+        return pa.timestamp("ms", tz="UTC")
+    if column == "Labels":
+        return pa.list_(pa.string())
+    if column in ("sizeEstimate", "MessageCount"):
+        return pa.int64()
+    return pa.string()
+
+
+def _column_array(pa, column: str, values: list):
+    """
+    Converts the collected values of one column into an Arrow array.
+    """
+    if column in ("Date", "FirstDate", "LastDate"):
+        return parse_dates_utc([value or None for value in values])
+    if column == "internalDate":
+        # Gmail sends milliseconds since the epoch as a string
+        millis = pa.array([int(value) if value else None for value in values], type=pa.int64())
+        return millis.cast(pa.timestamp("ms", tz="UTC"))
+    if column == "Labels":
+        return pa.array([[str(label) for label in value or []] for value in values], type=pa.list_(pa.string()))
+    if column in ("sizeEstimate", "MessageCount"):
+        return pa.array([int(value) if value not in (None, "") else None for value in values], type=pa.int64())
+    return pa.array([str(value) if value is not None else None for value in values], type=pa.string())
+
+
+def _wrap(pa, values, arrow_type, start: int, stop: int):
+    """
+    Wraps values[start:stop] of a Python array.array as an Arrow array without copying it.
+    """
+    return pa.Array.from_buffers(arrow_type, stop - start, [None, pa.py_buffer(memoryview(values)[start:stop])])
+
+
+def _int64_column(pa, values, start: int, stop: int):
+    # An array("q") column of an EmailTable, with MISSING turned into nulls
+    column = _wrap(pa, values, pa.int64(), start, stop)
+    if MISSING in memoryview(values)[start:stop]:
+        column = pa.compute.if_else(pa.compute.equal(column, MISSING), pa.scalar(None, pa.int64()), column)
+    return column
+
+
+def _table_group(pa, table: EmailTable, columns: list[str], schema, start: int, stop: int):
+    """
+    Builds the Arrow table of rows [start, stop) of an EmailTable from its columns.
+    """
+    arrays = []
+    for column in columns:
+        if column == "Date" and table.date_text is not None:
+            # The sender's Date headers, parsed to UTC like those of a list of emails
+            arrays.append(parse_dates_utc([text or None for text in table.date_text[start:stop]]))
+        elif column in ("Date", "internalDate"):
+            dates = table.dates if column == "Date" else table.internal_dates
+            arrays.append(_int64_column(pa, dates, start, stop).cast(pa.timestamp("ms", tz="UTC")))
+        elif column == "sizeEstimate":
+            arrays.append(_int64_column(pa, table.sizes, start, stop))
+        elif column == "Labels":
+            # The label codes are turned into names with one vectorised lookup in the label table
+            first, last = table.label_offsets[start], table.label_offsets[stop]
+            offsets = pa.compute.subtract(_wrap(pa, table.label_offsets, pa.uint32(), start, stop + 1), first)
+            codes = _wrap(pa, table.label_codes, pa.uint16(), first, last)
+            names = pa.compute.take(pa.array(table.label_names, type=pa.string()), codes)
+            arrays.append(pa.ListArray.from_arrays(offsets.cast(pa.int32()), names))
+        else:
+            arrays.append(pa.array(table.text[column][start:stop], type=pa.string()))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def stream_to_parquet(
+    records,
+    file_path: str | None = None,
+    row_group_size: int = ROW_GROUP_SIZE,
+    columns: list[str] | None = None,
+) -> tuple[str, int]:
+    """
+    Writes records to a Parquet file, one row group at a time.
+
+    Only one row group of records is held in memory, so this works with the
+    iter_gmail() generator for any number of emails. The file is written under
+    a temporary name and renamed when complete.
+
+    Args:
+        records: Any iterable of email dictionaries, or an EmailTable (its
+                 columns are converted without building a dictionary per email).
+        file_path (str): Where to save the file (defaults to a timestamped name in OUTPUT_DIR).
+        row_group_size (int): Rows per row group.
+        columns (list[str]): The columns to write, in order (defaults to the keys
+                             of the first record).
+
+    Returns:
+        tuple: (path of the saved file, number of rows written)
+    """
+    pa = _import_pyarrow()
+
+    if isinstance(records, EmailTable):
+        columns = columns or list(records.columns)
+    else:
+        # Without explicit columns, the first record tells us which columns the search returned
+        records = iter(records)
+        first = next(records, None)
+        if first is not None:
+            records = itertools.chain([first], records)
+        if columns is None:
+            columns = list(first) if first is not None else list(DEFAULT_COLUMNS)
+    schema = pa.schema([(column, _column_type(pa, column)) for column in columns])
+
+    if file_path is None:
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        file_path = os.path.join(OUTPUT_DIR, get_timestamped_filename("gmail_export", "parquet"))
+    temp_path = file_path + ".part"
+
+    def write_group(writer, buffers):
+        table = pa.table(
+            {column: _column_array(pa, column, buffers[column]) for column in columns},
+            schema=schema,
+        )
+        writer.write_table(table)
+
+    # An async tool call that is cancelled stops at the next row group
+    cancel_event = current_cancel_event()
+    rows_written = 0
+    started = time.perf_counter()
+    try:
+        # Repeated label names and subjects compress very well with dictionary encoding
+        with pa.parquet.ParquetWriter(temp_path, schema, compression="zstd", use_dictionary=True) as writer:
+            if isinstance(records, EmailTable):
+                # Whole row groups come straight from the table's columns
+                records.finish()
+                for start in range(0, len(records), row_group_size):
+                    raise_if_cancelled(cancel_event)
+                    stop = min(start + row_group_size, len(records))
+                    writer.write_table(_table_group(pa, records, columns, schema, start, stop))
+                    rows_written = stop
+                if rows_written == 0:
+                    writer.write_table(schema.empty_table())
+            else:
+                buffers = {column: [] for column in columns}
+                pending = 0
+                for record in records:
+                    for column in columns:
+                        buffers[column].append(record.get(column))
+                    pending += 1
+                    if pending >= row_group_size:
+                        raise_if_cancelled(cancel_event)
+                        write_group(writer, buffers)
+                        rows_written += pending
+                        buffers = {column: [] for column in columns}
+                        pending = 0
+                if pending or rows_written == 0:
+                    write_group(writer, buffers)
+                    rows_written += pending
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    metrics.record_duration("export", time.perf_counter() - started, format="parquet")
+    metrics.increment("rows_written", rows_written, format="parquet")
+    metrics.increment("bytes_written", os.path.getsize(file_path), format="parquet")
+    return file_path, rows_written
+
+
+def merge_parquet_files(part_paths: list[str], file_path: str, row_group_size: int = ROW_GROUP_SIZE) -> int:
+    """
+    Joins Parquet files with the same schema into one file (atomically, like
+    stream_to_parquet). Small parts are combined into row groups of row_group_size.
+
+    Args:
+        part_paths (list[str]): The files to join, in order (at least one).
+        file_path (str): Where to save the joined file.
+        row_group_size (int): Rows per row group.
+
+    Returns:
+        int: The number of rows written.
+    """
+    pa = _import_pyarrow()
+    schema = pa.parquet.read_schema(part_paths[0])
+    temp_path = file_path + ".part"
+    rows_written = 0
+    try:
+        with pa.parquet.ParquetWriter(temp_path, schema, compression="zstd", use_dictionary=True) as writer:
+            pending = []
+            pending_rows = 0
+            for part_path in part_paths:
+                table = pa.parquet.read_table(part_path, schema=schema)
+                pending.append(table)
+                pending_rows += table.num_rows
+                if pending_rows >= row_group_size:
+                    writer.write_table(pa.concat_tables(pending), row_group_size=row_group_size)
+                    rows_written += pending_rows
+                    pending, pending_rows = [], 0
+            if pending_rows or rows_written == 0:
+                writer.write_table(pa.concat_tables(pending) if pending else schema.empty_table())
+                rows_written += pending_rows
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return rows_written
+
+
+def export_to_parquet(result_handle: str, columns: str = "") -> str:
+    """
+    Exports the emails of a search result to a timestamped Parquet file
+    (for data analysis tools such as pandas, DuckDB or Spark).
+
+    Args:
+        result_handle: The result_handle returned by the search_gmail tool
+                      (e.g., "res_1a2b3c4d").
+        columns: Optional comma-separated columns to write (default: the
+                 columns the search fetched).
+
+    Returns:
+        The path to the saved Parquet file.
+    """
+    email_data = get_result_store().get(result_handle)
+    if email_data is None:
+        print_log(PREFIX_TOOL, f"Unknown result handle: '{result_handle}'")
+        return f"Unknown result handle '{result_handle}'. Run search_gmail first."
+    export_columns = select_export_columns(result_handle, columns)
+    if isinstance(export_columns, str):
+        print_log(PREFIX_TOOL, export_columns)
+        return export_columns
+
+    if not email_data:
+        print_log(PREFIX_TOOL, "No email data provided to export.")
+        return "No data to export."
+
+    print_log(PREFIX_TOOL, f"Preparing to export {len(email_data)} emails to Parquet...")
+    try:
+        file_path, rows_written = stream_to_parquet(email_data, columns=export_columns)
+    except ImportError as error:
+        print_log(PREFIX_TOOL, str(error))
+        return str(error)
+
+    print_log(PREFIX_TOOL, f"SUCCESS! {rows_written} rows exported to: {file_path}")
+    return file_path
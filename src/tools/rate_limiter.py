@@ -0,0 +1,180 @@
+# File: src/tools/rate_limiter.py
+# This file keeps us inside Gmail's per-user quota.
+# It has a "token bucket" that hands out quota units, and a helper that
+# retries a request with a growing, randomised pause when Google says "slow down".
+
+import random
+import threading
+import time
+from googleapiclient.errors import HttpError
+from src import metrics
+from src.utils import print_log, PREFIX_TOOL
+
+# --- Configuration ---
+
+# Gmail allows 250 quota units per user per second
+QUOTA_UNITS_PER_SECOND = 250
+
+# How much each API method costs in quota units (from the Gmail API docs)
+QUOTA_UNITS = {
+    "messages.list": 5,
+    "messages.get": 5,
+    "labels.list": 1,
+    "history.list": 2,
+    "getProfile": 1,
+    "threads.list": 10,
+    "threads.get": 10,
+}
+
+# HTTP status codes that mean "try again later"
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Retry settings for a single request
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0   # seconds before the first retry
+BACKOFF_CAP = 32.0   # never wait longer than this
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Checks if an API error is temporary (rate limit or server error).
+
+    Args:
+        error (Exception): The exception returned for a request.
+
+    Returns:
+        bool: True if the request should be tried again.
+    """
+    if not isinstance(error, HttpError):
+        return False
+    status = int(error.resp.status)
+    if status in RETRYABLE_STATUS:
+        return True
+    # Gmail reports some rate limits as "403 rateLimitExceeded"
+    content = error.content or b""
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", errors="replace")
+    return status == 403 and "ratelimitexceeded" in content.lower()
+
+
+def backoff_delay(attempt: int, base: float | None = None, cap: float | None = None) -> float:
+    """
+    Calculates a "full jitter" exponential backoff delay.
+
+    Args:
+        attempt (int): How many retries were already made (0 for the first retry).
+        base (float): The delay ceiling for the first retry (defaults to BACKOFF_BASE).
+        cap (float): The largest delay ceiling (defaults to BACKOFF_CAP).
+
+    Returns:
+        float: A random delay between 0 and min(cap, base * 2^attempt).
+    """
+    base = BACKOFF_BASE if base is None else base
+    cap = BACKOFF_CAP if cap is None else cap
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket measured in Gmail quota units.
+
+    The bucket refills at `rate` units per second up to `capacity` units.
+    acquire() blocks until enough units are available. A request that costs
+    more than the whole bucket (e.g. a batch of 100 messages.get) waits for a
+    full bucket and leaves the rest as debt, so later requests wait for it too.
+    """
+
+    def __init__(self, rate: float = QUOTA_UNITS_PER_SECOND, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited_seconds = 0.0
+
+    def acquire(self, units: float = 1) -> None:
+        """
+        Takes `units` tokens from the bucket, waiting if needed.
+
+        Args:
+            units (float): The quota units the next request will cost.
+        """
+        # A request bigger than the bucket could never fit, so it only waits
+        # for a full bucket; the tokens then go below zero (debt) and the
+        # requests after it wait until the debt is refilled
+        needed = min(units, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+                if self._tokens >= needed:
+                    self._tokens -= units
+                    return
+                wait = (needed - self._tokens) / self.rate
+                self.waited_seconds += wait
+            time.sleep(wait)
+
+
+# One bucket for the whole process, because the quota is per user, not per thread
+_shared_limiter = TokenBucket()
+
+
+def get_shared_limiter() -> TokenBucket:
+    """
+    Returns the process-wide quota limiter.
+
+    Returns:
+        TokenBucket: The shared token bucket.
+    """
+    return _shared_limiter
+
+
+def set_shared_limiter(limiter: TokenBucket) -> None:
+    """
+    Replaces the process-wide quota limiter (e.g. a faster one for benchmarks).
+
+    Args:
+        limiter (TokenBucket): The new shared token bucket.
+    """
+    global _shared_limiter
+    _shared_limiter = limiter
+
+
+def execute_with_backoff(request, method: str, limiter: TokenBucket | None = None, stats: dict | None = None):
+    """
+    Executes one API request, waiting for quota and retrying temporary errors.
+
+    Args:
+        request: A googleapiclient HttpRequest (not yet executed).
+        method (str): The API method name, used to look up its quota cost (e.g. "messages.get").
+        limiter (TokenBucket): The quota limiter (defaults to the shared one).
+        stats (dict): Optional statistics dictionary; "api_calls" and "retries" are updated.
+
+    Returns:
+        dict: The API response.
+
+    Raises:
+        HttpError: If the error is permanent or retries are exhausted.
+    """
+    limiter = limiter or get_shared_limiter()
+    attempt = 0
+    units = QUOTA_UNITS.get(method, 5)
+    while True:
+        limiter.acquire(units)
+        metrics.increment("api_calls", method=method)
+        metrics.increment("quota_units", units)
+        if stats is not None:
+            stats["api_calls"] += 1
+        try:
+            return request.execute()
+        except HttpError as error:
+            if not is_retryable_error(error) or attempt >= MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+            print_log(PREFIX_TOOL, f"{method} got HTTP {error.resp.status}. Retrying in {delay:.1f}s...")
+            metrics.increment("retries", method=method)
+            if stats is not None:
+                stats["retries"] += 1
+            time.sleep(delay)
+            attempt += 1
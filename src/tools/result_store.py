@@ -0,0 +1,148 @@
+# File: src/tools/result_store.py
+# This file keeps search results in memory, inside our own process.
+# The LLM only ever sees a short "handle" (like "res_1a2b3c4d") and a few summary
+# numbers. The export tool uses the handle to find the full list of emails, so
+# the email data never has to travel through the model. Search results are kept
+# as compact EmailTables (see email_table.py), conversation rows as plain lists.
+
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from src.tools.email_table import EmailTable
+
+# --- Configuration ---
+
+# How many result sets we remember (the oldest one is dropped first)
+MAX_STORED_RESULTS = 20
+
+# How many of the most common labels go into the summary
+TOP_LABELS = 5
+
+
+def _summarize_table(table: EmailTable) -> dict:
+    # Same summary as below, straight from the table's integer columns
+    date_range = None
+    millis = table.date_range()
+    if millis is not None:
+        oldest, newest = (datetime.fromtimestamp(value / 1000, tz=timezone.utc) for value in millis)
+        date_range = {"oldest": oldest.isoformat(), "newest": newest.isoformat()}
+    return {
+        "count": len(table),
+        "date_range": date_range,
+        "top_labels": [{"label": name, "count": count} for name, count in table.label_counts().most_common(TOP_LABELS)],
+    }
+
+
+def summarize(records: list[dict] | EmailTable) -> dict:
+    """
+    Builds the small summary that is sent to the LLM instead of the emails.
+
+    Args:
+        records: The emails from a search (a list of dictionaries or an EmailTable).
+
+    Returns:
+        dict: count, date_range (oldest/newest, ISO 8601) and top_labels.
+    """
+    if isinstance(records, EmailTable):
+        return _summarize_table(records)
+
+    dates = []
+    label_counts = Counter()
+    for record in records:
+        label_counts.update(record.get("Labels", []))
+        # Conversation rows (thread mode) have a first and a last date instead of "Date"
+        for key in ("Date", "FirstDate", "LastDate"):
+            if key not in record:
+                continue
+            try:
+                dates.append(parsedate_to_datetime(record[key]))
+            except (TypeError, ValueError):
+                continue
+
+    date_range = None
+    if dates:
+        # Mixed naive/aware dates cannot be compared, so compare their timestamps
+        dates.sort(key=lambda date: date.timestamp())
+        date_range = {"oldest": dates[0].isoformat(), "newest": dates[-1].isoformat()}
+
+    return {
+        "count": len(records),
+        "date_range": date_range,
+        "top_labels": [{"label": name, "count": count} for name, count in label_counts.most_common(TOP_LABELS)],
+    }
+
+
+class ResultStore:
+    """
+    A small, thread-safe, in-process store of search results keyed by handle.
+    """
+
+    def __init__(self, max_results: int = MAX_STORED_RESULTS):
+        self.max_results = max_results
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, records: list[dict] | EmailTable, query: str = "", columns: list[str] | None = None) -> str:
+        """
+        Stores a result set and returns its handle.
+
+        Args:
+            records: The emails to keep (a list of dictionaries or an EmailTable).
+            query (str): The Gmail query that produced them.
+            columns (list[str]): The columns the records have, in order.
+
+        Returns:
+            str: A handle such as "res_1a2b3c4d".
+        """
+        handle = f"res_{uuid.uuid4().hex[:8]}"
+        with self._lock:
+            self._results[handle] = {"query": query, "records": records, "columns": columns}
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+        return handle
+
+    def get(self, handle: str) -> list[dict] | EmailTable | None:
+        """
+        Returns the emails stored under a handle, or None if the handle is unknown.
+
+        Args:
+            handle (str): A handle returned by put().
+        """
+        with self._lock:
+            entry = self._results.get(handle)
+            if entry is None:
+                return None
+            self._results.move_to_end(handle)
+            return entry["records"]
+
+    def get_columns(self, handle: str) -> list[str] | None:
+        """
+        Returns the columns of the result set stored under a handle (None if unknown).
+
+        Args:
+            handle (str): A handle returned by put().
+        """
+        with self._lock:
+            entry = self._results.get(handle)
+            return entry["columns"] if entry is not None else None
+
+    def drop(self, handle: str) -> None:
+        """Forgets a result set."""
+        with self._lock:
+            self._results.pop(handle, None)
+
+
+# One store for the whole process
+_store = ResultStore()
+
+
+def get_result_store() -> ResultStore:
+    """
+    Returns the process-wide result store.
+
+    Returns:
+        ResultStore: The shared store.
+    """
+    return _store
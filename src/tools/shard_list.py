@@ -0,0 +1,200 @@
+# File: src/tools/shard_list.py
+# Lists the message IDs of a big search in parallel, by splitting it into time windows.
+# messages().list pages are strictly one after the other (each page token comes from
+# the previous page), so 100,000 matches means 200 calls in a row. Adding
+# "after:/before:" bounds turns one query into several independent ones that can be
+# listed at the same time. Busy windows are split again until each fits in one page
+# (or becomes very short), and the results are merged back newest window first.
+
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from src import metrics
+from src.tools.rate_limiter import execute_with_backoff, get_shared_limiter
+from src.utils import print_log, PREFIX_TOOL
+
+# --- Configuration ---
+
+# How many windows are listed at the same time (they share one Gmail quota)
+DEFAULT_WORKERS = 4
+
+# IDs per messages().list page (500 is the API maximum)
+PAGE_SIZE = 500
+
+# A busy window is split into at most this many smaller windows at once
+MAX_SPLIT = 16
+
+# Windows shorter than this are paged normally instead of being split again
+MIN_WINDOW_SECONDS = 3600
+
+# Windows estimated at this many pages or fewer are paged normally: a few pages in a
+# row are quicker than another round of splitting
+MAX_PAGES_WITHOUT_SPLIT = 4
+
+# Lower bound (epoch seconds) used when the oldest window is split
+EARLIEST_SECONDS = 0
+
+# The list calls also ask for Gmail's match estimate, to choose how finely to split
+SHARD_FIELDS_MASK = "messages/id,nextPageToken,resultSizeEstimate"
+
+
+def window_query(gmail_query: str, start: int | None, end: int | None) -> str:
+    """
+    Adds the time window [start, end) to a Gmail query.
+
+    "after:" starts one second early: Gmail compares whole seconds, so the windows
+    overlap by one second instead of risking a gap. The duplicates this can give are
+    removed by iter_ids_sharded().
+
+    Args:
+        gmail_query (str): The user's Gmail query.
+        start (int): Window start in epoch seconds (None: no lower bound).
+        end (int): Window end in epoch seconds (None: no upper bound).
+    """
+    parts = []
+    if gmail_query:
+        # Brackets keep an "a OR b" query from swallowing the date bounds
+        grouped = " OR " in gmail_query or "{" in gmail_query
+        parts.append(f"({gmail_query})" if grouped else gmail_query)
+    if start is not None:
+        parts.append(f"after:{start - 1}")
+    if end is not None:
+        parts.append(f"before:{end}")
+    return " ".join(parts)
+
+
+def split_window(start: int | None, end: int | None, parts: int) -> list[tuple]:
+    """
+    Splits a time window into equal, smaller windows (newest first).
+
+    Open ends stay open, so messages outside the split range are never lost.
+
+    Returns:
+        list[tuple]: (start, end) pairs in epoch seconds.
+    """
+    low = EARLIEST_SECONDS if start is None else start
+    high = int(time.time()) + 86_400 if end is None else end
+    step = max(MIN_WINDOW_SECONDS, math.ceil((high - low) / max(2, parts)))
+    bounds = list(range(low, high, step)) + [high]
+    windows = [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+    windows[0] = (start, windows[0][1])
+    windows[-1] = (windows[-1][0], end)
+    return list(reversed(windows))
+
+
+def _window_seconds(start: int | None, end: int | None) -> float:
+    if start is None or end is None:
+        return math.inf
+    return end - start
+
+
+def list_window(gmail_query: str, window: tuple, service, limiter=None) -> tuple:
+    """
+    Lists one time window, or says how to split it if it is too busy.
+
+    Returns:
+        tuple: (smaller windows or None, message IDs or None, call statistics)
+    """
+    call_stats = {"api_calls": 0, "retries": 0}
+    messages = service.users().messages()
+    query = window_query(gmail_query, *window)
+    request = messages.list(userId="me", q=query, maxResults=PAGE_SIZE, fields=SHARD_FIELDS_MASK)
+    result = execute_with_backoff(request, "messages.list", limiter=limiter, stats=call_stats)
+    page_token = result.get("nextPageToken")
+    estimate = int(result.get("resultSizeEstimate") or 0)
+
+    busy = estimate > PAGE_SIZE * MAX_PAGES_WITHOUT_SPLIT and _window_seconds(*window) > MIN_WINDOW_SECONDS
+    if page_token and busy:
+        # Many pages: split so every part fits in about one page
+        parts = min(MAX_SPLIT, max(2, math.ceil(estimate / PAGE_SIZE)))
+        return split_window(*window, parts), None, call_stats
+
+    message_ids = [msg["id"] for msg in result.get("messages", [])]
+    while page_token:
+        request = messages.list(
+            userId="me", q=query, maxResults=PAGE_SIZE, pageToken=page_token, fields=SHARD_FIELDS_MASK
+        )
+        result = execute_with_backoff(request, "messages.list", limiter=limiter, stats=call_stats)
+        message_ids.extend(msg["id"] for msg in result.get("messages", []))
+        page_token = result.get("nextPageToken")
+    return None, message_ids, call_stats
+
+
+class _Window:
+    # One slot of the ordered window list; "ids" is set once the window is listed
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.ids = None
+
+
+def iter_ids_sharded(
+    gmail_query: str,
+    service_factory,
+    limiter=None,
+    stats: dict | None = None,
+    workers: int = DEFAULT_WORKERS,
+):
+    """
+    Lists ALL message IDs matching a query, several time windows at a time.
+
+    The IDs come out newest window first, in Gmail's order inside each window, and
+    every ID only once, so the result is the same however the threads are scheduled.
+    A window is handed out as soon as it and all newer windows are listed, so the
+    caller can start fetching before the listing is complete.
+
+    Args:
+        gmail_query (str): A Gmail search query.
+        service_factory: A function returning the Gmail service of the calling thread
+                         (e.g. GmailSession.service).
+        limiter: The TokenBucket for the quota (defaults to the process one).
+        stats (dict): Optional statistics dictionary to update.
+        workers (int): How many windows are listed at the same time.
+
+    Yields:
+        list[str]: The new message IDs of one window.
+    """
+    limiter = limiter or get_shared_limiter()
+    started = time.monotonic()
+    windows = [_Window((None, None))]
+    seen = set()
+    splits = 0
+
+    def run(window):
+        return list_window(gmail_query, window.bounds, service_factory(), limiter)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="gmail-shard")
+    try:
+        pending = {pool.submit(run, windows[0]): windows[0]}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                window = pending.pop(future)
+                smaller, message_ids, call_stats = future.result()
+                if stats is not None:
+                    stats["api_calls"] += call_stats["api_calls"]
+                    stats["retries"] += call_stats["retries"]
+                if smaller is None:
+                    window.ids = message_ids
+                    continue
+                # Replace the busy window by its parts, in the same place of the order
+                splits += 1
+                parts = [_Window(bounds) for bounds in smaller]
+                position = windows.index(window)
+                windows[position:position + 1] = parts
+                for part in parts:
+                    pending[pool.submit(run, part)] = part
+
+            # Hand out the finished windows at the front, in order
+            while windows and windows[0].ids is not None:
+                fresh = [msg_id for msg_id in windows.pop(0).ids if msg_id not in seen]
+                seen.update(fresh)
+                if fresh:
+                    yield fresh
+    finally:
+        # Stops unstarted windows if the caller stops early (e.g. after a limit)
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    elapsed = time.monotonic() - started
+    metrics.record_duration("list", elapsed, mode="sharded")
+    metrics.increment("list_window_splits", splits)
+    print_log(PREFIX_TOOL, f"Listed {len(seen)} message ID(s) in {elapsed:.2f}s with {splits} window split(s).")
@@ -2,6 +2,9 @@
 # This file holds helper functions that other files can use.
 # Keeping them here makes our code clean and avoids repeating ourselves.
 
+import sys
+import threading
+import time
 from datetime import datetime
 
 # Define our special log prefixes, as seen in the PRD
@@ -10,22 +13,71 @@ PREFIX_LLM = "[LLM]"
 PREFIX_TOOL = "[TOOL]"
 PREFIX_AGENT = "[AGENT]"
 
-def print_log(prefix: str, message: str) -> None:
+# The folder for private files (credentials, tokens and local caches)
+PRIVATE_DIR = "Private"
+
+# Log levels: messages below LOG_LEVEL are skipped
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LOG_LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "ERROR": ERROR}
+LOG_LEVEL = INFO
+
+# The timestamp text only changes once per second, so we reuse it
+_last_second = None
+_last_timestamp = ""
+
+# File names handed out during the current second, so that two exports finishing
+# in the same second (e.g. two ADK sessions) never write to the same file
+_filename_second = None
+_issued_filenames = set()
+_filename_lock = threading.Lock()
+
+def set_log_level(level: str) -> None:
+    """
+    Sets the lowest level that print_log() will print.
+
+    Args:
+        level (str): "DEBUG", "INFO", "WARNING" or "ERROR".
+    """
+    global LOG_LEVEL
+    LOG_LEVEL = LOG_LEVELS[level.upper()]
+
+def log_enabled(level: int) -> bool:
+    """
+    Checks if messages of this level are printed.
+    Hot loops use this to skip building the message text at all.
+
+    Args:
+        level (int): DEBUG, INFO, WARNING or ERROR.
+    """
+    return level >= LOG_LEVEL
+
+def print_log(prefix: str, message: str, level: int = INFO) -> None:
     """
     Prints a formatted log message to the console.
     
     Args:
         prefix (str): The prefix (e.g., "[TOOL]")
         message (str): The message to print.
+        level (int): The message level (DEBUG messages are hidden by default).
     """
+    global _last_second, _last_timestamp
+    if level < LOG_LEVEL:
+        return
     # Get the current time for our timestamp
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"{timestamp} {prefix} {message}")
+    now = int(time.time())
+    if now != _last_second:
+        _last_second = now
+        _last_timestamp = datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+    sys.stdout.write(f"{_last_timestamp} {prefix} {message}\n")
 
 def get_timestamped_filename(base_name: str, extension: str) -> str:
     """
     Creates a unique, timestamped filename.
     e.g., "gmail_export_2025-10-26_164530.csv"
+    A second file in the same second gets a number: "gmail_export_2025-10-26_164530_2.csv"
     
     Args:
         base_name (str): The base name of the file (e.g., "gmail_export")
@@ -34,5 +86,17 @@ def get_timestamped_filename(base_name: str, extension: str) -> str:
     Returns:
         str: The full, unique filename.
     """
+    global _filename_second
     timestamp = datetime.now().strftime("%Y-%m-%d_%H%M%S")
-    return f"{base_name}_{timestamp}.{extension}"
\ No newline at end of file
+    with _filename_lock:
+        if timestamp != _filename_second:
+            # Names of earlier seconds can never come up again
+            _filename_second = timestamp
+            _issued_filenames.clear()
+        filename = f"{base_name}_{timestamp}.{extension}"
+        number = 2
+        while filename in _issued_filenames:
+            filename = f"{base_name}_{timestamp}_{number}.{extension}"
+            number += 1
+        _issued_filenames.add(filename)
+    return filename
\ No newline at end of file
@@ -0,0 +1,34 @@
+# File: tests/conftest.py
+# Shared fixtures: a small synthetic mailbox served by the fake Gmail backend
+# (src/bench/fake_gmail.py), so the tests run the real Gmail code offline.
+
+import os
+import sys
+
+import pytest
+
+# Lets "pytest" find the src package when it is started from any folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.bench.fake_gmail import FakeGmailBackend, FakeGmailHttp, SyntheticMailbox
+from src.tools import gmail_search_tool, local_index, metadata_cache, rate_limiter
+from src.tools.gmail_session import GmailSession, set_session
+
+
+@pytest.fixture
+def fake_gmail(monkeypatch):
+    """
+    Yields (session, backend) for a 120-message fake mailbox. The session is also the
+    process-wide one, retries do not wait, and the metadata cache is off.
+    """
+    backend = FakeGmailBackend(SyntheticMailbox(size=120, label_count=4))
+    session = GmailSession(http_factory=lambda: FakeGmailHttp(backend))
+    monkeypatch.setattr(rate_limiter, "BACKOFF_BASE", 0.0)
+    monkeypatch.setattr(metadata_cache, "CACHE_ENABLED", False)
+    monkeypatch.setattr(local_index, "SEARCH_MODE", "live")
+    monkeypatch.setattr(gmail_search_tool, "FETCH_MODE", "batch")
+    # monkeypatch puts the real shared limiter back after the test
+    monkeypatch.setattr(rate_limiter, "_shared_limiter", rate_limiter.TokenBucket(rate=1_000_000))
+    set_session(session)
+    yield session, backend
+    set_session(None)
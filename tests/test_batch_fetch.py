@@ -0,0 +1,50 @@
+# File: tests/test_batch_fetch.py
+# Batch fetching when some sub-requests answer 429 or 5xx.
+
+from src.bench.fake_gmail import SyntheticMailbox
+from src.tools import batch_fetch_tool
+from src.tools.batch_fetch_tool import fetch_messages_batched, new_fetch_stats
+from src.tools.gmail_search_tool import collect_gmail
+
+
+def test_partial_failures_are_retried(fake_gmail):
+    session, backend = fake_gmail
+    ids = [SyntheticMailbox.message_id(index) for index in range(30)]
+    backend.failures = {ids[3]: [429], ids[10]: [503, 500], ids[25]: [502]}
+    stats = new_fetch_stats()
+
+    results = fetch_messages_batched(session.service(), ids, batch_size=10, stats=stats, format="minimal")
+
+    assert [result["id"] for result in results] == ids
+    assert stats["failed"] == 0
+    assert stats["messages"] == 30
+    # Only the failed sub-requests are sent again: 3 after the first round, 1 after the second
+    assert stats["retries"] == 4
+    assert backend.counters["batch_sub_requests"] == 34
+
+
+def test_permanent_failure_leaves_a_gap(fake_gmail):
+    session, backend = fake_gmail
+    ids = [SyntheticMailbox.message_id(index) for index in range(5)]
+    backend.failures = {ids[2]: [503] * (batch_fetch_tool.MAX_RETRIES + 1)}
+    stats = new_fetch_stats()
+
+    results = fetch_messages_batched(session.service(), ids, stats=stats, format="minimal")
+
+    assert results[2] is None
+    assert [result["id"] for result in results if result is not None] == ids[:2] + ids[3:]
+    assert stats["failed"] == 1
+    assert stats["retries"] == batch_fetch_tool.MAX_RETRIES
+
+
+def test_search_keeps_the_other_emails(fake_gmail):
+    _, backend = fake_gmail
+    lost = SyntheticMailbox.message_id(7)
+    backend.failures = {lost: [500] * (batch_fetch_tool.MAX_RETRIES + 1),
+                        SyntheticMailbox.message_id(8): [429, 429]}
+
+    subjects = [email["Subject"] for email in collect_gmail("")]
+
+    assert len(subjects) == 119
+    assert backend.mailbox.subject(7) not in subjects
+    assert backend.mailbox.subject(8) in subjects
@@ -0,0 +1,48 @@
+# File: tests/test_email_table.py
+# Which text the "Date" column gets, and sorting on Gmail's internalDate.
+
+from src.tools.email_table import EmailTable, apply_date_options, fetch_columns_for
+
+# Two emails whose sender clocks disagree with Gmail's: "b" claims an older date
+# in its header but reached Gmail later
+EMAILS = [
+    {"id": "b", "internalDate": "1727802000000",  # 1 Oct 2024 17:00 UTC
+     "payload": {"headers": [{"name": "Date", "value": "Tue, 1 Oct 2024 08:00:00 -0700"}]}},
+    {"id": "a", "internalDate": "1727798400000",  # 1 Oct 2024 16:00 UTC
+     "payload": {"headers": [{"name": "Date", "value": "Tue, 01 Oct 2024 16:00:00 +0000"}]}},
+]
+
+
+def _table(date_source=None):
+    table = EmailTable(["id", "Date"], {}, date_source)
+    for email in EMAILS:
+        table.append(email)
+    return table
+
+
+def test_raw_date_header_is_the_default():
+    assert "Date" in fetch_columns_for(["id", "Date"])
+    rows = list(_table())
+    assert [row["Date"] for row in rows] == [
+        "Tue, 1 Oct 2024 08:00:00 -0700",
+        "Tue, 01 Oct 2024 16:00:00 +0000",
+    ]
+
+
+def test_sorting_uses_internal_date_and_keeps_the_header_text():
+    rows = list(apply_date_options(_table(), sort="date"))
+    assert [(row["id"], row["Date"]) for row in rows] == [
+        ("a", "Tue, 01 Oct 2024 16:00:00 +0000"),
+        ("b", "Tue, 1 Oct 2024 08:00:00 -0700"),
+    ]
+
+
+def test_internal_and_header_dates_are_written_in_utc():
+    assert [row["Date"] for row in _table("internal")] == [
+        "Tue, 01 Oct 2024 17:00:00 +0000",
+        "Tue, 01 Oct 2024 16:00:00 +0000",
+    ]
+    assert [row["Date"] for row in _table("header")] == [
+        "Tue, 01 Oct 2024 15:00:00 +0000",
+        "Tue, 01 Oct 2024 16:00:00 +0000",
+    ]
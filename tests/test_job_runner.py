@@ -0,0 +1,79 @@
+# File: tests/test_job_runner.py
+# Checkpointed export jobs: a crash in the middle of a page, and resuming after it.
+
+import csv
+
+import pytest
+
+from src import job_runner
+from src.bench.fake_gmail import MAILBOX_NEWEST, SyntheticMailbox
+
+
+@pytest.fixture(autouse=True)
+def jobs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_runner, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(job_runner, "JOBS_DIR", str(tmp_path / "jobs"))
+    monkeypatch.setattr(job_runner, "PAGE_SIZE", 25)
+
+
+def _read_ids(path: str) -> list[str]:
+    with open(path, encoding="utf-8-sig", newline="") as csv_file:
+        return [row["id"] for row in csv.DictReader(csv_file)]
+
+
+@pytest.mark.parametrize("export_format", ["csv", "parquet"])
+def test_resume_after_a_crash_writes_every_email_once(fake_gmail, monkeypatch, export_format):
+    if export_format == "parquet":
+        pytest.importorskip("pyarrow")
+    checkpoint = job_runner.create_job("", export_format, ["id", "Subject"])
+    save_checkpoint = job_runner.save_checkpoint
+    calls = []
+
+    def crash_on_third_page(state):
+        calls.append(state["pages"])
+        if len(calls) == 3:
+            # The page's rows and IDs are on disk, but its checkpoint is not
+            raise RuntimeError("power cut")
+        save_checkpoint(state)
+
+    monkeypatch.setattr(job_runner, "save_checkpoint", crash_on_third_page)
+    with pytest.raises(RuntimeError):
+        job_runner.run_job(checkpoint)
+    monkeypatch.setattr(job_runner, "save_checkpoint", save_checkpoint)
+
+    saved = job_runner.load_checkpoint(checkpoint["job_id"])
+    assert (saved["pages"], saved["rows"]) == (2, 50)
+    finished = job_runner.run_job(saved)
+
+    assert finished["status"] == "done"
+    assert finished["rows"] == 120
+    if export_format == "csv":
+        ids = _read_ids(finished["file"])
+    else:
+        import pyarrow.parquet as pq
+        ids = pq.read_table(finished["file"]).column("id").to_pylist()
+    assert sorted(ids) == sorted(SyntheticMailbox.message_id(index) for index in range(120))
+
+
+def test_failed_messages_are_retried_at_the_end(fake_gmail):
+    _, backend = fake_gmail
+    flaky = SyntheticMailbox.message_id(30)
+    # More errors than one fetch retries, fewer than two fetches do
+    backend.failures = {flaky: [503] * 7}
+
+    finished = job_runner.run_job(job_runner.create_job("", "csv", ["id"]))
+
+    assert finished["failed_ids"] == []
+    assert flaky in _read_ids(finished["file"])
+    assert finished["rows"] == 120
+
+
+def test_job_keeps_its_date_range(fake_gmail):
+    newest_ms = int(MAILBOX_NEWEST.timestamp() * 1000)
+    # The 10 newest messages are 37 minutes apart
+    checkpoint = job_runner.create_job("", "csv", ["id", "Date"], since_ms=newest_ms - 9 * 37 * 60_000)
+
+    finished = job_runner.run_job(job_runner.load_checkpoint(checkpoint["job_id"]))
+
+    assert finished["rows"] == 10
+    assert _read_ids(finished["file"]) == [SyntheticMailbox.message_id(index) for index in range(10)]
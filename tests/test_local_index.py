@@ -0,0 +1,98 @@
+# File: tests/test_local_index.py
+# Turning Gmail queries into SQL for the local index (compile_query).
+
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+from src.tools.local_index import UnsupportedQuery, compile_query
+
+LABELS = {"INBOX": "INBOX", "SPAM": "SPAM", "Label_1": "Work/Reports"}
+HIDDEN = ['%"SPAM"%', '%"TRASH"%']
+LIKE = "label_ids LIKE ? ESCAPE '\\'"
+
+
+def test_operators_become_conditions():
+    condition, params = compile_query("from:bob is:unread label:work-reports after:2024/01/02", LABELS)
+
+    assert condition == (
+        f"{LIKE} AND ({LIKE}) AND date_ms >= ? AND NOT {LIKE} "
+        f"AND NOT {LIKE} AND rowid IN (SELECT rowid FROM message_text WHERE message_text MATCH ?)"
+    )
+    # Gmail reads dates as midnight Pacific time (8:00 UTC in winter)
+    assert params == ['%"UNREAD"%', '%"Label\\_1"%', 1704182400000, *HIDDEN, 'sender : "bob"']
+
+
+def _millis(*moment) -> int:
+    return int(datetime(*moment, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+@pytest.mark.parametrize("query, boundary", [
+    ("after:2024/01/02", _millis(2024, 1, 2, 8)),    # PST, UTC-8
+    ("after:2024/07/01", _millis(2024, 7, 1, 7)),    # PDT, UTC-7
+    ("before:2024/03/10", _millis(2024, 3, 10, 8)),  # the day summer time starts
+])
+def test_dates_are_midnight_pacific(query, boundary):
+    _, params = compile_query(query, LABELS)
+    assert params[0] == boundary
+
+
+def _matching(condition, params, rows):
+    # Runs a compiled condition on a small table with the columns it uses
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE messages (id TEXT, label_ids TEXT, date_ms INTEGER)")
+    db.executemany("INSERT INTO messages VALUES (?, ?, ?)", rows)
+    found = db.execute(f"SELECT id FROM messages WHERE {condition} ORDER BY id", params).fetchall()
+    return [row[0] for row in found]
+
+
+def test_late_evening_email_belongs_to_the_day_before():
+    condition, params = compile_query("after:2024/01/02", LABELS)
+    rows = [
+        ("a", '["INBOX"]', _millis(2024, 1, 2, 5)),   # 1 Jan, 21:00 in California
+        ("b", '["INBOX"]', _millis(2024, 1, 2, 9)),   # 2 Jan, 01:00 in California
+    ]
+    assert _matching(condition, params, rows) == ["b"]
+
+
+def test_underscore_in_label_id_is_not_a_wildcard():
+    condition, params = compile_query("label:work-reports", LABELS)
+    rows = [
+        ("a", '["Label_1"]', 0),
+        ("b", '["LabelX1"]', 0),
+    ]
+    assert _matching(condition, params, rows) == ["a"]
+
+
+def test_newer_than_counts_back_from_now():
+    _, params = compile_query("newer_than:2d", LABELS, now=1_000_000)
+    assert params[0] == (1_000_000 - 2 * 86_400) * 1000
+
+
+def test_unknown_label_matches_nothing():
+    condition, _ = compile_query("label:nope", LABELS)
+    assert condition.startswith("0 AND ")
+
+
+@pytest.mark.parametrize("query", [
+    "invoice",                      # bare words are searched in the body by Gmail
+    '"quarterly report"',
+    "from:a OR from:b",
+    "-label:work-reports",
+    "has:attachment",
+    "in:spam",
+    "is:trash",
+    "label:spam",
+    "after:yesterday",
+    "newer_than:3w",
+])
+def test_unsupported_queries(query):
+    with pytest.raises(UnsupportedQuery):
+        compile_query(query, LABELS)
+
+
+def test_bare_words_only_with_allow_text():
+    condition, params = compile_query('invoice "due date"', LABELS, allow_text=True)
+    assert condition.endswith("message_text MATCH ?)")
+    assert params[-1] == '"invoice" AND "due date"'
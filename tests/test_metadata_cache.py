@@ -0,0 +1,66 @@
+# File: tests/test_metadata_cache.py
+# Keeping the metadata cache up to date with history.list, and the reset after a 404.
+
+import pytest
+
+from src.bench.fake_gmail import SyntheticMailbox
+from src.tools.metadata_cache import MetadataCache
+
+
+@pytest.fixture
+def cache(tmp_path, fake_gmail):
+    session, _ = fake_gmail
+    cache = MetadataCache(str(tmp_path / "cache.sqlite3"))
+    ids = [SyntheticMailbox.message_id(index) for index in range(3)]
+    emails = session.service().users().messages()
+    cache.put_many([emails.get(userId="me", id=msg_id, format="metadata").execute() for msg_id in ids])
+    return cache
+
+
+def _labels(cache, msg_id: str) -> list[str]:
+    return cache.get_many([msg_id])[msg_id]["labelIds"]
+
+
+def test_first_sync_only_stores_the_history_id(cache, fake_gmail):
+    session, backend = fake_gmail
+    assert cache.get_history_id() is None
+
+    cache.sync(session.service())
+
+    assert cache.get_history_id() == str(backend.mailbox.history_id)
+    assert len(cache) == 3
+
+
+def test_sync_applies_label_changes_and_deletes(cache, fake_gmail):
+    session, backend = fake_gmail
+    cache.sync(session.service())
+    first, second = SyntheticMailbox.message_id(0), SyntheticMailbox.message_id(1)
+    backend.add_history(labelsAdded=[{"message": {"id": first}, "labelIds": ["STARRED"]}])
+    backend.add_history(labelsRemoved=[{"message": {"id": first}, "labelIds": ["INBOX"]}])
+    latest = backend.add_history(messagesDeleted=[{"message": {"id": second}}])
+
+    cache.sync(session.service())
+
+    assert "STARRED" in _labels(cache, first)
+    assert "INBOX" not in _labels(cache, first)
+    assert second not in cache.get_many([second])
+    assert cache.get_history_id() == latest
+
+
+def test_expired_history_clears_the_cache_and_starts_again(cache, fake_gmail):
+    session, backend = fake_gmail
+    cache.sync(session.service())
+    backend.add_history(labelsAdded=[{"message": {"id": SyntheticMailbox.message_id(0)}, "labelIds": ["STARRED"]}])
+    # Gmail no longer has the history since our stored historyId
+    backend.oldest_history_id = backend.mailbox.history_id
+
+    cache.sync(session.service())
+
+    assert len(cache) == 0
+    # The next sync starts from now, so later changes are not missed
+    assert cache.get_history_id() == str(backend.mailbox.history_id)
+    cache.put_many([session.service().users().messages().get(
+        userId="me", id=SyntheticMailbox.message_id(2), format="metadata").execute()])
+    backend.add_history(labelsAdded=[{"message": {"id": SyntheticMailbox.message_id(2)}, "labelIds": ["STARRED"]}])
+    cache.sync(session.service())
+    assert "STARRED" in _labels(cache, SyntheticMailbox.message_id(2))
@@ -0,0 +1,33 @@
+# File: tests/test_parquet_dates.py
+# Batch parsing of Date headers (parse_dates_utc).
+
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from src.tools.parquet_export_tool import parse_dates_utc
+
+
+def _millis(*args) -> int:
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("Mon, 27 Oct 2025 12:00:00 +0000", _millis(2025, 10, 27, 12)),
+    ("Mon, 27 Oct 2025 14:30:00 +0200 (IST)", _millis(2025, 10, 27, 12, 30)),
+    ("27 Oct 2025 12:00:00 GMT", _millis(2025, 10, 27, 12)),
+    ("Mon, 27 Oct 2025 12:00 -0500", _millis(2025, 10, 27, 17)),
+    # Two-digit years are read like email.utils does: 00-68 is 20xx, 69-99 is 19xx
+    ("Sun, 1 Dec 24 08:00:00 +0000", _millis(2024, 12, 1, 8)),
+    ("Fri, 1 Jan 99 00:00:00 +0000", _millis(1999, 1, 1)),
+    ("Wed, 1 Jan 69 00:00:00 +0000", _millis(1969, 1, 1)),
+    ("Tue, 1 Jan 1963 00:00:00 +0000", _millis(1963, 1, 1)),
+])
+def test_dates_are_utc(header, expected):
+    assert parse_dates_utc([header]).cast("int64").to_pylist() == [expected]
+
+
+def test_unreadable_dates_are_null():
+    assert parse_dates_utc(["not a date", None, ""]).to_pylist() == [None, None, None]
@@ -0,0 +1,92 @@
+# File: tests/test_query_translator.py
+# The local prompt -> Gmail query rules and the translation cache.
+
+import time
+
+import pytest
+
+from src import query_translator
+from src.query_translator import remember_translation, translate_prompt
+
+
+@pytest.fixture(autouse=True)
+def query_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(query_translator, "QUERY_CACHE_FILE", str(tmp_path / "query_cache.json"))
+
+
+@pytest.mark.parametrize("prompt, query, export", [
+    ("emails from bob@example.com as parquet", "from:bob@example.com", "parquet"),
+    ("unread emails with the label Finance", "label:finance is:unread", "csv"),
+    ("emails from 2023", "after:2023/01/01 before:2024/01/01", "csv"),
+    ("emails between 2024-01-01 and 2024-02-01", "after:2024/01/01 before:2024/02/01", "csv"),
+])
+def test_rules(prompt, query, export):
+    translation = translate_prompt(prompt)
+    assert (translation["query"], translation["export"], translation["source"]) == (query, export, "rules")
+
+
+@pytest.mark.parametrize("prompt", ["what is the weather like", "emails from 15 about things"])
+def test_unclear_prompts_go_to_the_llm(prompt):
+    assert translate_prompt(prompt) is None
+
+
+def test_yesterday_is_the_calendar_day_and_not_cached():
+    today = time.strftime("%Y/%m/%d")
+    yesterday = time.strftime("%Y/%m/%d", time.localtime(time.time() - 86_400))
+
+    translation = translate_prompt("emails from yesterday")
+
+    assert translation["query"] == f"after:{yesterday} before:{today}"
+    assert query_translator._read_cache() == {}
+
+
+def test_rule_translations_are_cached():
+    translate_prompt("starred emails as csv")
+    translation = translate_prompt("Starred  emails as CSV")
+    assert translation["source"] == "cache (rules)"
+    assert translation["query"] == "is:starred"
+
+
+def test_remembered_search_args_are_replayed():
+    remember_translation("my reports", "label:reports", search_args={"thread_mode": "threads"})
+
+    translation = translate_prompt("my reports")
+
+    assert translation["query"] == "label:reports"
+    assert translation["search_args"] == {"thread_mode": "threads"}
+
+
+def test_expired_entries_are_ignored():
+    remember_translation("my reports", "label:reports")
+    assert translate_prompt("my reports", ttl=-1) is None
+
+
+def test_this_week_month_and_year_start_on_the_calendar():
+    now = time.localtime()
+    monday = time.strftime("%Y/%m/%d", time.localtime(time.mktime(
+        (now.tm_year, now.tm_mon, now.tm_mday - now.tm_wday, 12, 0, 0, 0, 0, -1))))
+
+    assert translate_prompt("emails from this week")["query"] == f"after:{monday}"
+    assert translate_prompt("emails from this month")["query"] == f"after:{now.tm_year}/{now.tm_mon:02d}/01"
+    assert translate_prompt("emails from this year")["query"] == f"after:{now.tm_year}/01/01"
+
+
+def test_emails_i_sent_keep_the_sender():
+    translation = translate_prompt("emails I sent to bob@x.com")
+    assert translation["query"] == "from:me to:bob@x.com"
+
+
+@pytest.mark.parametrize("prompt", [
+    "emails since monday",
+    "emails from this month",
+    "emails from last week",
+    "emails from the past 3 days",
+])
+def test_relative_prompts_are_not_cached(prompt):
+    remember_translation(prompt, "label:anything")
+    assert query_translator._read_cache() == {}
+
+
+def test_absolute_dates_are_cached():
+    remember_translation("emails between 2024-01-01 and 2024-02-01", "after:2024/01/01 before:2024/02/01")
+    assert len(query_translator._read_cache()) == 1